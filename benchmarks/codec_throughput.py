@@ -0,0 +1,102 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from monthlify.data import codec  # noqa: E402
+
+# encode and decode throughput of every installed codec on day files, e.g.
+#   python benchmarks/codec_throughput.py --days ./play_log/days
+# without a days dir, days shaped like DayData.persist writes them are made up
+
+
+# makes up the contents of a day file
+# params: tracks--number of distinct tracks played
+def synthetic_day(tracks, rng):
+    plays = {index: rng.randint(1, 6) for index in rng.sample(range(tracks * 20), tracks)}
+    artists = {f'artist {rng.randrange(tracks // 3 + 1)}': rng.randint(1, 20) for _ in range(tracks // 2)}
+    feature_names = ('energy', 'tempo', 'valence', 'danceability', 'acousticness',
+                     'instrumentalness', 'liveness', 'speechiness', 'loudness')
+    meta = {'total plays': sum(plays.values()),
+            'top artists': sorted(artists.items(), key=lambda kv: kv[1], reverse=True)[:5],
+            'average energy': '0.512', 'average tempo': '118.3', 'average valence': '0.431000',
+            'artists': artists,
+            'albums': [[f'album {index}', artist, count] for index, (artist, count) in enumerate(artists.items())],
+            'artist ids': {f'{rng.getrandbits(80):022x}': count for count in artists.values()},
+            'feature sums': {name: rng.random() * 100 for name in feature_names},
+            'feature plays': sum(plays.values())}
+    start = 1565000000000
+    return {'version': 2, 'meta': meta,
+            'tracks': [[index, count] for index, count in plays.items()],
+            'events': {index: sorted(start + rng.randrange(86400000) for _ in range(count))
+                       for index, count in plays.items()}}
+
+
+def load_days(directory):
+    names = sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+    return [codec.load(os.path.join(directory, name)) for name in names]
+
+
+# decodes with one codec, where codec.decode would read any json with the fastest reader
+def decoder(name, schema=None):
+    if codec.get_codec(name).framed:
+        return lambda data: codec.decode(data, schema)
+    return lambda data: codec.get_codec(name).decode(data, schema)
+
+
+# runs a function over every day until min_seconds have passed
+# return: seconds per pass over the days
+def time_passes(function, items, min_seconds):
+    passes = 0
+    start = time.perf_counter()
+    while True:
+        for item in items:
+            function(item)
+        passes += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return elapsed / passes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', default=None, help='dir of day files to encode; defaults to made up days')
+    parser.add_argument('--count', type=int, default=200, help='number of made up days')
+    parser.add_argument('--tracks', type=int, default=60, help='distinct tracks per made up day')
+    parser.add_argument('--seconds', type=float, default=1.0, help='min time spent on each measurement')
+    args = parser.parse_args()
+
+    if args.days:
+        days = load_days(args.days)
+    else:
+        rng = random.Random(0)
+        days = [synthetic_day(args.tracks, rng) for _ in range(args.count)]
+    if not days:
+        sys.exit('no days to encode')
+
+    # what every day file looked like before codecs
+    legacy = [json.dumps(day, indent=2, separators=(',', ':')).encode('utf-8') for day in days]
+    legacy_bytes = sum(len(data) for data in legacy)
+    legacy_seconds = time_passes(json.loads, legacy, args.seconds)
+    print(f'{len(days)} days, {legacy_bytes / len(days) / 1024:.1f} KiB per day as indented json '
+          f'(read at {legacy_bytes / legacy_seconds / 2 ** 20:.0f} MiB/s, {len(days) / legacy_seconds:.0f} days/s)')
+    print(f'{"codec":<10}{"size":>8}{"encode MiB/s":>14}{"decode MiB/s":>14}{"decode days/s":>15}'
+          f'{"typed days/s":>14}')
+
+    for name in codec.available_codecs():
+        encoded = [codec.encode(day, name) for day in days]
+        size = sum(len(data) for data in encoded)
+        encode_seconds = time_passes(lambda day: codec.encode(day, name), days, args.seconds)
+        decode_seconds = time_passes(decoder(name), encoded, args.seconds)
+        typed_seconds = time_passes(decoder(name, 'day'), encoded, args.seconds)
+        print(f'{name:<10}{size / legacy_bytes:>7.0%} {size / encode_seconds / 2 ** 20:>13.0f} '
+              f'{size / decode_seconds / 2 ** 20:>13.0f} {len(days) / decode_seconds:>14.0f} '
+              f'{len(days) / typed_seconds:>13.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# startup time of the command line entry point; fails if it goes over budget so a new eager
+# import of a heavy dependency gets noticed, e.g.
+#   python benchmarks/import_time.py --budget 60
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# only commands that need these should ever import them
+HEAVY_MODULES = ('numpy', 'requests', 'yaml', 'nltk', 'bs4', 'flask')
+
+
+# runs code in a fresh interpreter from the repo dir
+# return: seconds the interpreter took from start to exit
+def time_run(code):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', code], cwd=REPO_DIR, check=True)
+    return time.perf_counter() - start
+
+
+# return: the heavy modules importing a module pulls in
+def heavy_imports(module):
+    code = f'import sys, {module}; print(",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))'
+    output = subprocess.run([sys.executable, '-c', code], cwd=REPO_DIR, check=True,
+                            stdout=subprocess.PIPE, universal_newlines=True).stdout.strip()
+    return output.split(',') if output else []
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--module', default='monthlify.cli')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--budget', type=float, default=60, help='max ms the import may add to startup')
+    args = parser.parse_args()
+
+    baseline = statistics.median(time_run('pass') for _ in range(args.runs))
+    startup = statistics.median(time_run(f'import {args.module}') for _ in range(args.runs))
+    added_ms = (startup - baseline) * 1000
+    print(f'python startup {baseline * 1000:.1f} ms, import {args.module} adds {added_ms:.1f} ms '
+          f'(budget {args.budget:.0f} ms, median of {args.runs})')
+
+    failed = False
+    heavy = heavy_imports(args.module)
+    if heavy:
+        print(f'importing {args.module} eagerly imports {", ".join(heavy)}')
+        failed = True
+    if added_ms > args.budget:
+        print('over budget')
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
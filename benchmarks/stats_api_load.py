@@ -0,0 +1,70 @@
+import argparse
+import threading
+import time
+import urllib.error
+import urllib.request
+
+# load test for the stats api in spotify_auth.py
+# start the server first (python spotify_auth.py), then run e.g.
+#   python benchmarks/stats_api_load.py --start 2019-08-01 --end 2019-08-31
+
+
+def dashboard_queries(start, end):
+    return [f'/api/top-tracks?start={start}&end={end}&number=50',
+            f'/api/top-artists?start={start}&end={end}&number=20',
+            f'/api/days?start={start}&end={end}',
+            f'/api/features?start={start}&end={end}',
+            f'/api/top-tracks?start={end}&end={end}&number=10']
+
+
+# sends requests for one path from several threads for a fixed time
+# return: a tuple of (requests completed, errors, seconds)
+def load(url, threads, seconds, revalidate):
+    counts = [0] * threads
+    errors = [0] * threads
+    deadline = time.perf_counter() + seconds
+
+    def worker(i):
+        etag = None
+        while time.perf_counter() < deadline:
+            request = urllib.request.Request(url)
+            if revalidate and etag:
+                request.add_header('If-None-Match', etag)
+            try:
+                with urllib.request.urlopen(request) as response:
+                    response.read()
+                    etag = response.headers.get('ETag')
+            except urllib.error.HTTPError as e:
+                # a 304 is a successful revalidation
+                if e.code != 304:
+                    errors[i] += 1
+            except OSError:
+                errors[i] += 1
+            counts[i] += 1
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return sum(counts), sum(errors), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='http://localhost:3000')
+    parser.add_argument('--start', required=True)
+    parser.add_argument('--end', required=True)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--revalidate', action='store_true', help='send If-None-Match like a browser would')
+    args = parser.parse_args()
+
+    for path in dashboard_queries(args.start, args.end):
+        completed, errors, elapsed = load(args.host + path, args.threads, args.seconds, args.revalidate)
+        print(f'{completed / elapsed:8.0f} req/s  {errors:4d} errors  {path}')
+
+
+if __name__ == '__main__':
+    main()
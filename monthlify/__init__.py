@@ -1,2 +1,15 @@
-from .auth import authenticate
-from .core import read_config
+# the package only loads what is asked for, so e.g. a command that reads local day files
+# never pays for importing requests or yaml
+_EXPORTS = {'authenticate': 'monthlify.auth',
+            'read_config': 'monthlify.core'}
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        import importlib
+        return getattr(importlib.import_module(_EXPORTS[name]), name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_EXPORTS))
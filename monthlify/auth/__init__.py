@@ -2,3 +2,4 @@ from .auth_method import AuthMethod
 from .authorization import Authorization
 from .auth import authenticate
 from .auth import get_auth_key
+from .auth import get_authorization
@@ -1,7 +1,8 @@
-import requests
 import base64
 import json
 import os
+import threading
+import time
 
 from .authorization import Authorization
 from monthlify.core import BadRequestError
@@ -15,6 +16,7 @@ def get_auth_key(client_id, client_secret):
 
 
 def _refresh_access_token(auth_key, refresh_token):
+    import requests
 
     headers = {'Authorization': f'Basic {auth_key}', }
 
@@ -62,6 +64,7 @@ def _authorization_code(conf):
 
 
 def _client_credentials(conf):
+    import requests
 
     auth_key = get_auth_key(conf.client_id, conf.client_secret)
 
@@ -99,3 +102,22 @@ def authenticate(conf):
     if conf.auth_method == AuthMethod.CLIENT_CREDENTIALS:
         return _client_credentials(conf)
     return _authorization_code(conf)
+
+
+_shared_authorization = None
+_shared_expires_at = 0
+_shared_lock = threading.Lock()
+
+
+# gets one authorization shared by everything in the process, only authenticating
+# again once the token is about to expire
+# params: conf--the Config from read_config
+#         refresh--force a new token
+def get_authorization(conf, refresh=False):
+    global _shared_authorization, _shared_expires_at
+    with _shared_lock:
+        if refresh or _shared_authorization is None or time.time() >= _shared_expires_at:
+            _shared_authorization = authenticate(conf)
+            # renew a minute early so a token never expires mid request
+            _shared_expires_at = time.time() + (_shared_authorization.expires_in or 3600) - 60
+        return _shared_authorization
@@ -0,0 +1,298 @@
+import argparse
+import datetime
+import shlex
+import sys
+import time
+
+from monthlify.data import DataManager
+from monthlify.data import codec
+
+
+# command line entry point, run with "python -m monthlify <command> ..."
+# every command of a batch runs in the same process, so they all share one DataManager
+# (and with it one spotify token, one http session, and every warm cache)
+def build_parser():
+    parser = argparse.ArgumentParser(prog='monthlify')
+    parser.add_argument('--user', default='', help='spotify user id, needed to create playlists')
+    parser.add_argument('--codec', default=None, choices=codec.CODEC_NAMES,
+                        help='codec play_log files are written with; defaults to the fastest installed json')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    commands.add_parser('scrape', help='scrape and process the most recently played tracks')
+
+    ingest = commands.add_parser('ingest', help='trim and process raw play logs')
+    ingest.add_argument('files', nargs='*', help='raw log file names; defaults to every raw log')
+    ingest.add_argument('--archived', action='store_true', help='also process compacted logs')
+
+    rebuild = commands.add_parser('rebuild', help='rebuild every day file from the raw logs')
+    rebuild.add_argument('--processes', type=int, default=None)
+
+    compact = commands.add_parser('compact', help='pack finished months of logs into bundles')
+    compact.add_argument('--before', default=None, help='YYYY-MM month to stop at')
+
+    summary = commands.add_parser('summary', help='write the summary of a date range')
+    summary.add_argument('start')
+    summary.add_argument('end')
+
+    top_tracks = commands.add_parser('top-tracks', help='print the most played tracks')
+    top_tracks.add_argument('start')
+    top_tracks.add_argument('end', nargs='?')
+    top_tracks.add_argument('--number', type=int, default=50)
+    top_tracks.add_argument('--playlist', action='store_true', help='also make a playlist of them')
+    top_tracks.add_argument('--approximate', action='store_true')
+    top_tracks.add_argument('--canonical', action='store_true', help='merge releases of the same song')
+
+    top_artists = commands.add_parser('top-artists', help='print the most played artists')
+    top_artists.add_argument('start')
+    top_artists.add_argument('end', nargs='?')
+    top_artists.add_argument('--number', type=int, default=20)
+    top_artists.add_argument('--approximate', action='store_true')
+    top_artists.add_argument('--ids', action='store_true', help='count by artist id, featured artists included')
+
+    top_genres = commands.add_parser('top-genres', help='print the most played genres')
+    top_genres.add_argument('start')
+    top_genres.add_argument('end', nargs='?')
+    top_genres.add_argument('--number', type=int, default=20)
+
+    trend = commands.add_parser('trends', help='print what is rising, falling, breaking out, or hot lately')
+    trend.add_argument('view', choices=['rising', 'falling', 'breakouts', 'decayed'])
+    trend.add_argument('--end', default=None, help='YYYY-MM-DD last day; defaults to today')
+    trend.add_argument('--window', type=int, default=7, help='days per window, or the half life for decayed')
+    trend.add_argument('--number', type=int, default=20)
+    trend.add_argument('--artists', action='store_true')
+
+    rising = commands.add_parser('rising-playlist', help='make a playlist of the tracks rising this month, or the last week early in the month')
+    rising.add_argument('--number', type=int, default=30)
+
+    analysis = commands.add_parser('fetch-analysis', help='fetch the audio analysis of newly played tracks')
+    analysis.add_argument('--workers', type=int, default=4, help='requests in flight at once')
+
+    lyrics = commands.add_parser('score-lyrics', help='score the lyrics of tracks that have not been scored yet')
+    lyrics.add_argument('--limit', type=int, default=None, help='max tracks to score this run')
+    lyrics.add_argument('--workers', type=int, default=4, help='lyric pages fetched at once')
+
+    mood = commands.add_parser('lyric-mood', help='print the play weighted lyric sentiment over time')
+    mood.add_argument('start')
+    mood.add_argument('end')
+    mood.add_argument('--period', default='week', choices=['day', 'week', 'month', 'all'])
+
+    enrich = commands.add_parser('enrich', help='fetch the features, artists, isrcs, and lyrics ingest queued')
+    enrich.add_argument('--batch-size', type=int, default=500, help='max lookups of each kind per round')
+    enrich.add_argument('--watch', type=float, default=None, metavar='SECONDS',
+                        help='keep working the queue, checking it this often')
+    enrich.add_argument('--backfill', action='store_true', help='first queue every lookup never done')
+    enrich.add_argument('--retry-failed', action='store_true', help='first retry jobs that ran out of attempts')
+    enrich.add_argument('--status', action='store_true', help='only print what is queued')
+
+    commands.add_parser('canonicalize', help='look up the isrcs of newly played tracks')
+    commands.add_parser('enrich-artists', help='fetch the genres of newly played artists')
+
+    playlist = commands.add_parser('playlist', help='make a mood or similar tracks playlist')
+    playlist.add_argument('name')
+    playlist.add_argument('--mood', help='mood name e.g. happy, or feature=value pairs e.g. valence=0.2,energy=0.3')
+    playlist.add_argument('--seeds', help='comma separated track ids to find similar tracks to')
+    playlist.add_argument('--number', type=int, default=50)
+
+    analyze = commands.add_parser('analyze-playlist', help='write the track and lyric analysis of a playlist')
+    analyze.add_argument('name')
+    analyze.add_argument('--export', default=None,
+                         help='also write the results to this .parquet file, or directory of .npz row groups')
+    analyze.add_argument('--format', default='auto', choices=['auto', 'parquet', 'npz'])
+
+    export = commands.add_parser('export', help='write play history or track data as columnar tables')
+    export.add_argument('table', choices=['plays', 'tracks'])
+    export.add_argument('path', help='.parquet file, or directory of .npz row groups')
+    export.add_argument('--start', default=None, help='YYYY-MM first month of plays')
+    export.add_argument('--end', default=None, help='YYYY-MM last month of plays')
+    export.add_argument('--format', default='auto', choices=['auto', 'parquet', 'npz'])
+
+    batch = commands.add_parser('batch', help='run every command in a job file in one process')
+    batch.add_argument('job_file', help='file with one command per line; # starts a comment')
+
+    return parser
+
+
+def _parse_mood(mood):
+    if '=' not in mood:
+        return mood
+    target = {}
+    for pair in mood.split(','):
+        name, value = pair.split('=')
+        target[name.strip()] = float(value)
+    return target
+
+
+# runs a single parsed command
+# params: args--parsed arguments
+#         dm--the DataManager shared by every command
+def run(args, dm):
+    if args.command == 'scrape':
+        last_log_time = dm.get_most_recent_log_time()
+        epoch = datetime.datetime.utcfromtimestamp(0)
+        dm.get_recent_play_data(int((last_log_time - epoch).total_seconds() * 1000))
+
+    elif args.command == 'ingest':
+        if args.files:
+            for filename in args.files:
+                dm._trim_play_log(filename)
+                dm.process_play_log(filename)
+        else:
+            dm.process_all_play_logs()
+        if args.archived:
+            dm.process_archived_play_logs()
+
+    elif args.command == 'rebuild':
+        dm.rebuild(processes=args.processes)
+
+    elif args.command == 'compact':
+        dm.compact_play_logs(args.before)
+
+    elif args.command == 'summary':
+        dm.write_summary_for_date_range(args.start, args.end)
+
+    elif args.command == 'top-tracks':
+        results = dm.get_most_played_tracks(args.start, args.end, args.number,
+                                            make_playlist=args.playlist, approximate=args.approximate,
+                                            canonical=args.canonical)
+        for result in results:
+            print(f'{result[0][0]} by {result[0][1]} with {result[1]} plays')
+
+    elif args.command == 'top-artists':
+        if args.ids:
+            results = [(f'{name} ({artist_id})', plays) for (artist_id, name), plays
+                       in dm.get_most_played_artist_ids(args.start, args.end, args.number)]
+        else:
+            results = dm.get_most_played_artists(args.start, args.end, args.number, approximate=args.approximate)
+        for result in results:
+            print(f'{result[0]} with {result[1]} plays')
+
+    elif args.command == 'top-genres':
+        for genre, plays in dm.get_most_played_genres(args.start, args.end, args.number):
+            print(f'{genre} with {plays} plays')
+
+    elif args.command == 'trends':
+        kind = 'artists' if args.artists else 'tracks'
+        if args.view == 'decayed':
+            results = [(label, f'{score:.1f} decayed plays')
+                       for label, score in dm.get_decayed_top(args.end, args.window, args.number, kind)]
+        elif args.view == 'breakouts':
+            results = [(label, f'{plays} plays, score {score:.1f}')
+                       for label, score, plays in dm.get_breakouts(args.end, args.window, number=args.number, kind=kind)]
+        else:
+            results = [(label, f'{current} plays, {previous} the window before')
+                       for label, current, previous in dm.get_trending(args.end, args.window, args.number, kind,
+                                                                       falling=args.view == 'falling')]
+        for label, description in results:
+            name = label if isinstance(label, str) else f'{label[0]} by {label[1]}'
+            print(f'{name} with {description}')
+
+    elif args.command == 'rising-playlist':
+        for track_info, score, plays in dm.make_rising_playlist(args.number):
+            print(f'{track_info[0]} by {track_info[1]} with {plays} plays, score {score:.1f}')
+
+    elif args.command == 'fetch-analysis':
+        print(f'fetched {dm.fetch_audio_analysis(workers=args.workers)} analyses')
+
+    elif args.command == 'score-lyrics':
+        print(f'scored {dm.score_lyrics(args.limit, args.workers)} tracks')
+
+    elif args.command == 'lyric-mood':
+        for first, sentiment, richness, plays in dm.get_lyric_series(args.start, args.end, args.period):
+            if sentiment is None:
+                print(f'{first}: no scored plays')
+            else:
+                print(f'{first}: sentiment {sentiment:.3f}, lexical richness {richness:.1f} over {plays} plays')
+
+    elif args.command == 'enrich':
+        run_enrich(args, dm)
+
+    elif args.command == 'canonicalize':
+        print(f'looked up {dm.canonicalize_tracks()} tracks')
+
+    elif args.command == 'enrich-artists':
+        print(f'fetched {dm.enrich_artists()} artists')
+
+    elif args.command == 'playlist':
+        pm = dm.playlist_manager
+        if args.seeds:
+            pm.prepare_similar_playlist(args.user, args.name, args.seeds.split(','), args.number)
+        elif args.mood:
+            pm.prepare_mood_playlist(args.user, args.name, _parse_mood(args.mood), args.number)
+        else:
+            raise ValueError('playlist needs either --mood or --seeds')
+
+    elif args.command == 'analyze-playlist':
+        # lyric analysis pulls in nltk so only import it when it is needed
+        from monthlify.data.analyzer import Analyzer
+        Analyzer(dm).get_track_data_for_playlist(args.name, args.export, args.format)
+
+    elif args.command == 'export':
+        if args.table == 'plays':
+            rows = dm.export_plays(args.path, args.start, args.end, args.format)
+        else:
+            rows = dm.export_tracks(args.path, args.format)
+        print(f'wrote {rows} rows to {args.path}')
+
+    elif args.command == 'batch':
+        run_batch(args.job_file, dm)
+
+
+# works through the enrichment queue once, or forever with --watch
+def run_enrich(args, dm):
+    from monthlify.data.enrichment_queue import get_shared_enrichment_queue
+    queue = get_shared_enrichment_queue()
+    if args.status:
+        for kind, counts in sorted(queue.status().items()):
+            print(f'{kind}: {counts["ready"]} ready, {counts["waiting"]} waiting, {counts["failed"]} failed')
+        return
+    if args.retry_failed:
+        print(f'retrying {queue.retry_failed()} failed jobs')
+    if args.backfill:
+        print(f'queued {dm.queue_missing_enrichment()} missing lookups')
+    while True:
+        worked = dm.run_enrichment(args.batch_size)
+        if any(worked.values()):
+            print(', '.join(f'{count} {kind}' for kind, count in worked.items() if count))
+        if args.watch is None:
+            return
+        time.sleep(args.watch)
+
+
+# runs every command of a job file, continuing past any that fail
+# params: job_file--path of a file with one command per line, e.g. "top-artists 2019-08-01 2019-08-31"
+#         dm--the DataManager shared by every command
+# return: number of commands that failed
+def run_batch(job_file, dm):
+    parser = build_parser()
+    with open(job_file, mode='r', encoding='utf-8') as file:
+        jobs = [line.strip() for line in file]
+    jobs = [job for job in jobs if job and not job.startswith('#')]
+
+    failures = 0
+    batch_start = time.perf_counter()
+    for job in jobs:
+        print(f'> {job}')
+        job_start = time.perf_counter()
+        try:
+            args = parser.parse_args(shlex.split(job))
+            if args.command == 'batch':
+                raise ValueError('batch jobs can not run other batches')
+            if not args.user:
+                args.user = dm.user_name
+            run(args, dm)
+        except (Exception, SystemExit) as e:
+            failures += 1
+            print(f'job failed: {e!r}')
+        print(f'({time.perf_counter() - job_start:.3f}s)')
+    print(f'ran {len(jobs)} jobs in {time.perf_counter() - batch_start:.2f}s, {failures} failed')
+    return failures
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    codec.set_default_codec(args.codec)
+    dm = DataManager(args.user)
+    if args.command == 'batch':
+        sys.exit(1 if run_batch(args.job_file, dm) else 0)
+    run(args, dm)
@@ -1,5 +1,5 @@
+import functools
 import os
-import yaml
 from collections import namedtuple
 from monthlify.auth import AuthMethod
 
@@ -15,7 +15,13 @@ Config = namedtuple('Config', ['client_id',
 
 def read_config():
     current_dir = os.path.abspath(os.curdir)
-    file_path = os.path.join(current_dir, 'config.yaml')
+    return _read_config_file(os.path.join(current_dir, 'config.yaml'))
+
+
+# the file is only parsed once per process; Config is immutable so everyone can share it
+@functools.lru_cache(maxsize=None)
+def _read_config_file(file_path):
+    import yaml
 
     try:
         with open(file_path, mode='r', encoding='UTF-8') as file:
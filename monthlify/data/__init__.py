@@ -1,8 +1,25 @@
-from .playlist_manager import PlaylistManager
-from .data_manager import DataManager
-from .spotify_api import find_track
-from .spotify_api import find_top_tracks
-from .spotify_api import create_playlist
-from .spotify_api import populate_playlist
-from .spotify_api import delete_playlist
-import monthlify.data.day_data
+# names are imported on first use, so importing one submodule doesn't import all of them
+_EXPORTS = {'PlaylistManager': 'monthlify.data.playlist_manager',
+            'DataManager': 'monthlify.data.data_manager',
+            'find_track': 'monthlify.data.spotify_api',
+            'find_top_tracks': 'monthlify.data.spotify_api',
+            'create_playlist': 'monthlify.data.spotify_api',
+            'populate_playlist': 'monthlify.data.spotify_api',
+            'delete_playlist': 'monthlify.data.spotify_api'}
+
+
+def __getattr__(name):
+    import importlib
+    if name in _EXPORTS:
+        return getattr(importlib.import_module(_EXPORTS[name]), name)
+    # submodules e.g. monthlify.data.day_data
+    try:
+        return importlib.import_module(f'{__name__}.{name}')
+    except ModuleNotFoundError as e:
+        if e.name != f'{__name__}.{name}':
+            raise
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_EXPORTS))
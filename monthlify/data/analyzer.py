@@ -1,50 +1,50 @@
 import csv
 
 from monthlify.data import data_manager
-from monthlify.data import PlaylistManager
 from monthlify.data import lyric_analyzer
 
 
 class Analyzer:
 
-    def __init__(self):
-        self.dm = data_manager.DataManager()
-        self.pm = PlaylistManager()
-
-    def get_track_data_for_playlist(self, playlist_name):
+    # params: dm--optional DataManager to share, e.g. one with a warm token and caches
+    #         pm--optional PlaylistManager to share
+    def __init__(self, dm=None, pm=None, username=''):
+        self.dm = dm if dm is not None else data_manager.DataManager(username)
+        self.pm = pm if pm is not None else self.dm.playlist_manager
+
+    # writes the audio features and lyric sentiment of every track of a playlist to a csv
+    # params: export_path--optional .parquet file, or directory of .npz row groups, to also write
+    #                      the results to as a columnar table keyed by track id
+    #         fmt--'parquet', 'npz', or 'auto' to use parquet when pyarrow is installed
+    # return: list of (track, artist, energy, tempo, valence, sentiment score, lexical richness) tuples
+    def get_track_data_for_playlist(self, playlist_name, export_path=None, fmt='auto'):
         tracks = self.pm.extract_tracks_and_artists_from_playlist(playlist_name)
-        track_ids = []
-        sentiment_analysis_list = []
-        for track in tracks:
-            track_ids.append(track[2])
-            analysis = lyric_analyzer.sentiment_analysis(track[0], track[1])
-            sentiment_analysis_list.append(analysis)
-
-        audio_features_list = self.dm.analyze_tracks(track_ids)[3]
+        # keyed by track id, so tracks without features can't shift the rows after them
+        audio_features = self.dm.analyze_tracks([track[2] for track in tracks])[3] if tracks else {}
 
         summary_list = []
+        track_ids = []
         with open(f'./monthlify/data/playlists/{playlist_name}.csv', mode='w') as file:
             data_writer = csv.writer(file, delimiter=',')
             data_writer.writerow(['Track', 'Artist',
                                   'Energy', 'Tempo',
                                   'Valence', 'Sentiment Score',
                                   'Lexical Richness'])
-            for i in range(len(tracks)):
+            for track, artist, track_id in tracks:
                 # create tuple of track, artist, energy, tempo, valence, sentiment analysis score, lexical richness
-                if sentiment_analysis_list[i] is not None:
-                    sentiment_analysis = sentiment_analysis_list[i][0]
-                    lexical_richness = sentiment_analysis_list[i][1]
-                else:
-                    sentiment_analysis, lexical_richness = None, None
-
-                track_data = (tracks[i][0],
-                              tracks[i][1],
-                              audio_features_list[i][0],
-                              audio_features_list[i][1],
-                              audio_features_list[i][2],
-                              sentiment_analysis,
-                              lexical_richness)
+                analysis = lyric_analyzer.sentiment_analysis(track, artist)
+                sentiment_analysis, lexical_richness = analysis if analysis is not None else (None, None)
+                energy, tempo, valence = audio_features.get(track_id, (None, None, None))
+
+                track_data = (track, artist, energy, tempo, valence, sentiment_analysis, lexical_richness)
                 summary_list.append(track_data)
+                track_ids.append(track_id)
                 data_writer.writerow(track_data)
 
+        if export_path is not None:
+            # export needs numpy so only import it when it is needed
+            from monthlify.data import export
+            export.export_playlist_analysis(export_path, ((track_id,) + track_data for track_id, track_data
+                                                          in zip(track_ids, summary_list)), fmt)
+
         return summary_list
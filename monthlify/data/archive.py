@@ -0,0 +1,134 @@
+import gzip
+import os
+import re
+from collections import defaultdict
+
+from monthlify.data import codec
+from monthlify.data.storage import atomic_write
+
+ARCHIVE_DIR = './play_log/archive'
+
+# logs are named by the local time they were scraped e.g. 2019-08-04 08:40:30.880000.json;
+# anything else in the dir, e.g. a file being written, is left alone
+LOG_NAME = re.compile(r'^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\.\d{6}\.json$')
+
+
+# play logs are packed into one bundle per month per kind (raw or trimmed)
+# e.g. play_log/archive/raw/2019-08.jsonl.gz with an offset index in 2019-08.idx.json
+# every log is its own gzip member holding one json line of {"name": ..., "data": ...}
+# so the bundle can be streamed from start to finish or a single log read by seeking
+# members are always json, whatever the default codec is, so they stay one per line
+def _bundle_path(kind, month):
+    return os.path.join(ARCHIVE_DIR, kind, f'{month}.jsonl.gz')
+
+
+def _index_path(kind, month):
+    return os.path.join(ARCHIVE_DIR, kind, f'{month}.idx.json')
+
+
+# reads the index of a bundle
+# return: list of [name, offset, length] lists in the order they were written
+def read_index(kind, month):
+    file_path = _index_path(kind, month)
+    if not os.path.isfile(file_path):
+        return []
+    return codec.load(file_path)
+
+
+# lists the months that have a bundle
+# params: kind--'raw' or 'trimmed'
+# return: sorted list of YYYY-MM strings
+def list_months(kind):
+    directory = os.path.join(ARCHIVE_DIR, kind)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(basename[:-len('.idx.json')] for basename in os.listdir(directory)
+                  if basename.endswith('.idx.json'))
+
+
+# packs the loose logs of every finished month into that month's bundle
+# logs are only removed once the bundle and its index are safely on disk
+# params: kind--'raw' or 'trimmed', the play_log dir to compact
+#         before--YYYY-MM month to stop at; defaults to the current local month, which is still
+#                 being written
+# return: number of logs packed
+def compact(kind, before=None):
+    if before is None:
+        from monthlify.data.data_manager import local_today
+        before = local_today().strftime('%Y-%m')
+    source_dir = f'./play_log/{kind}'
+    os.makedirs(os.path.join(ARCHIVE_DIR, kind), exist_ok=True)
+
+    by_month = defaultdict(list)
+    for basename in sorted(os.listdir(source_dir)):
+        if LOG_NAME.match(basename) and basename[:7] < before:
+            by_month[basename[:7]].append(basename)
+
+    packed = 0
+    for month, names in sorted(by_month.items()):
+        index = read_index(kind, month)
+        archived = {item[0] for item in index}
+        with open(_bundle_path(kind, month), mode='ab') as bundle:
+            offset = bundle.tell()
+            for name in names:
+                if name in archived:
+                    continue
+                record = {'name': name, 'data': codec.load(os.path.join(source_dir, name))}
+                member = gzip.compress(codec.encode(record, codec.fastest_json()) + b'\n')
+                bundle.write(member)
+                index.append([name, offset, len(member)])
+                offset += len(member)
+                packed += 1
+            bundle.flush()
+            os.fsync(bundle.fileno())
+        atomic_write(_index_path(kind, month), index)
+
+        for name in names:
+            os.remove(os.path.join(source_dir, name))
+        print(f'packed {len(names)} {kind} logs into {month}')
+    return packed
+
+
+# streams every log in a month's bundle without unpacking it to disk
+# params: kind--'raw' or 'trimmed'
+#         month--YYYY-MM
+# return: generator of (name, decoded json data) tuples
+def iter_bundle(kind, month):
+    index = read_index(kind, month)
+    if not index:
+        return
+    # seek by the index so a member left partially written by a crash is never read
+    with open(_bundle_path(kind, month), mode='rb') as bundle:
+        for name, offset, length in index:
+            bundle.seek(offset)
+            record = codec.decode(gzip.decompress(bundle.read(length)))
+            yield name, record['data']
+
+
+# streams every archived log of a kind, oldest month first
+def iter_archive(kind):
+    for month in list_months(kind):
+        yield from iter_bundle(kind, month)
+
+
+# reads a single log out of a bundle by seeking to it
+# params: kind--'raw' or 'trimmed'
+#         name--the original file name of the log
+# return: the decoded json data or None if it isn't archived
+def read_log(kind, name):
+    for item_name, offset, length in read_index(kind, name[:7]):
+        if item_name == name:
+            with open(_bundle_path(kind, name[:7]), mode='rb') as bundle:
+                bundle.seek(offset)
+                return codec.decode(gzip.decompress(bundle.read(length)))['data']
+    return None
+
+
+# gets the name of the most recently archived log
+# return: the name or None if nothing is archived
+def latest_name(kind):
+    for month in reversed(list_months(kind)):
+        index = read_index(kind, month)
+        if index:
+            return max(item[0] for item in index)
+    return None
@@ -0,0 +1,121 @@
+import os
+import threading
+
+from monthlify.data import spotify_api
+from monthlify.data import codec
+from monthlify.data.storage import atomic_write
+
+ARTIST_CATALOG_PATH = './play_log/artists.json'
+
+_shared_catalog = None
+_shared_lock = threading.Lock()
+
+
+# gets the artist catalog shared by everything in this process, loading it on first use
+def get_shared_artist_catalog():
+    global _shared_catalog
+    with _shared_lock:
+        if _shared_catalog is None:
+            _shared_catalog = ArtistCatalog()
+    return _shared_catalog
+
+
+# local store of every artist credited on a played track, keyed by spotify artist id
+# names are known from the play logs; genres are only fetched from spotify for artists
+# that have never been looked up
+class ArtistCatalog:
+
+    def __init__(self, file_path=ARTIST_CATALOG_PATH):
+        self.file_path = file_path
+        # track id to list of artist ids, main artist first
+        self.track_artists = {}
+        # artist id to dict of 'name', 'genres' (None until fetched), and 'popularity'
+        self.artists = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        if os.path.isfile(file_path):
+            contents = codec.load(file_path)
+            self.track_artists = contents['tracks']
+            self.artists = contents['artists']
+
+    # picks up artists another process added to the file; call while holding the catalog lock
+    # anything known here wins over the file since it is at least as fresh
+    def reload(self):
+        if not os.path.isfile(self.file_path):
+            return
+        contents = codec.load(self.file_path)
+        with self._lock:
+            contents['tracks'].update(self.track_artists)
+            for artist_id, artist in self.artists.items():
+                if artist['genres'] is not None or artist_id not in contents['artists']:
+                    contents['artists'][artist_id] = artist
+            self.track_artists = contents['tracks']
+            self.artists = contents['artists']
+
+    def __contains__(self, artist_id):
+        return artist_id in self.artists
+
+    # remembers the artists credited on a track
+    # params: track_id--spotify track id
+    #         artists--list of (artist id, name) tuples, main artist first
+    def add_track(self, track_id, artists):
+        if not artists or self.track_artists.get(track_id) == [artist_id for artist_id, name in artists]:
+            return
+        with self._lock:
+            self.track_artists[track_id] = [artist_id for artist_id, name in artists]
+            for artist_id, name in artists:
+                if artist_id not in self.artists:
+                    self.artists[artist_id] = {'name': name, 'genres': None, 'popularity': None}
+            self._dirty = True
+
+    # gets the ids of the artists credited on a track
+    # return: list of artist ids, empty if the track was played before artist ids were kept
+    def artist_ids(self, track_id):
+        return self.track_artists.get(track_id, [])
+
+    def name(self, artist_id):
+        artist = self.artists.get(artist_id)
+        return artist['name'] if artist else None
+
+    # return: list of genres, empty if unknown or not fetched yet
+    def genres(self, artist_id):
+        artist = self.artists.get(artist_id)
+        return (artist['genres'] or []) if artist else []
+
+    # fetches the genres and popularity of artists that have never been looked up
+    # params: auth--spotify authorization
+    #         artist_ids--optional iterable of artist ids; defaults to every artist in the catalog
+    # return: number of artists fetched from spotify
+    def fetch(self, auth, artist_ids=None):
+        if artist_ids is None:
+            artist_ids = self.artists
+        missing = sorted({artist_id for artist_id in artist_ids
+                          if artist_id in self.artists and self.artists[artist_id]['genres'] is None})
+        if not missing:
+            return 0
+
+        print(f'fetching {len(missing)} artists')
+        fetched = 0
+        for sub_list in spotify_api.get_artists(auth, missing):
+            with self._lock:
+                for artist_id, item in zip(missing[fetched:], sub_list['artists']):
+                    artist = self.artists[artist_id]
+                    # spotify returns null for artists it no longer has
+                    if item is None:
+                        artist['genres'] = []
+                        continue
+                    # names can change; the id is what counts are keyed by
+                    artist['name'] = item['name']
+                    artist['genres'] = item['genres']
+                    artist['popularity'] = item['popularity']
+                fetched += len(sub_list['artists'])
+                self._dirty = True
+        return fetched
+
+    # writes the catalog to disk if anything changed
+    def persist(self):
+        if self._dirty:
+            with self._lock:
+                contents = {'tracks': dict(self.track_artists), 'artists': dict(self.artists)}
+                self._dirty = False
+            atomic_write(self.file_path, contents)
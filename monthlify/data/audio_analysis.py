@@ -0,0 +1,187 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
+
+import numpy as np
+
+from monthlify.data import spotify_api
+from monthlify.data import storage
+from monthlify.data import codec
+from monthlify.data.storage import atomic_write
+
+ANALYSIS_DIR = './play_log/analysis'
+
+# requests to the audio analysis endpoint in flight at once
+ANALYSIS_WORKERS = 4
+# tracks stored between writes of the index, so an interrupted fetch keeps most of its work
+ANALYSIS_PERSIST_EVERY = 50
+
+# start, duration, and confidence of every beat or bar
+BEAT_DTYPE = np.dtype([('start', '<f4'), ('duration', '<f4'), ('confidence', '<f4')])
+SECTION_DTYPE = np.dtype([('start', '<f4'), ('duration', '<f4'), ('confidence', '<f4'),
+                          ('loudness', '<f4'), ('tempo', '<f4'), ('tempo_confidence', '<f4'),
+                          ('key', 'i1'), ('key_confidence', '<f4'), ('mode', 'i1'), ('time_signature', 'i1')])
+ANALYSIS_DTYPES = {'beats': BEAT_DTYPE, 'bars': BEAT_DTYPE, 'sections': SECTION_DTYPE}
+
+# per track values derived from the analysis when it is stored, joinable with the audio features
+ANALYSIS_SCALARS = ('tempo_stability', 'beat_confidence', 'key_changes', 'loudness_range', 'sections')
+
+# sections less sure of their key than this don't count towards key changes
+KEY_CONFIDENCE = 0.3
+
+_shared_store = None
+_shared_lock = threading.Lock()
+
+
+# gets the analysis store shared by everything in this process, loading it on first use
+def get_shared_analysis_store():
+    global _shared_store
+    with _shared_lock:
+        if _shared_store is None:
+            _shared_store = AnalysisStore()
+    return _shared_store
+
+
+# packs the beats, bars, or sections of an analysis into a typed array
+def _to_array(items, dtype):
+    array = np.zeros(len(items), dtype=dtype)
+    for name in dtype.names:
+        array[name] = [item.get(name) or 0 for item in items]
+    return array
+
+
+# calculates the per track values of an analysis
+# params: arrays--dict of 'beats', 'bars', and 'sections' to typed arrays
+# return: dict of every name in ANALYSIS_SCALARS to its value
+def derive_scalars(arrays):
+    beats = arrays['beats']
+    sections = arrays['sections']
+    durations = beats['duration'][beats['duration'] > 0]
+    tempo_stability = None
+    if len(durations) > 1:
+        # 1 for a click track, lower the more the beat drifts
+        tempo_stability = max(0.0, 1 - float(durations.std() / durations.mean()))
+    keys = sections['key'][sections['key_confidence'] >= KEY_CONFIDENCE]
+    return {'tempo_stability': tempo_stability,
+            'beat_confidence': float(beats['confidence'].mean()) if len(beats) else None,
+            'key_changes': int(np.count_nonzero(keys[1:] != keys[:-1])),
+            'loudness_range': float(np.ptp(sections['loudness'])) if len(sections) else None,
+            'sections': len(sections)}
+
+
+# local store of spotify audio analyses keyed by track id
+# the beats, bars, and sections of every track are appended to one packed binary file per kind
+# and read back through memory mapping; the index holds where each track's rows are and its
+# derived scalars, so the scalars never need the arrays read
+class AnalysisStore:
+
+    def __init__(self, directory=ANALYSIS_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._index_path = os.path.join(directory, 'index.json')
+        # track id to None if spotify has no analysis, otherwise a dict of
+        # 'beats', 'bars', 'sections'--[offset, count] rows in each file
+        # 'scalars'--dict of derived values
+        self.index = {}
+        self._maps = {}
+        self._lock = threading.Lock()
+        if os.path.isfile(self._index_path):
+            self.index = codec.load(self._index_path)
+
+    def _path(self, kind):
+        return os.path.join(self.directory, f'{kind}.bin')
+
+    def __contains__(self, track_id):
+        return track_id in self.index
+
+    # gets the beats, bars, or sections of a track
+    # params: kind--'beats', 'bars', or 'sections'
+    # return: structured array of ANALYSIS_DTYPES[kind], or None if the track has no analysis
+    def get(self, track_id, kind):
+        entry = self.index.get(track_id)
+        if entry is None:
+            return None
+        offset, count = entry[kind]
+        if not count:
+            return np.zeros(0, dtype=ANALYSIS_DTYPES[kind])
+        array = self._maps.get(kind)
+        if array is None or len(array) < offset + count:
+            # the file has grown since it was mapped
+            array = np.memmap(self._path(kind), dtype=ANALYSIS_DTYPES[kind], mode='r')
+            self._maps[kind] = array
+        return array[offset:offset + count]
+
+    # gets the derived values of a track
+    # return: dict of every name in ANALYSIS_SCALARS to its value, or None without an analysis
+    def scalars(self, track_id):
+        entry = self.index.get(track_id)
+        return entry['scalars'] if entry else None
+
+    # stores the analysis of a track, appending its arrays to the packed files
+    # params: analysis--json object from spotify, or None if spotify has none
+    def add(self, track_id, analysis):
+        if analysis is None:
+            with self._lock:
+                self.index[track_id] = None
+            return
+        arrays = {kind: _to_array(analysis.get(kind, []), dtype) for kind, dtype in ANALYSIS_DTYPES.items()}
+        entry = {'scalars': derive_scalars(arrays)}
+        with self._lock:
+            for kind, array in arrays.items():
+                with open(self._path(kind), mode='ab') as file:
+                    # rows of a write that never made it into the index are skipped, not reused
+                    offset = file.tell() // array.itemsize
+                    padding = file.tell() % array.itemsize
+                    if padding:
+                        file.write(bytes(array.itemsize - padding))
+                        offset += 1
+                    file.write(array.tobytes())
+                    file.flush()
+                    os.fsync(file.fileno())
+                entry[kind] = [offset, len(array)]
+            self.index[track_id] = entry
+
+    # fetches and stores the analysis of every track not already in the store
+    # a bounded number of requests run at once and results are stored as they arrive
+    # params: auth--spotify authorization
+    #         track_ids--iterable of track ids
+    #         workers--number of requests in flight at once
+    # return: number of tracks fetched from spotify
+    def fetch(self, auth, track_ids, workers=ANALYSIS_WORKERS):
+        missing = sorted({track_id for track_id in track_ids if track_id and track_id not in self.index})
+        if not missing:
+            return 0
+
+        print(f'fetching audio analysis for {len(missing)} tracks')
+        fetched = 0
+        # only one process appends to the packed files at a time
+        with storage.file_lock('analysis'), ThreadPoolExecutor(max_workers=workers) as executor:
+            self.reload()
+            futures = {executor.submit(spotify_api.get_audio_analysis, auth, track_id): track_id
+                       for track_id in missing if track_id not in self.index}
+            try:
+                for future in as_completed(futures):
+                    self.add(futures[future], future.result())
+                    fetched += 1
+                    if fetched % ANALYSIS_PERSIST_EVERY == 0:
+                        self.persist()
+            finally:
+                for future in futures:
+                    future.cancel()
+                self.persist()
+        return fetched
+
+    # picks up analyses another process stored; call while holding the analysis lock
+    def reload(self):
+        if not os.path.isfile(self._index_path):
+            return
+        index = codec.load(self._index_path)
+        with self._lock:
+            index.update(self.index)
+            self.index = index
+
+    def persist(self):
+        with self._lock:
+            index = dict(self.index)
+        atomic_write(self._index_path, index)
@@ -0,0 +1,205 @@
+import importlib.util
+import json
+
+# every play_log file is either plain json, which is what every file was before codecs, or a
+# frame of MAGIC, the format version, and the name of the codec on one line followed by the
+# encoded payload, so any file can be read no matter which codec wrote it
+MAGIC = b'MFY'
+FORMAT_VERSION = 1
+
+# every codec there is, whether or not its library is installed
+CODEC_NAMES = ('json', 'orjson', 'msgspec', 'msgpack')
+# json codecs from fastest to slowest; the fastest installed one is the default
+_JSON_PREFERENCE = ('orjson', 'msgspec', 'json')
+
+_default_name = None
+
+
+# the standard library's json, written without indents or spaces
+class JsonCodec:
+    name = 'json'
+    # whether the payload is framed; json is left bare so it stays readable by anything
+    framed = False
+
+    def encode(self, obj):
+        return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+    # params: schema--optional name of the schema of the data, e.g. 'day', for codecs that can
+    #                 decode straight into typed objects
+    def decode(self, data, schema=None):
+        return json.loads(data)
+
+
+# the optional libraries are only imported once a codec that needs them is used, so startup
+# doesn't pay for them
+class OrjsonCodec(JsonCodec):
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+        # integer keys e.g. catalog ids are written as strings, like the standard library does
+        self._options = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def encode(self, obj):
+        return self._orjson.dumps(obj, option=self._options)
+
+    def decode(self, data, schema=None):
+        return self._orjson.loads(data)
+
+
+# day files decode straight into the day schema, so the tracks and events come out already typed
+class MsgspecCodec(JsonCodec):
+    name = 'msgspec'
+
+    def __init__(self):
+        import msgspec.json
+        self._invalid = msgspec.ValidationError
+        self._encoder = msgspec.json.Encoder()
+        self._decoder = msgspec.json.Decoder()
+        self._typed = {'day': msgspec.json.Decoder(_day_schema())}
+
+    def encode(self, obj):
+        return self._encoder.encode(obj)
+
+    def decode(self, data, schema=None):
+        typed = self._typed.get(schema)
+        if typed is None:
+            return self._decoder.decode(data)
+        try:
+            contents = typed.decode(data)
+        except self._invalid:
+            # e.g. day files of an older version
+            return self._decoder.decode(data)
+        if isinstance(contents, list):
+            return contents
+        return {field: getattr(contents, field) for field in contents.__struct_fields__}
+
+
+# msgspec's msgpack, a binary encoding about two thirds the size of compact json
+class MsgpackCodec(MsgspecCodec):
+    name = 'msgpack'
+    framed = True
+
+    def __init__(self):
+        import msgspec.msgpack
+        self._invalid = msgspec.ValidationError
+        self._encoder = msgspec.msgpack.Encoder()
+        self._decoder = msgspec.msgpack.Decoder()
+        self._typed = {'day': msgspec.msgpack.Decoder(_day_schema())}
+
+
+_day_file = None
+
+
+# return: type of a day file of any version for msgspec; version 2 files decode into a struct
+#         and older ones into plain lists
+def _day_schema():
+    global _day_file
+    if _day_file is None:
+        from typing import Dict
+        from typing import List
+        from typing import Tuple
+        import msgspec
+
+        # a version 2 day file, see day_data
+        class DayFile(msgspec.Struct):
+            version: int
+            meta: dict
+            # [TrackCatalog integer id, plays] pairs
+            tracks: List[Tuple[int, int]]
+            # TrackCatalog integer id to played at ms
+            events: Dict[int, List[int]]
+
+        _day_file = DayFile
+    from typing import Union
+    return Union[_day_file, list]
+
+
+_CODEC_CLASSES = {'json': JsonCodec, 'orjson': OrjsonCodec, 'msgspec': MsgspecCodec, 'msgpack': MsgpackCodec}
+_REQUIRES = {'orjson': 'orjson', 'msgspec': 'msgspec', 'msgpack': 'msgspec'}
+_codecs = {}
+_installed = {}
+
+
+# whether a library can be imported, without importing it
+def _is_installed(module):
+    if module not in _installed:
+        _installed[module] = importlib.util.find_spec(module) is not None
+    return _installed[module]
+
+
+# return: tuple of the names of the codecs whose libraries are installed
+def available_codecs():
+    return tuple(name for name in CODEC_NAMES if name not in _REQUIRES or _is_installed(_REQUIRES[name]))
+
+
+# gets a codec by name
+# raises: ValueError if there is no such codec or its library isn't installed
+def get_codec(name):
+    codec = _codecs.get(name)
+    if codec is None:
+        if name not in _CODEC_CLASSES:
+            raise ValueError(f'unknown codec {name}')
+        if name not in available_codecs():
+            raise ValueError(f'the {name} codec needs {_REQUIRES[name]} installed')
+        codec = _codecs.setdefault(name, _CODEC_CLASSES[name]())
+    return codec
+
+
+# return: name of the fastest installed json codec
+def fastest_json():
+    installed = available_codecs()
+    return next(name for name in _JSON_PREFERENCE if name in installed)
+
+
+# sets the codec every file is written with from now on; files already written keep theirs
+# params: name--one of CODEC_NAMES, or None for the fastest installed json codec
+def set_default_codec(name):
+    global _default_name
+    if name is not None:
+        get_codec(name)
+    _default_name = name
+
+
+# return: name of the codec files are written with
+def default_codec():
+    return _default_name or fastest_json()
+
+
+# params: obj--json serializable object
+#         codec--optional codec name; defaults to default_codec()
+# return: the encoded bytes, framed if the codec isn't json
+def encode(obj, codec=None):
+    codec = get_codec(codec or default_codec())
+    payload = codec.encode(obj)
+    if codec.framed:
+        return MAGIC + bytes([FORMAT_VERSION]) + codec.name.encode('ascii') + b'\n' + payload
+    return payload
+
+
+# decodes bytes written by any codec, or by anything that writes json
+# params: data--bytes
+#         schema--optional name of the schema of the data e.g. 'day', see JsonCodec.decode
+def decode(data, schema=None):
+    if data[:len(MAGIC)] != MAGIC:
+        return get_codec(_reader_name(schema)).decode(data, schema)
+    header, payload = data.split(b'\n', 1)
+    version = header[len(MAGIC)]
+    if version > FORMAT_VERSION:
+        raise ValueError(f'file was written by a newer format version ({version})')
+    return get_codec(header[len(MAGIC) + 1:].decode('ascii')).decode(payload, schema)
+
+
+# json with a schema is read with msgspec when it's installed since it can decode typed
+# schemas; anything else with the fastest installed json codec
+def _reader_name(schema):
+    return 'msgspec' if schema and _is_installed('msgspec') else fastest_json()
+
+
+# reads and decodes a whole file
+# params: file_path--path of the file
+#         schema--optional name of the schema of the file, see decode
+def load(file_path, schema=None):
+    with open(file_path, mode='rb') as file:
+        return decode(file.read(), schema)
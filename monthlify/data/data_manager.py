@@ -1,16 +1,51 @@
-import json
+import calendar
+import contextlib
 import datetime
+import io
+import itertools
 import os
 import re
+import time
 from collections import defaultdict
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
 
-from monthlify.auth import authenticate
+from monthlify.auth import get_authorization
 from monthlify.core import read_config
-from monthlify.data.spotify_api import get_features
 from monthlify.data.spotify_api import get_recently_played
-from monthlify.data import PlaylistManager
+from monthlify.data.playlist_manager import PlaylistManager
+from monthlify.data.feature_cache import get_shared_cache
+from monthlify.data.track_catalog import get_shared_catalog
+from monthlify.data.artist_catalog import get_shared_artist_catalog
+from monthlify.data.isrc_cache import get_shared_isrc_cache
+from monthlify.data.leaderboard import get_shared_leaderboard
+from monthlify.data import archive
+from monthlify.data import sketches
+from monthlify.data import report_cache
+from monthlify.data.report_cache import cached_report
+from monthlify.data.report_cache import REPORT_CACHE
+from monthlify.data import codec
+from monthlify.data.storage import atomic_write
+from monthlify.data import storage
 import monthlify.data.day_data as day_data
 
+# difference from UTC used to decide which day a play belongs to
+TIME_ZONE_SHIFT = -6
+# fewest days of plays make_rising_playlist compares
+RISING_MIN_WINDOW = 7
+
+# days read and decoded ahead of whoever is iterating over a range
+DAY_READ_AHEAD = 16
+DAY_READ_WORKERS = 4
+
+# gets the local date today
+# params: shift--int difference from UTC
+# return: a date object
+def local_today(shift=TIME_ZONE_SHIFT):
+    return (datetime.datetime.utcnow() + datetime.timedelta(hours=shift)).date()
+
+
 # adjusts the timezone for a given time
 # params: time--string of the time to be adjusted e.g. (2019-08-04T08:40:30.880Z)
 #         shift--int difference from UTC; e.g. +8 or -8
@@ -31,6 +66,27 @@ def adjust_time_zone(time, shift):
     return time_string
 
 
+# parses a play time written by adjust_time_zone or a raw spotify played_at time
+# params: time--string of the time e.g. (2019-08-04T02:40:30.880000-0600)
+# return: a timezone aware datetime object
+def parse_play_time(time):
+    for time_format in ('%Y-%m-%dT%H:%M:%S.%f%z', '%Y-%m-%dT%H:%M:%S%z'):
+        try:
+            return datetime.datetime.strptime(time.replace('Z', '+0000'), time_format)
+        except ValueError:
+            continue
+    raise ValueError(f'unrecognized play time: {time}')
+
+
+# builds the key that uniquely identifies a single play
+# params: time--string of the time the track was played
+#         track_id--spotify id of the track
+# return: a tuple of (played at ms since epoch, track id)
+def get_event_key(time, track_id):
+    played_at_ms = int(round(parse_play_time(time).timestamp() * 1000))
+    return played_at_ms, track_id
+
+
 # determines spotify ID from spotify URI
 # params: tracks--a list of URIs
 # return: a list of IDs
@@ -51,27 +107,200 @@ def get_track_uris(tracks):
     return uris
 
 
+# trims away the extraneous info from a raw recently-played response
+# params: result--the decoded raw json response
+#         shift--int difference from UTC used to adjust play times
+# return: a list of dicts of track, artist, album, track_id, and time
+def trim_play_data(result, shift=TIME_ZONE_SHIFT):
+    result_list = []
+    for item in result['items']:
+        track_data_dict = {'track': item["track"]["name"],
+                           'artist': item["track"]["artists"][0]["name"],
+                           'album': item["track"]["album"]["name"],
+                           'track_id': item["track"]["id"],
+                           # every credited artist, so featured artists count too
+                           'artists': [[artist["id"], artist["name"]] for artist in item["track"]["artists"]],
+                           'time': adjust_time_zone(item["played_at"], shift)}
+        result_list.append(track_data_dict)
+    return result_list
+
+
+# gets the credited artists of a trimmed play
+# return: list of (artist id, name) tuples, empty for logs trimmed before artist ids were kept
+def get_artists(item):
+    return [tuple(artist) for artist in item.get('artists', [])]
+
+
+# reads a raw file and trims it for a rebuild; runs inside a worker process
+# rewrites the trimmed copy of the raw file as a side effect
+# params: filename--name of the raw json datafile in the play_log raw dir
+#         shift--int difference from UTC used to adjust play times
+# return: a list of (date string, track data tuple, event key) tuples, one per play
+def _scan_raw_file(filename, shift):
+    result = codec.load(f'./play_log/raw/{filename}')
+    if not len(result['items']):
+        return []
+
+    trimmed = trim_play_data(result, shift)
+    atomic_write(f'./play_log/trimmed/{filename}', trimmed)
+    return _get_plays(trimmed)
+
+
+# reads every raw log in a month's archive bundle for a rebuild; runs inside a worker process
+# params: month--YYYY-MM of the bundle
+#         shift--int difference from UTC used to adjust play times
+# return: a list of (date string, track data tuple, event key) tuples, one per play
+def _scan_raw_bundle(month, shift):
+    plays = []
+    for name, result in archive.iter_bundle('raw', month):
+        if len(result['items']):
+            plays.extend(_get_plays(trim_play_data(result, shift)))
+    return plays
+
+
+# params: trimmed--list of trimmed play dicts
+# return: a list of (date string, track data tuple, event key, artists) tuples, one per play
+def _get_plays(trimmed):
+    plays = []
+    for item in trimmed:
+        track_data = (item['track'], item['artist'], item['album'], item['track_id'])
+        date = parse_play_time(item['time']).date().isoformat()
+        plays.append((date, track_data, get_event_key(item['time'], item['track_id']), get_artists(item)))
+    return plays
+
+
 # extracts a DayData object for a given date
 # params: date--format YYYY-MM-DD
 # return: a DayData object
 def extract_day_data(date):
     # check if file exists, if so, import data
-    file_path = f'./play_log/days/{date}.json'
     day = day_data.DayData(date)
-    if os.path.isfile(file_path):
-        with open(file_path, mode='r') as read_file:
-            print('grabbing old data')
-            contents = json.load(read_file)
-            for item in contents[1]:
-                track = item['track']
-                artist = item['artist']
-                album = item['album']
-                track_id = item['track_id']
-                for i in range(item['plays']):
-                    day.add((track, artist, album, track_id))
+    contents = day_data.read_day_file(date)
+    if contents is not None:
+        print('grabbing old data')
+        for track_info, plays in contents['tracks']:
+            day.add(track_info, count=plays)
+        day.events.update(contents['events'])
+        # older files don't say which tracks were left out of their feature sums, so the sums
+        # counted from the local features as the tracks were added stand
+        meta_dict = contents['meta']
+        if 'pending features' in meta_dict:
+            day.load_feature_sums(meta_dict['feature sums'], meta_dict['feature plays'],
+                                  meta_dict['pending features'])
     return day
 
 
+# reads just the artist and album play counts of a day without rebuilding its tracks
+# params: date--format YYYY-MM-DD
+# return: a tuple of (dict of artist to plays, dict of (album, artist) to plays,
+#         dict of artist id to plays)
+def extract_day_counts(date):
+    artists = defaultdict(int)
+    albums = defaultdict(int)
+    artist_ids = defaultdict(int)
+    contents = day_data.read_day_file(date)
+    if contents is not None:
+        meta_dict = contents['meta']
+        if 'artists' in meta_dict:
+            artists.update(meta_dict['artists'])
+            for album, artist, plays in meta_dict['albums']:
+                albums[(album, artist)] = plays
+        else:
+            # older files only stored the top artists so count the tracks
+            for (track, artist, album, track_id), plays in contents['tracks']:
+                artists[artist] += plays
+                albums[(album, artist)] += plays
+        if 'artist ids' in meta_dict:
+            artist_ids.update(meta_dict['artist ids'])
+        else:
+            # files from before artist ids were kept count whatever the artist catalog knows
+            artist_catalog = get_shared_artist_catalog()
+            for (track, artist, album, track_id), plays in contents['tracks']:
+                for artist_id in artist_catalog.artist_ids(track_id):
+                    artist_ids[artist_id] += plays
+    return artists, albums, artist_ids
+
+
+# reads the plays of every track and artist of a day for the trend matrices
+# params: date--format YYYY-MM-DD
+# return: a tuple of (dict of TrackCatalog integer id to plays, dict of artist to plays)
+def extract_day_plays(date):
+    tracks = defaultdict(int)
+    artists = defaultdict(int)
+    contents = day_data.read_day_file(date)
+    if contents is not None:
+        catalog = get_shared_catalog()
+        for track_info, plays in contents['tracks']:
+            tracks[catalog.intern(track_info)] += plays
+            artists[track_info[1]] += plays
+    return tracks, artists
+
+
+# fingerprint of every day file; changes whenever a day is added, removed, or rewritten
+def days_fingerprint():
+    mtimes = [entry.stat().st_mtime_ns for entry in os.scandir('./play_log/days')
+              if day_data.DAY_FILE_NAME.match(entry.name)]
+    return [len(mtimes), max(mtimes, default=0)]
+
+
+# reads just the total plays of a day
+# params: date--format YYYY-MM-DD
+def extract_day_total(date):
+    contents = day_data.read_day_file(date)
+    if contents is None:
+        return 0
+    return contents['meta']['total plays']
+
+
+# extracts the sketch of the plays for a given date
+# params: date--format YYYY-MM-DD
+# return: a PlaySketch
+def extract_day_sketch(date):
+    file_path = sketches.sketch_path(date)
+    if os.path.isfile(file_path):
+        return sketches.PlaySketch.from_dict(codec.load(file_path))
+    # days written before sketches existed
+    return extract_day_data(date).sketch()
+
+
+# every date from start_date to end_date inclusive
+# params: start_date & end_date--strings in format YYYY-MM-DD
+# return: generator of date objects
+def iter_dates(start_date, end_date):
+    start = datetime.datetime.strptime(start_date, '%Y-%m-%d').date()
+    end = datetime.datetime.strptime(end_date, '%Y-%m-%d').date()
+    step = datetime.timedelta(days=1)
+    while start <= end:
+        yield start
+        start += step
+
+
+# loads every date of a range in order while worker threads read and decode the days ahead
+# at most read_ahead days are held in memory at once no matter how long the range is
+# params: start_date & end_date--strings in format YYYY-MM-DD
+#         loader--function of a date that loads the day e.g. extract_day_data
+#         read_ahead--max days loaded ahead of the consumer
+#         workers--number of threads reading days
+# return: generator of whatever loader returns, one per date
+def prefetch_days(start_date, end_date, loader, read_ahead=DAY_READ_AHEAD, workers=DAY_READ_WORKERS):
+    dates = iter_dates(start_date, end_date)
+    pending = deque()
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        for date in itertools.islice(dates, read_ahead):
+            pending.append(executor.submit(loader, date))
+        while pending:
+            day = pending.popleft().result()
+            for date in itertools.islice(dates, 1):
+                pending.append(executor.submit(loader, date))
+            yield day
+    finally:
+        # the consumer may stop early
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
 # merges any number of dicts with key overlap by combining and summing their values
 # accepts either dicts or lists of dicts as arguments
 def merge_dicts(*args):
@@ -91,14 +320,24 @@ def merge_dicts(*args):
 class DataManager:
 
     def __init__(self, username):
-        self._conf = read_config()
-        self._auth = authenticate(self._conf)
         self.user_name = username
+        self._playlist_manager = None
+
+    # only authenticate once something actually needs to talk to spotify
+    # the token is shared by everything in the process and renewed when it expires
+    @property
+    def _auth(self):
+        return get_authorization(read_config())
+
+    # one PlaylistManager is kept so its playlist and feature index caches stay warm
+    @property
+    def playlist_manager(self):
+        if self._playlist_manager is None:
+            self._playlist_manager = PlaylistManager()
+        return self._playlist_manager
 
     # scrapes the recent track data and processes it
     def get_recent_play_data(self, last_scraped=0):
-        # reauthenticate in case token has expired
-        self._auth = authenticate(self._conf)
         filename = get_recently_played(self._auth, last_scraped)
         self._trim_play_log(filename)
         self.process_play_log(filename)
@@ -107,183 +346,960 @@ class DataManager:
     # saves the trimmed data file in /data/json and does not touch raw file (unless empty)
     # params: filename--name of the raw json datafile in the play_log raw dir
     def _trim_play_log(self, filename):
-        with open(f'./play_log/raw/{filename}', mode='r') as file:
-            result = json.load(file)
-
-            # if raw file contains no play info, just delete it
-            if not len(result["items"]):
-                os.remove(f'./play_log/raw/{filename}')
-                print("null file removed")
-                return
-
-            result_list = []
-            for i in range(len(result['items'])):
-                track = result["items"][i]["track"]["name"]
-                artist = result["items"][i]["track"]["artists"][0]["name"]
-                album = result["items"][i]["track"]["album"]["name"]
-                track_id = result["items"][i]["track"]["id"]
-                time = result["items"][i]["played_at"]
-                adj_time = adjust_time_zone(time, -6)
-
-                track_data_dict = {'track': track,
-                                   'artist': artist,
-                                   'album': album,
-                                   'track_id': track_id,
-                                   'time': adj_time}
-                result_list.append(track_data_dict)
-
-            with open(f'./play_log/trimmed/{filename}', mode='w') as out_file:
-                json.dump(result_list, out_file, indent=2, separators=(',', ':'))
-                print("trimmed file written")
+        result = codec.load(f'./play_log/raw/{filename}')
+
+        # if raw file contains no play info, just delete it
+        if not len(result["items"]):
+            os.remove(f'./play_log/raw/{filename}')
+            print("null file removed")
+            return
+
+        result_list = trim_play_data(result)
+
+        atomic_write(f'./play_log/trimmed/{filename}', result_list)
+        print("trimmed file written")
 
     # processes the given play log by creating daydata objects, populating with data, and persisting
     # params: filename--name of the json file to be processed
     def process_play_log(self, filename):
         print(f'processing {filename}')
         try:
-            with open(f'./play_log/trimmed/{filename}', mode='r') as data_file:
-                data = json.load(data_file)
-
-                # collect all the data for each play
-                # temporarily store as (track data, date, id) tuples in a list
-                plays_by_day = defaultdict(list)
-                for item in data:
-                    track_data = (item['track'], item['artist'], item['album'], item['track_id'])
-                    date_str = item['time']
-                    date = datetime.datetime.strptime(date_str, '%Y-%m-%dT%H:%M:%S.%f%z').date()
-                    plays_by_day[date].append(track_data)
-                # key is a date and value is a list of tuples; write a file for each date
-                for key, value in plays_by_day.items():
+            data = codec.load(f'./play_log/trimmed/{filename}')
+        # if the data file was null and deleted, do nothing
+        except FileNotFoundError:
+            return
+        self._process_play_data(data)
+
+    # processes every raw log packed into the archive bundles
+    # safe to run repeatedly since plays that were already counted are skipped
+    def process_archived_play_logs(self):
+        for name, result in archive.iter_archive('raw'):
+            if len(result['items']):
+                print(f'processing archived {name}')
+                self._process_play_data(trim_play_data(result))
+
+    # packs the raw and trimmed logs of every finished month into compressed monthly bundles
+    # params: before--YYYY-MM month to stop at; defaults to the current month
+    def compact_play_logs(self, before=None):
+        for kind in ('raw', 'trimmed'):
+            archive.compact(kind, before)
+
+    # counts the plays of a trimmed play log into the day files
+    # nothing is fetched here; features come from the local cache and everything still unknown
+    # is queued for run_enrichment, so ingest never waits on spotify
+    # params: data--list of trimmed play dicts
+    def _process_play_data(self, data):
+        from monthlify.data import event_log
+        artist_catalog = get_shared_artist_catalog()
+        # collect all the data for each play
+        # temporarily store as (track data, event key) tuples in a list
+        plays_by_day = defaultdict(list)
+        for item in data:
+            track_data = (item['track'], item['artist'], item['album'], item['track_id'])
+            date_str = item['time']
+            date = parse_play_time(date_str).date()
+            event = get_event_key(date_str, item['track_id'])
+            plays_by_day[date].append((track_data, event))
+            artist_catalog.add_track(item['track_id'], get_artists(item))
+        # key is a date and value is a list of tuples; write a file for each date
+        catalog = get_shared_catalog()
+        new_events = []
+        pending_features = set()
+        pending_days = []
+        unindexed_days = []
+        # writers take the catalog lock and then the lock of every day they rewrite, in date order;
+        # the days are renamed into place together before any lock is released
+        with contextlib.ExitStack() as locks:
+            locks.enter_context(storage.catalog_lock())
+            catalog.reload()
+            artist_catalog.reload()
+            known_tracks = len(catalog)
+            leaderboard = self._current_leaderboard()
+            with storage.group_commit():
+                for key, value in sorted(plays_by_day.items()):
                     print(f'processing play log date: {key}')
                     # check for existing file and extract data
+                    locks.enter_context(storage.day_lock(key))
                     day = extract_day_data(key)
+                    # days written before plays were indexed by event can't tell which plays
+                    # they already count, so merging into one would count them all again;
+                    # rebuild recounts them from the raw logs with an index
+                    if day.total_plays and not day.events:
+                        print(f'{key} has no event index, skipping {len(value)} plays')
+                        unindexed_days.append(key)
+                        continue
 
-                    # integrate new data
+                    # integrate new data, skipping plays that were already counted
                     print('integrating new data')
-                    for track_tuple in value:
-                        day.add(track_tuple)
-                    day.persist()
-        # if the data file was null and deleted, do nothing
-        except FileNotFoundError:
-            return
+                    added = 0
+                    month = key.strftime('%Y-%m')
+                    for track_tuple, event in value:
+                        if day.add(track_tuple, event):
+                            added += 1
+                            index = catalog.intern(track_tuple)
+                            new_events.append((month, event[0] // 1000, index))
+                            if month == leaderboard.month:
+                                leaderboard.add(index, track_tuple[1])
+                    print(f'{added} new plays, {len(value) - added} already counted')
+                    if added:
+                        day.persist(fetch=False)
+                        if day.pending_features():
+                            pending_features.update(day.pending_features())
+                            pending_days.append(key)
+                        if month == leaderboard.month:
+                            leaderboard.set_day_features(key, day.feature_sums, day.feature_plays)
+                catalog.persist()
+                artist_catalog.persist()
+            # written after the days are in place so readers never see plays the days don't have
+            if new_events:
+                leaderboard.persist()
+
+            # keep the time of every new play for time of day analytics
+            event_log.EventLog().append(new_events)
+
+            self._queue_enrichment([catalog.get(index)[3] for index in range(known_tracks, len(catalog))],
+                                   pending_features, pending_days)
+        if unindexed_days:
+            print(f'{len(unindexed_days)} days were written before plays were indexed and weren\'t '
+                  f'updated; run rebuild to count their plays')
+
+    # queues the lookups that newly played tracks need
+    # params: track_ids--ids of tracks new to the catalog
+    #         feature_ids--ids of tracks whose features aren't cached
+    #         dates--days written without the features of some of their tracks
+    def _queue_enrichment(self, track_ids, feature_ids, dates):
+        from monthlify.data.enrichment_queue import get_shared_enrichment_queue
+        queue = get_shared_enrichment_queue()
+        artist_catalog = get_shared_artist_catalog()
+        queued = queue.push('features', feature_ids)
+        queued += queue.push('isrcs', track_ids)
+        queued += queue.push('lyrics', track_ids)
+        queued += queue.push('artists', {artist_id for track_id in track_ids
+                                         for artist_id in artist_catalog.artist_ids(track_id)})
+        queued += queue.push('days', dates)
+        if queued:
+            print(f'queued {queued} lookups for enrichment')
+
+    # queues every lookup that was never done for any played track, e.g. for plays ingested
+    # before the enrichment queue existed
+    # return: number of jobs queued
+    def queue_missing_enrichment(self):
+        from monthlify.data.enrichment_queue import get_shared_enrichment_queue
+        from monthlify.data.lyric_scores import get_shared_lyric_scores
+        queue = get_shared_enrichment_queue()
+        track_ids = [track[3] for track in get_shared_catalog().tracks]
+        features = get_shared_cache()
+        isrcs = get_shared_isrc_cache()
+        lyric_scores = get_shared_lyric_scores()
+        artist_catalog = get_shared_artist_catalog()
+        return (queue.push('features', [track_id for track_id in track_ids if track_id not in features])
+                + queue.push('isrcs', [track_id for track_id in track_ids if track_id not in isrcs])
+                + queue.push('lyrics', [track_id for track_id in track_ids if track_id not in lyric_scores])
+                + queue.push('artists', [artist_id for artist_id, artist in artist_catalog.artists.items()
+                                         if artist['genres'] is None]))
+
+    # works through the enrichment queue until nothing is ready; each round fetches a batch of
+    # every kind at once, one worker per kind, and then refreshes the days that were waiting on
+    # features; failed batches are retried later with backoff
+    # params: batch_size--max jobs of a kind claimed per round
+    #         lyric_workers--lyric pages fetched at once
+    # return: dict of kind to number of jobs worked on
+    def run_enrichment(self, batch_size=500, lyric_workers=4):
+        from monthlify.data.enrichment_queue import DAY_KIND
+        from monthlify.data.enrichment_queue import FETCH_KINDS
+        from monthlify.data.enrichment_queue import get_shared_enrichment_queue
+        queue = get_shared_enrichment_queue()
+        handlers = {'features': self._enrich_features,
+                    'artists': self._enrich_artists,
+                    'isrcs': self._enrich_isrcs,
+                    'lyrics': lambda track_ids: self._enrich_lyrics(track_ids, lyric_workers)}
+        totals = defaultdict(int)
+        while True:
+            with ThreadPoolExecutor(max_workers=len(FETCH_KINDS)) as executor:
+                futures = {kind: executor.submit(self._run_enrichment_batch, queue, kind, handlers[kind], batch_size)
+                           for kind in FETCH_KINDS}
+            worked = {kind: future.result() for kind, future in futures.items()}
+            worked[DAY_KIND] = self._run_enrichment_batch(queue, DAY_KIND, self._refresh_day_features, batch_size)
+            for kind, count in worked.items():
+                totals[kind] += count
+            if not any(worked.values()):
+                break
+        # genres, isrcs, and lyric scores are joined in at query time, so cached reports are stale
+        if any(totals[kind] for kind in ('artists', 'isrcs', 'lyrics')):
+            REPORT_CACHE.clear()
+        return dict(totals)
+
+    # claims a batch of jobs and runs it, completing the jobs if it succeeds
+    # return: number of jobs claimed
+    def _run_enrichment_batch(self, queue, kind, handler, batch_size):
+        from monthlify.data.enrichment_queue import RETRY_DELAY
+        keys = queue.claim(kind, batch_size)
+        if not keys:
+            return 0
+        try:
+            waiting = handler(keys) or set()
+        except Exception as e:
+            print(f'{kind} enrichment of {len(keys)} failed, will retry: {e!r}')
+            queue.fail(kind, keys, repr(e))
+            return len(keys)
+        queue.complete(kind, [key for key in keys if key not in waiting])
+        # jobs waiting on other jobs come back once those have had a chance to run
+        queue.release(kind, waiting, RETRY_DELAY)
+        return len(keys)
+
+    def _enrich_features(self, track_ids):
+        features = get_shared_cache()
+        features.fetch(self._auth, track_ids)
+        with storage.file_lock('features'):
+            features.reload()
+            features.persist()
+
+    def _enrich_artists(self, artist_ids):
+        artist_catalog = get_shared_artist_catalog()
+        artist_catalog.fetch(self._auth, artist_ids)
+        with storage.catalog_lock():
+            artist_catalog.reload()
+            artist_catalog.persist()
+
+    def _enrich_isrcs(self, track_ids):
+        isrcs = get_shared_isrc_cache()
+        isrcs.fetch(self._auth, track_ids)
+        with storage.catalog_lock():
+            isrcs.reload()
+            isrcs.persist()
 
+    def _enrich_lyrics(self, track_ids, workers):
+        from monthlify.data.lyric_scores import get_shared_lyric_scores
+        catalog = get_shared_catalog()
+        # the lock is only held while reading the catalog, not while the lyrics are fetched
+        with storage.catalog_lock():
+            catalog.reload()
+        tracks = {}
+        for track_id in track_ids:
+            index = catalog.index(track_id)
+            if index is not None:
+                track, artist, album, track_id = catalog.get(index)
+                tracks[track_id] = (track, artist)
+        get_shared_lyric_scores().score(tracks, workers)
+
+    # counts the features fetched since some days were written into their averages and the leaderboard
+    # params: dates--list of YYYY-MM-DD
+    # return: set of the dates still waiting on queued feature lookups
+    def _refresh_day_features(self, dates):
+        from monthlify.data.enrichment_queue import get_shared_enrichment_queue
+        queue = get_shared_enrichment_queue()
+        catalog = get_shared_catalog()
+        features = get_shared_cache()
+        with storage.file_lock('features'):
+            features.reload()
+        waiting = set()
+        refreshed = False
+        # same lock order as ingest: the catalog and then every day in date order
+        with contextlib.ExitStack() as locks:
+            locks.enter_context(storage.catalog_lock())
+            catalog.reload()
+            leaderboard = self._current_leaderboard()
+            with storage.group_commit():
+                for date in sorted(dates):
+                    locks.enter_context(storage.day_lock(date))
+                    day = extract_day_data(date)
+                    feature_plays = day.feature_plays
+                    day.recompute_features()
+                    if day.feature_plays != feature_plays:
+                        day.persist(fetch=False)
+                        refreshed = True
+                        if date[:7] == leaderboard.month:
+                            leaderboard.set_day_features(date, day.feature_sums, day.feature_plays)
+                    if queue.queued('features', day.pending_features()):
+                        waiting.add(date)
+            if refreshed:
+                leaderboard.persist()
+            # days written before the catalog intern their tracks as they're read
+            catalog.persist()
+        return waiting
+
+    # trims and processes every raw file in the play_log raw dir
+    # safe to run repeatedly since plays that were already counted are skipped
+    def process_all_play_logs(self):
+        files = sorted(basename for basename in os.listdir('./play_log/raw')
+                       if basename.endswith('.json'))
+        for filename in files:
+            self._trim_play_log(filename)
+            self.process_play_log(filename)
+
+    # rebuilds every day file in play_log/days from scratch using the raw files
+    # raw files are scanned in parallel, plays are reduced by day in memory,
+    # and each day is written exactly once with features fetched in one batch
+    # params: shift--int difference from UTC used to adjust play times
+    #         processes--number of worker processes; defaults to the number of cpus
+    # return: number of days written
+    def rebuild(self, shift=TIME_ZONE_SHIFT, processes=None):
+        from monthlify.data import event_log
+        start_time = time.perf_counter()
+        files = sorted(basename for basename in os.listdir('./play_log/raw')
+                       if basename.endswith('.json'))
+
+        months = archive.list_months('raw')
+        features = get_shared_cache()
+
+        # ingest can't add to the catalog or the days while they are being rebuilt
+        with storage.catalog_lock():
+            get_shared_catalog().reload()
+            artist_catalog = get_shared_artist_catalog()
+            artist_catalog.reload()
+            days = {}
+            total_plays = 0
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                chunksize = max(1, len(files) // ((processes or os.cpu_count() or 1) * 4))
+                # archived months are scanned a whole bundle per task
+                results = itertools.chain(
+                    executor.map(_scan_raw_bundle, months, [shift] * len(months)),
+                    executor.map(_scan_raw_file, files, [shift] * len(files), chunksize=chunksize))
+                for plays in results:
+                    for date, track_data, event, artists in plays:
+                        artist_catalog.add_track(track_data[3], artists)
+                        if date not in days:
+                            days[date] = day_data.DayData(date, self._auth, features)
+                        if days[date].add(track_data, event):
+                            total_plays += 1
+            scan_time = time.perf_counter() - start_time
+            print(f'scanned {len(files)} files and {len(months)} archived months in {scan_time:.2f}s '
+                  f'({len(files) / max(scan_time, 1e-9):.0f} files/s, '
+                  f'{total_plays / max(scan_time, 1e-9):.0f} plays/s)')
+
+            # one batched feature lookup for every track in the rebuild
+            catalog = get_shared_catalog()
+            features.fetch(self._auth, {catalog.get(index)[3] for day in days.values() for index in day.dict})
+            with storage.file_lock('features'):
+                features.reload()
+                features.persist()
+
+            events = []
+            for date in sorted(days):
+                with storage.day_lock(date):
+                    days[date].persist(features)
+                for played_at_ms, track_id in days[date].events:
+                    events.append((date[:7], played_at_ms // 1000, catalog.index(track_id)))
+            catalog.persist()
+            artist_catalog.persist()
+            event_log.EventLog().rewrite(events)
+
+            # days that no longer have any plays (e.g. after a time zone change) are stale
+            stale = [date for date in day_data.day_file_dates() if date not in days]
+            for date in stale:
+                with storage.day_lock(date):
+                    os.remove(f'./play_log/days/{date}.json')
+                    # the sketch would still count the day in range queries
+                    if os.path.isfile(sketches.sketch_path(date)):
+                        os.remove(sketches.sketch_path(date))
+                    report_cache.bump_version(date)
+
+            # count the current month again from the rebuilt days
+            get_shared_leaderboard().reset(None)
+            self._current_leaderboard().persist()
+
+        elapsed = time.perf_counter() - start_time
+        print(f'rebuilt {len(days)} days from {total_plays} plays in {elapsed:.2f}s '
+              f'({len(days) / max(elapsed, 1e-9):.1f} days/s), removed {len(stale)} stale days')
+        return len(days)
+
+    # gets the leaderboard of the current month, starting a new one when the month rolls over
+    # a new leaderboard counts the days of the month already written once; after that
+    # ingest keeps it up to date play by play
+    # return: the shared Leaderboard
+    def _current_leaderboard(self):
+        leaderboard = get_shared_leaderboard()
+        today = local_today()
+        month = today.strftime('%Y-%m')
+        last_day = calendar.monthrange(today.year, today.month)[1]
+        leaderboard.start_month(month, lambda: self.iter_days(f'{month}-01', f'{month}-{last_day:02d}'))
+        return leaderboard
+
+    # whether a date range is the whole of the current month so far, which the leaderboard holds
+    # params: start_date & end_date: YYYY-MM-DD
+    def _is_current_month(self, start_date, end_date):
+        today = local_today()
+        return (start_date == today.strftime('%Y-%m-01') and end_date[:7] == start_date[:7]
+                and end_date >= today.isoformat())
+
+    # writes the summary of a date range to play_log/summaries
     def write_summary_for_date_range(self, start_date, end_date):
-        start = datetime.datetime.strptime(start_date, '%Y-%m-%d').date()
-        end = datetime.datetime.strptime(end_date, '%Y-%m-%d').date()
-        step = datetime.timedelta(days=1)
+        summary = self._get_summary_text(start_date, end_date)
+        with open(f'./play_log/summaries/{start_date}-{end_date}.txt', mode='w') as file:
+            file.write(summary)
 
+    @cached_report()
+    def _get_summary_text(self, start_date, end_date):
         print('finding top tracks')
         top_tracks = self.get_most_played_tracks(start_date, end_date, 10)
         print('finding top artists')
         top_artists = self.get_most_played_artists(start_date, end_date, 10)
+        print('finding top albums')
+        top_albums = self.get_most_played_albums(start_date, end_date, 10)
+        print('finding top genres')
+        top_genres = self.get_most_played_genres(start_date, end_date, 10)
         print('finding meta data')
         meta_data = self.analyze_data_date_range(start_date, end_date)
+        lyric_total = self.get_lyric_series(start_date, end_date, 'all')[0]
+        lyric_days = {date: (sentiment, richness)
+                      for date, sentiment, richness, plays in self.get_lyric_series(start_date, end_date)}
 
-        with open(f'./play_log/summaries/{start_date}-{end_date}.txt', mode='w') as file:
-            file.write(f'Summary for {start_date} to {end_date}\n')
-
-            # write top tracks
-            file.write(f'\tTop Tracks:\n')
-            for track in top_tracks:
-                file.write(f'\t\t{track[0][0]} by {track[0][1]} with {track[1]} plays\n')
-
-            # write top artists
-            file.write(f'\tTop Artists:\n')
-            for artist in top_artists:
-                file.write(f'\t\t{artist[0]} with {artist[1]} plays\n')
-
-            # write meta data
-            file.write(f'\tAverage Energy: {meta_data[0]:.3f}\n')
-            file.write(f'\tAverage Tempo: {meta_data[1]:.1f}\n')
-            file.write(f'\tAverage Valence: {meta_data[2]:.3f}\n\n')
-
-            # write data for each day
-            while start <= end:
-                start_string = start.strftime('%Y-%m-%d')
-                file.write(f'{start_string}\n')
-
-                # get the meta data
-                artists = self.get_most_played_artists(start_string)
-                analysis = self.analyze_data_date_range(start_string)
-                # not every day will have 5 artists played
-                top_artists = artists[:5]
-                total_plays = 0
-                for artist in artists:
-                    total_plays += artist[1]
-                file.write(f'\tTotal Plays: {total_plays}')
-                file.write(f'\tTop Artists:\n')
-                for i in range(len(top_artists)):
-                    file.write(f'\t\t{top_artists[i][0]} with {top_artists[i][1]} plays\n')
-
-                file.write(f'\tAverage Energy: {analysis[0]:.3f}\n')
-                file.write(f'\tAverage Tempo: {analysis[1]:.1f}\n')
-                file.write(f'\tAverage Valence: {analysis[2]:.3f}\n\n')
-
-                start += step
+        file = io.StringIO()
+        file.write(f'Summary for {start_date} to {end_date}\n')
+
+        # write top tracks
+        file.write('\tTop Tracks:\n')
+        for track in top_tracks:
+            file.write(f'\t\t{track[0][0]} by {track[0][1]} with {track[1]} plays\n')
+
+        # write top artists
+        file.write('\tTop Artists:\n')
+        for artist in top_artists:
+            file.write(f'\t\t{artist[0]} with {artist[1]} plays\n')
+
+        # write top albums
+        file.write('\tTop Albums:\n')
+        for album in top_albums:
+            file.write(f'\t\t{album[0][0]} by {album[0][1]} with {album[1]} plays\n')
+
+        # write top genres, if any artists have been enriched
+        if top_genres:
+            file.write('\tTop Genres:\n')
+            for genre in top_genres:
+                file.write(f'\t\t{genre[0]} with {genre[1]} plays\n')
+
+        # write meta data
+        file.write(f'\tAverage Energy: {meta_data[0]:.3f}\n')
+        file.write(f'\tAverage Tempo: {meta_data[1]:.1f}\n')
+        file.write(f'\tAverage Valence: {meta_data[2]:.3f}\n')
+        # only once score_lyrics has scored some of the tracks played
+        if lyric_total[1] is not None:
+            file.write(f'\tAverage Lyric Sentiment: {lyric_total[1]:.3f}\n')
+            file.write(f'\tAverage Lexical Richness: {lyric_total[2]:.1f}\n')
+        file.write('\n')
+
+        # write data for each day
+        for day in self.iter_days(start_date, end_date):
+            file.write(f'{day.date}\n')
+
+            # get the meta data
+            artists = day.most_common_artists()
+            analysis = day.meta_data
+            # not every day will have 5 artists played
+            top_artists = artists[:5]
+            file.write(f'\tTotal Plays: {day.total_plays}')
+            file.write('\tTop Artists:\n')
+            for i in range(len(top_artists)):
+                file.write(f'\t\t{top_artists[i][0]} with {top_artists[i][1]} plays\n')
+
+            file.write(f'\tAverage Energy: {analysis[0]:.3f}\n')
+            file.write(f'\tAverage Tempo: {analysis[1]:.1f}\n')
+            file.write(f'\tAverage Valence: {analysis[2]:.3f}\n')
+            sentiment, richness = lyric_days.get(str(day.date), (None, None))
+            if sentiment is not None:
+                file.write(f'\tAverage Lyric Sentiment: {sentiment:.3f}\n')
+                file.write(f'\tAverage Lexical Richness: {richness:.1f}\n')
+            file.write('\n')
+
+        return file.getvalue()
+
+    # streams the DayData of every day in a date range, reading days ahead on worker threads
+    # aggregations can fold over it without holding the whole range in memory
+    # params: start_date & end_date: YYYY-MM-DD
+    # return: generator of DayData objects in date order
+    def iter_days(self, start_date, end_date=None):
+        if end_date is None:
+            end_date = start_date
+        return prefetch_days(start_date, end_date, extract_day_data)
 
     def _get_dict_from_date_range(self, start_date, end_date):
-        start = datetime.datetime.strptime(start_date, '%Y-%m-%d').date()
-        end = datetime.datetime.strptime(end_date, '%Y-%m-%d').date()
-        step = datetime.timedelta(days=1)
-        dict_list = []
-        while start <= end:
-            print(f'get_dict_from_date_range: {start}')
-            day = extract_day_data(start)
-            dict_list.append(day.dict)
-            start += step
-        merged_dict = merge_dicts(dict_list)
+        merged_dict = defaultdict(int)
+        for day in self.iter_days(start_date, end_date):
+            for key, value in day.dict.items():
+                merged_dict[key] += value
+        return merged_dict
+
+    # sums the per day artist or album tables of a date range
+    # params: start_date & end_date: YYYY-MM-DD
+    #         table--0 for artists, 1 for albums, 2 for artist ids
+    def _get_counts_from_date_range(self, start_date, end_date, table):
+        merged_dict = defaultdict(int)
+        for counts in prefetch_days(start_date, end_date, extract_day_counts):
+            for key, value in counts[table].items():
+                merged_dict[key] += value
         return merged_dict
 
+    # merges the day sketches of a date range; memory stays fixed however long the range is
+    def _get_sketch_from_date_range(self, start_date, end_date):
+        merged = sketches.PlaySketch()
+        for sketch in prefetch_days(start_date, end_date, extract_day_sketch):
+            merged.merge(sketch)
+        return merged
+
+    # estimates the number of different tracks and artists played in the given time frame
+    # params: start_date & end_date: YYYY-MM-DD
+    # return: a tuple of (distinct tracks, distinct artists, relative standard error)
+    def get_distinct_counts(self, start_date, end_date=None):
+        if end_date is None:
+            end_date = start_date
+        sketch = self._get_sketch_from_date_range(start_date, end_date)
+        return (round(sketch.distinct_tracks.estimate()), round(sketch.distinct_artists.estimate()),
+                sketch.distinct_tracks.relative_error)
+
     # gets top tracks played sorted from most to least in the given time frame
     # params: start_date & end_date: YYYY-MM-DD
     #         number--number of tracks to return
     #         make_playlist--boolean whether to turn the results into a playlist
+    #         approximate--answer from the day sketches in fixed memory instead of merging every track
+    #         canonical--merge the releases of a song that share an isrc (see canonicalize_tracks)
+    #                    under the release that was played first
     # return: a list sorted by plays as a list of tuples of track data tuple and plays
-    def get_most_played_tracks(self, start_date, end_date=None, number=50, make_playlist=False):
+    #         (and the max overcount of the plays if approximate)
+    @cached_report(skip=lambda args, kwargs: kwargs.get('make_playlist', len(args) > 1 and args[1]))
+    def get_most_played_tracks(self, start_date, end_date=None, number=50, make_playlist=False,
+                               approximate=False, canonical=False):
 
         # easier way to look at just one date
         if end_date is None:
             end_date = start_date
 
-        merged_dict = self._get_dict_from_date_range(start_date, end_date)
-        sorted_list = sorted(merged_dict.items(), key=lambda kv: kv[1], reverse=True)
+        catalog = get_shared_catalog()
+        canonical_indexes = get_shared_isrc_cache().canonical_indexes(catalog) if canonical else None
+        if not approximate and not canonical and self._is_current_month(start_date, end_date):
+            # this month is kept up to date by every ingest
+            sorted_list = [(catalog.get(index), plays) for index, plays in self._current_leaderboard().top_tracks(number)]
+        elif approximate:
+            merged = {}
+            for track_id, plays, error in self._get_sketch_from_date_range(start_date, end_date).top('tracks', number):
+                index = catalog.index(track_id)
+                if canonical_indexes is not None and index is not None and index < len(canonical_indexes):
+                    index = canonical_indexes[index]
+                key = index if index is not None else track_id
+                track_plays, track_error = merged.get(key, (0, 0))
+                merged[key] = (track_plays + plays, track_error + error)
+            sorted_list = [(catalog.get(key) if not isinstance(key, str) else (None, None, None, key), plays, error)
+                           for key, (plays, error) in sorted(merged.items(), key=lambda kv: kv[1][0], reverse=True)]
+        else:
+            merged_dict = self._get_dict_from_date_range(start_date, end_date)
+            if canonical_indexes is not None:
+                canonical_dict = defaultdict(int)
+                for index, plays in merged_dict.items():
+                    canonical_dict[canonical_indexes[index] if index < len(canonical_indexes) else index] += plays
+                merged_dict = canonical_dict
+            sorted_list = sorted(merged_dict.items(), key=lambda kv: kv[1], reverse=True)[:number]
+            # only the tracks that are returned need their catalog data
+            sorted_list = [(catalog.get(index), plays) for index, plays in sorted_list]
         if make_playlist:
             # convert IDs into URIs
             id_list = []
-            for i in range(number):
+            for i in range(min(number, len(sorted_list))):
                 id_list.append(sorted_list[i][0][3])
             uri_list = get_track_uris(id_list)
 
             # make the playlist
-            pm = PlaylistManager()
-            pm.prepare_playlist(self.user_name, f'{start_date} to {end_date}', uri_list,
-                                f'Top {number} songs from {start_date} to {end_date}')
+            self.playlist_manager.prepare_playlist(self.user_name, f'{start_date} to {end_date}', uri_list,
+                                                   f'Top {number} songs from {start_date} to {end_date}')
 
         return sorted_list[:number]
 
     # gets top artists played sorted from most to least in the given time frame
     # params: start_date & end_date: YYYY-MM-DD
     #         number--number of tracks to return
-    # return: a list of artists sorted by plays
-    def get_most_played_artists(self, start_date, end_date=None, number=20):
+    #         approximate--answer from the day sketches in fixed memory
+    # return: a list of artists sorted by plays (with the max overcount of the plays if approximate)
+    @cached_report()
+    def get_most_played_artists(self, start_date, end_date=None, number=20, approximate=False):
 
         if end_date is None:
             end_date = start_date
 
-        merged_dict = self._get_dict_from_date_range(start_date, end_date)
-        artist_dict = defaultdict(int)
-        for key, value in merged_dict.items():
-            artist_dict[key[1]] += value
+        if approximate:
+            return self._get_sketch_from_date_range(start_date, end_date).top('artists', number)
+        if self._is_current_month(start_date, end_date):
+            return self._current_leaderboard().top_artists(number)
+
+        artist_dict = self._get_counts_from_date_range(start_date, end_date, 0)
         sorted_list = sorted(artist_dict.items(), key=lambda kv: kv[1], reverse=True)
         return sorted_list[:number]
 
+    # gets the total plays of every day in the given time frame
+    # params: start_date & end_date: YYYY-MM-DD
+    # return: a list of (date, plays) tuples in date order
+    @cached_report()
+    def get_daily_totals(self, start_date, end_date=None):
+        if end_date is None:
+            end_date = start_date
+        totals = prefetch_days(start_date, end_date, extract_day_total)
+        return list(zip(iter_dates(start_date, end_date), totals))
+
+    # gets top albums played sorted from most to least in the given time frame
+    # params: start_date & end_date: YYYY-MM-DD
+    #         number--number of albums to return
+    # return: a list of ((album, artist), plays) tuples sorted by plays
+    @cached_report()
+    def get_most_played_albums(self, start_date, end_date=None, number=20):
+
+        if end_date is None:
+            end_date = start_date
+
+        album_dict = self._get_counts_from_date_range(start_date, end_date, 1)
+        sorted_list = sorted(album_dict.items(), key=lambda kv: kv[1], reverse=True)
+        return sorted_list[:number]
+
+    # gets top artists by spotify id, counting featured artists and keeping artists that share
+    # a name apart; only local data is read
+    # params: start_date & end_date: YYYY-MM-DD
+    #         number--number of artists to return
+    # return: a list of ((artist id, name), plays) tuples sorted by plays
+    @cached_report()
+    def get_most_played_artist_ids(self, start_date, end_date=None, number=20):
+
+        if end_date is None:
+            end_date = start_date
+
+        artist_catalog = get_shared_artist_catalog()
+        artist_id_dict = self._get_counts_from_date_range(start_date, end_date, 2)
+        sorted_list = sorted(artist_id_dict.items(), key=lambda kv: kv[1], reverse=True)
+        return [((artist_id, artist_catalog.name(artist_id)), plays) for artist_id, plays in sorted_list[:number]]
+
+    # gets top genres; a play counts towards every genre of every artist on the track
+    # only artists whose genres were fetched by enrich_artists are counted
+    # params: start_date & end_date: YYYY-MM-DD
+    #         number--number of genres to return
+    # return: a list of (genre, plays) tuples sorted by plays
+    @cached_report()
+    def get_most_played_genres(self, start_date, end_date=None, number=20):
+
+        if end_date is None:
+            end_date = start_date
+
+        artist_catalog = get_shared_artist_catalog()
+        genre_dict = defaultdict(int)
+        for artist_id, plays in self._get_counts_from_date_range(start_date, end_date, 2).items():
+            for genre in artist_catalog.genres(artist_id):
+                genre_dict[genre] += plays
+        sorted_list = sorted(genre_dict.items(), key=lambda kv: kv[1], reverse=True)
+        return sorted_list[:number]
+
+    # fetches the spotify audio analysis (beats, bars, sections) of played tracks that don't
+    # have one stored yet, a few requests at a time
+    # params: track_ids--optional list of track ids; defaults to every track ever played
+    #         workers--number of requests in flight at once
+    # return: number of tracks fetched
+    def fetch_audio_analysis(self, track_ids=None, workers=4):
+        from monthlify.data.audio_analysis import get_shared_analysis_store
+        if track_ids is None:
+            track_ids = [track[3] for track in get_shared_catalog().tracks]
+        return get_shared_analysis_store().fetch(self._auth, track_ids, workers)
+
+    # gets the values derived from the audio analysis of tracks, e.g. tempo stability and key changes
+    # params: track_ids--list of track ids
+    # return: dict of track id to dict of audio_analysis.ANALYSIS_SCALARS, for tracks with an analysis
+    def get_analysis_scalars(self, track_ids):
+        from monthlify.data.audio_analysis import get_shared_analysis_store
+        store = get_shared_analysis_store()
+        return {track_id: store.scalars(track_id) for track_id in track_ids if store.scalars(track_id)}
+
+    # looks up the isrc of every track that has been played but never looked up, 50 tracks
+    # per request, so top tracks can be merged across releases with canonical=True
+    # return: number of tracks looked up
+    def canonicalize_tracks(self):
+        catalog = get_shared_catalog()
+        isrcs = get_shared_isrc_cache()
+        with storage.catalog_lock():
+            catalog.reload()
+            isrcs.reload()
+            fetched = isrcs.fetch(self._auth, [track[3] for track in catalog.tracks])
+            isrcs.persist()
+        if fetched:
+            REPORT_CACHE.clear()
+        return fetched
+
+    # fetches the genres of every artist that has been played but never looked up,
+    # 50 artists per request
+    # return: number of artists fetched
+    def enrich_artists(self):
+        artist_catalog = get_shared_artist_catalog()
+        with storage.catalog_lock():
+            artist_catalog.reload()
+            fetched = artist_catalog.fetch(self._auth)
+            artist_catalog.persist()
+        # genres are joined in at query time, so cached genre reports are stale
+        if fetched:
+            REPORT_CACHE.clear()
+        return fetched
+
+    # builds the day x track and day x artist play matrices over every day file
+    # return: tuple of (track matrix, artist matrix)
+    def build_trend_matrices(self):
+        from monthlify.data import trends
+        built = days_fingerprint()
+        dates = day_data.day_file_dates()
+        start = datetime.datetime.strptime(dates[0], '%Y-%m-%d').date() if dates else local_today()
+        end = dates[-1] if dates else start.isoformat()
+
+        track_days = []
+        artist_days = []
+        artist_columns = {}
+        for tracks, artists in prefetch_days(start.isoformat(), end, extract_day_plays):
+            track_days.append(tracks)
+            artist_days.append({artist_columns.setdefault(artist, len(artist_columns)): plays
+                                for artist, plays in artists.items()})
+        print(f'building trend matrices over {len(track_days)} days')
+
+        catalog = get_shared_catalog()
+        with storage.catalog_lock():
+            catalog.reload()
+            catalog.persist()
+        track_matrix = trends.CountMatrix.from_days(start, track_days, len(catalog))
+        artist_matrix = trends.CountMatrix.from_days(start, artist_days, len(artist_columns), list(artist_columns))
+        track_matrix.save('tracks', built)
+        artist_matrix.save('artists', built)
+        return track_matrix, artist_matrix
+
+    # gets a memory mapped trend matrix, rebuilding both if any day changed since they were built
+    # params: kind--'tracks' or 'artists'
+    def _trend_matrix(self, kind):
+        from monthlify.data import trends
+        built = days_fingerprint()
+        loaded = trends.CountMatrix.load(kind)
+        if loaded is None or loaded[1] != built:
+            return self.build_trend_matrices()[0 if kind == 'tracks' else 1]
+        return loaded[0]
+
+    # names the columns of a trend matrix
+    # return: list of (track, artist, album, track id) tuples for tracks or artist names for artists
+    def _trend_labels(self, matrix, kind, columns):
+        if kind == 'tracks':
+            catalog = get_shared_catalog()
+            return [catalog.get(column) for column in columns]
+        return [matrix.labels[column] for column in columns]
+
+    # gets the tracks or artists whose plays changed the most from one window to the next
+    # params: end_date--last day of the current window, YYYY-MM-DD; defaults to today
+    #         window--days per window e.g. 7 for week over week
+    #         number--number of results
+    #         kind--'tracks' or 'artists'
+    #         falling--find what fell off instead of what climbed
+    # return: a list of (track data tuple or artist, current plays, previous plays) tuples
+    def get_trending(self, end_date=None, window=7, number=20, kind='tracks', falling=False):
+        from monthlify.data import trends
+        matrix = self._trend_matrix(kind)
+        current, previous = trends.window_over_window(matrix, matrix.row_of(end_date or local_today()), window)
+        delta = previous - current if falling else current - previous
+        columns = trends.top_columns(delta, number)
+        labels = self._trend_labels(matrix, kind, columns)
+        return [(label, int(current[column]), int(previous[column])) for label, column in zip(labels, columns)]
+
+    # gets the tracks or artists with the highest exponentially decayed plays, so recent plays
+    # count for more than old ones
+    # params: end_date--day the decay is measured from, YYYY-MM-DD; defaults to today
+    #         half_life--days for a play to count half as much
+    #         number--number of results
+    #         kind--'tracks' or 'artists'
+    # return: a list of (track data tuple or artist, decayed plays) tuples
+    def get_decayed_top(self, end_date=None, half_life=14, number=20, kind='tracks'):
+        from monthlify.data import trends
+        matrix = self._trend_matrix(kind)
+        scores = matrix.decayed(matrix.row_of(end_date or local_today()), half_life)
+        columns = trends.top_columns(scores, number)
+        labels = self._trend_labels(matrix, kind, columns)
+        return [(label, float(scores[column])) for label, column in zip(labels, columns)]
+
+    # gets the tracks or artists played far more in a window than they usually are
+    # params: end_date--last day of the window, YYYY-MM-DD; defaults to today
+    #         window--days per window
+    #         baseline--number of earlier windows that set the usual plays
+    #         number--number of results
+    #         kind--'tracks' or 'artists'
+    # return: a list of (track data tuple or artist, breakout score, plays in the window) tuples
+    def get_breakouts(self, end_date=None, window=7, baseline=8, number=20, kind='tracks'):
+        from monthlify.data import trends
+        matrix = self._trend_matrix(kind)
+        scores, current = trends.breakout_scores(matrix, matrix.row_of(end_date or local_today()), window, baseline)
+        columns = trends.top_columns(scores, number, trends.BREAKOUT_THRESHOLD)
+        labels = self._trend_labels(matrix, kind, columns)
+        return [(label, float(scores[column]), int(current[column])) for label, column in zip(labels, columns)]
+
+    # makes a playlist of the tracks breaking out this month so far compared to as many stretches
+    # of the same length just before it; early in the month the stretch is the last
+    # RISING_MIN_WINDOW days instead, since a day or two of plays is mostly noise
+    # params: number--number of tracks
+    #         baseline--number of earlier stretches that set the usual plays
+    # return: the list of ((track, artist, album, track id), breakout score, plays) tuples used
+    def make_rising_playlist(self, number=30, baseline=6):
+        today = local_today()
+        window = max(today.day, RISING_MIN_WINDOW)
+        rising = self.get_breakouts(today.isoformat(), window, baseline, number)
+        if rising:
+            uri_list = get_track_uris([track_info[3] for track_info, score, plays in rising])
+            self.playlist_manager.prepare_playlist(self.user_name, f'Rising {today:%Y-%m}', uri_list,
+                                                   f'Tracks rising over the last {window} days as of {today}')
+        return rising
+
+    # counts plays by weekday and hour of the day
+    # params: start_date & end_date: YYYY-MM-DD
+    # return: 7 x 24 array of plays; rows are weekdays starting monday, columns are hours
+    def get_listening_heatmap(self, start_date, end_date=None):
+        from monthlify.data import event_log
+        if end_date is None:
+            end_date = start_date
+        events = event_log.EventLog().read(start_date, end_date, TIME_ZONE_SHIFT)
+        return event_log.hour_weekday_heatmap(events, TIME_ZONE_SHIFT)
+
+    # gets the top artists for each hour of the day e.g. what gets played at 2 am
+    # params: start_date & end_date: YYYY-MM-DD
+    #         number--number of artists per hour
+    # return: list of 24 lists of (artist, plays) tuples sorted by plays
+    def get_top_artists_by_hour(self, start_date, end_date=None, number=5):
+        from monthlify.data import event_log
+        if end_date is None:
+            end_date = start_date
+        events = event_log.EventLog().read(start_date, end_date, TIME_ZONE_SHIFT)
+        return event_log.top_artists_by_hour(events, get_shared_catalog(), number, TIME_ZONE_SHIFT)
+
+    # splits the plays in the time frame into listening sessions
+    # params: start_date & end_date: YYYY-MM-DD
+    #         gap_minutes--minutes without a play that end a session
+    # return: list of (start, end, plays) tuples with start and end as datetime objects
+    def get_listening_sessions(self, start_date, end_date=None, gap_minutes=30):
+        from monthlify.data import event_log
+        if end_date is None:
+            end_date = start_date
+        events = event_log.EventLog().read(start_date, end_date, TIME_ZONE_SHIFT)
+        tz = datetime.timezone(datetime.timedelta(hours=TIME_ZONE_SHIFT))
+        return [(datetime.datetime.fromtimestamp(start, tz), datetime.datetime.fromtimestamp(end, tz), plays)
+                for start, end, plays in event_log.detect_sessions(events, gap_minutes)]
+
+    # writes every track ever played, with its audio features, as a columnar table
+    # params: path--output .parquet file, or directory of .npz row groups when fmt is npz
+    #         fmt--'parquet', 'npz', or 'auto' to use parquet when pyarrow is installed
+    # return: number of rows written
+    def export_tracks(self, path, fmt='auto'):
+        from monthlify.data import export
+        return export.export_tracks(path, fmt)
+
+    # writes every play in the event log as a columnar table that joins to export_tracks on track_id
+    # params: path--output .parquet file, or directory of .npz row groups when fmt is npz
+    #         start_month & end_month--optional YYYY-MM bounds, inclusive
+    #         fmt--'parquet', 'npz', or 'auto' to use parquet when pyarrow is installed
+    # return: number of rows written
+    def export_plays(self, path, start_month=None, end_month=None, fmt='auto'):
+        from monthlify.data import export
+        return export.export_plays(path, start_month, end_month, fmt)
+
+    # picks up the features, genres, isrcs, and lyric scores other processes fetched since this
+    # process read them, e.g. for a long running server while enrichment runs elsewhere
+    def reload_lookups(self):
+        from monthlify.data.lyric_scores import get_shared_lyric_scores
+        with storage.file_lock('features'):
+            get_shared_cache().reload()
+        with storage.catalog_lock():
+            get_shared_artist_catalog().reload()
+            get_shared_isrc_cache().reload()
+        with storage.file_lock('lyric-scores'):
+            get_shared_lyric_scores().reload()
+
+    # gets every track that has ever been played
+    # return: a dict of track id to (track, artist) tuple
+    def get_all_tracks(self):
+        return {track_id: (track, artist) for track, artist, album, track_id in get_shared_catalog().tracks}
+
+    # builds the nearest neighbour index of audio features used for mood playlists
+    # params: include_lyrics--whether to add lyric sentiment for every track (slow)
+    # return: the saved FeatureIndex
+    def build_feature_index(self, include_lyrics=False):
+        from monthlify.data.feature_index import FeatureIndex
+        from monthlify.data.lyric_scores import get_shared_lyric_scores
+        tracks = self.get_all_tracks()
+        features = get_shared_cache()
+        features.fetch(self._auth, tracks)
+        with storage.file_lock('features'):
+            features.reload()
+            features.persist()
+
+        sentiments = None
+        if include_lyrics:
+            scores = get_shared_lyric_scores()
+            scores.score(tracks)
+            sentiments = {track_id: scores.get(track_id)[0] for track_id in tracks if scores.get(track_id)}
+
+        index = FeatureIndex.from_features(tracks, features, sentiments)
+        index.save()
+        print(f'indexed {len(index)} of {len(tracks)} tracks')
+        return index
+
+    # scores the lyrics of every played track that hasn't been scored yet; meant to run as a
+    # batch job, e.g. from cron, since every track needs its lyrics fetched
+    # params: limit--optional max number of tracks to score in this run
+    #         workers--number of lyric pages fetched at once
+    # return: number of tracks scored
+    def score_lyrics(self, limit=None, workers=4):
+        from monthlify.data.lyric_scores import get_shared_lyric_scores
+        scored = get_shared_lyric_scores().score(self.get_all_tracks(), workers, limit)
+        # lyric scores are joined in at query time, so cached lyric reports are stale
+        if scored:
+            REPORT_CACHE.clear()
+        return scored
+
+    # gets the play weighted lyric sentiment and lexical richness of a date range, from the
+    # lyric scores table only, so tracks score_lyrics hasn't reached yet are left out
+    # params: start_date & end_date: YYYY-MM-DD
+    #         period--'day', 'week' (starting mondays), 'month', or 'all' for the whole range
+    # return: a list of (first day of the period, sentiment, lexical richness, plays with lyric scores)
+    #         tuples in date order; sentiment and lexical richness are None without any scored plays
+    # raises: ValueError if end_date is before start_date
+    @cached_report()
+    def get_lyric_series(self, start_date, end_date=None, period='day'):
+        from monthlify.data import trends
+        from monthlify.data.lyric_scores import get_shared_lyric_scores
+
+        if end_date is None:
+            end_date = start_date
+        if end_date < start_date:
+            raise ValueError(f'end date {end_date} is before start date {start_date}')
+
+        dates = list(iter_dates(start_date, end_date))
+        catalog = get_shared_catalog()
+        day_tracks = [tracks for tracks, artists in prefetch_days(start_date, end_date, extract_day_plays)]
+        matrix = trends.CountMatrix.from_days(dates[0], day_tracks, len(catalog))
+
+        if period == 'day':
+            firsts = dates
+        elif period == 'week':
+            firsts = [date - datetime.timedelta(days=date.weekday()) for date in dates]
+        elif period == 'month':
+            firsts = [date.replace(day=1) for date in dates]
+        elif period == 'all':
+            firsts = [dates[0]] * len(dates)
+        else:
+            raise ValueError(f'unknown period {period}')
+        labels = sorted(set(firsts))
+        positions = {label: i for i, label in enumerate(labels)}
+        groups = [positions[first] for first in firsts]
+
+        averages, plays = trends.play_weighted(matrix, get_shared_lyric_scores().aligned(catalog), groups, len(labels))
+        return [(label.isoformat(),
+                 None if plays[i] == 0 else float(averages[i, 0]),
+                 None if plays[i] == 0 else float(averages[i, 1]),
+                 int(plays[i]))
+                for i, label in enumerate(labels)]
+
     # returns the timestamp of the most recent log in the form
     # YYYY-MM-DD HH-MM-SS:ffffff
+    # or the unix epoch if nothing has ever been logged, so everything is scraped
     def get_most_recent_log_time(self):
         files = os.listdir('./play_log/raw')
         paths = [os.path.join('./play_log/raw', basename) for basename in files
-                 if basename.endswith('.json')]
-        file_name = max(paths, key=os.path.getctime)
+                 if archive.LOG_NAME.match(basename)]
+        if paths:
+            file_name = max(paths, key=os.path.getctime)
+        else:
+            # every log has been compacted into the archive, or this is a fresh install
+            latest = archive.latest_name('raw')
+            if latest is None:
+                return datetime.datetime.utcfromtimestamp(0)
+            file_name = os.path.join('./play_log/raw', latest)
 
         # use regex to grab the datetime info
         match_obj = re.match('./play_log/raw/(.*).json', file_name)
@@ -294,9 +1310,10 @@ class DataManager:
         datetime_obj = datetime.datetime.strptime(datetime_str, '%Y-%m-%d %H:%M:%S.%f')
         return datetime_obj
 
-    # analyzes the tracks using spotify data
-    # params: tracks--either list of track_ids or list of tuples of track tuples + plays
-    #   e.g. what get_most_played_tracks returns
+    # looks up the audio features of tracks, fetching any that aren't cached
+    # params: tracks--list of track ids, or of (track tuple, plays) pairs
+    # return: average energy, tempo and valence, and a dict of track id to (energy, tempo, valence)
+    #         holding only the tracks spotify has features for
     def analyze_tracks(self, tracks):
 
         assert tracks
@@ -304,53 +1321,49 @@ class DataManager:
         if isinstance(tracks[0][0], tuple):
             print('grabbing IDs')
             tracks = [item[0][3] for item in tracks]
-        results = get_features(self._auth, tracks)
-
-        audio_feature_list = []
-
-        energy_avg, tempo_avg, valence_avg = 0, 0, 0
-        for sub_list in results:
-            for item in sub_list["audio_features"]:
-                energy_avg += item["energy"]
-                tempo_avg += item["tempo"]
-                valence_avg += item["valence"]
-                audio_feature_list.append((item["energy"],
-                                           item["tempo"],
-                                           item["valence"]))
+        features = get_shared_cache()
+        if features.fetch(self._auth, tracks):
+            with storage.file_lock('features'):
+                features.reload()
+                features.persist()
 
-            energy_avg /= len(sub_list["audio_features"])
-            tempo_avg /= len(sub_list["audio_features"])
-            valence_avg /= len(sub_list["audio_features"])
+        audio_features = {}
+        for track_id in tracks:
+            item = features.get(track_id)
+            if item is not None:
+                audio_features[track_id] = (item['energy'], item['tempo'], item['valence'])
 
-        return energy_avg, tempo_avg, valence_avg, audio_feature_list
+        if not audio_features:
+            return 0, 0, 0, audio_features
+        energy_avg, tempo_avg, valence_avg = (sum(values) / len(audio_features)
+                                              for values in zip(*audio_features.values()))
+        return energy_avg, tempo_avg, valence_avg, audio_features
 
     # analyze the tracks from a date range using spotify data
     # params: start_date & end_date--strings in format YYYY-MM-DD
-    def analyze_data_date_range(self, start_date, end_date=None):
+    #         fetch--whether spotify may be called for features that aren't stored locally
+    @cached_report()
+    def analyze_data_date_range(self, start_date, end_date=None, fetch=True):
 
         if end_date is None:
             end_date = start_date
+        if self._is_current_month(start_date, end_date):
+            return self._current_leaderboard().meta_data()
 
-        total_plays = 0
+        feature_plays = 0
         energy = 0
         tempo = 0
         valence = 0
-        start = datetime.datetime.strptime(start_date, '%Y-%m-%d').date()
-        end = datetime.datetime.strptime(end_date, '%Y-%m-%d').date()
-        step = datetime.timedelta(days=1)
-        while start <= end:
-            print(f'analyze_data_date_range: {start}')
-            day = extract_day_data(start)
+        for day in self.iter_days(start_date, end_date):
             if day.total_plays:
-                total_plays += day.total_plays
-                meta_data = day.meta_data
-                energy += meta_data[0] * day.total_plays
-                tempo += meta_data[1] * day.total_plays
-                valence += meta_data[2] * day.total_plays
-            start += step
-        if total_plays:
-            energy /= total_plays
-            tempo /= total_plays
-            valence /= total_plays
+                day.resolve_features(fetch)
+                feature_plays += day.feature_plays
+                energy += day.feature_sums['energy']
+                tempo += day.feature_sums['tempo']
+                valence += day.feature_sums['valence']
+        if feature_plays:
+            energy /= feature_plays
+            tempo /= feature_plays
+            valence /= feature_plays
 
         return energy, tempo, valence
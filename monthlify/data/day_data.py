@@ -1,77 +1,246 @@
-import json
+import os
+import re
 from collections import defaultdict
 
-from monthlify.data import spotify_api
-from monthlify.auth import authenticate
+from monthlify.auth import get_authorization
 from monthlify.core import read_config
+from monthlify.data import codec
+from monthlify.data import storage
+from monthlify.data.storage import atomic_write
+from monthlify.data import sketches
+from monthlify.data import report_cache
+from monthlify.data.feature_cache import FEATURE_NAMES
+from monthlify.data.feature_cache import get_shared_cache
+from monthlify.data.track_catalog import get_shared_catalog
+from monthlify.data.artist_catalog import get_shared_artist_catalog
+
+# version 1 files are [meta, list of track dicts, events by track id]
+# version 2 files are a dict with the tracks and events keyed by TrackCatalog integer ids
+# files of either version may be encoded with any codec, see codec.py
+DAY_FILE_VERSION = 2
+
+# names of day files; anything else in play_log/days, e.g. a file being written, isn't a day
+DAY_FILE_NAME = re.compile(r'^\d{4}-\d{2}-\d{2}\.json$')
+
+
+# return: sorted list of the YYYY-MM-DD dates that have a day file
+def day_file_dates():
+    return sorted(basename[:-5] for basename in os.listdir('./play_log/days') if DAY_FILE_NAME.match(basename))
+
+
+# reads a day file of any version
+# params: date--date or string in format YYYY-MM-DD
+#         catalog--TrackCatalog the file refers to; defaults to the shared catalog
+# return: None if there is no file, otherwise a dict of
+#         'meta'--dict of day totals and tables
+#         'tracks'--list of ((track, artist, album, track id), plays) tuples
+#         'events'--list of (played at ms, track id) tuples
+def read_day_file(date, catalog=None):
+    file_path = f'./play_log/days/{date}.json'
+    if not os.path.isfile(file_path):
+        return None
+    if catalog is None:
+        catalog = get_shared_catalog()
+    # another process may have added tracks since the catalog was read
+    catalog.refresh()
+
+    contents = codec.load(file_path, 'day')
+
+    if isinstance(contents, list):
+        tracks = [((item['track'], item['artist'], item['album'], item['track_id']), item['plays'])
+                  for item in contents[1]]
+        # give every track of the file an id in one go, rather than one catalog write per track
+        catalog.intern_many([track_info for track_info, plays in tracks])
+        events = []
+        # files from before plays were indexed by event have no events
+        if len(contents) > 2:
+            events = [(played_at_ms, track_id) for track_id, times in contents[2].items()
+                      for played_at_ms in times]
+        return {'meta': contents[0], 'tracks': tracks, 'events': events}
+
+    # a day written after the catalog changed, within the file's timestamp resolution
+    if max((index for index, plays in contents['tracks']), default=-1) >= len(catalog):
+        catalog.refresh(force=True)
+    tracks = [(catalog.get(index), plays) for index, plays in contents['tracks']]
+    events = [(played_at_ms, catalog.get(int(index))[3]) for index, times in contents['events'].items()
+              for played_at_ms in times]
+    return {'meta': contents['meta'], 'tracks': tracks, 'events': events}
 
 
 class DayData:
 
-    def __init__(self, date):
-        self._conf = read_config()
-        self._auth = authenticate(self._conf)
+    # params: date--date of the day
+    #         auth--optional spotify authorization; uses the shared authorization if not given
+    #         features--optional lookup of audio features; defaults to the shared FeatureCache
+    #         catalog--optional TrackCatalog; defaults to the shared catalog
+    #         artist_catalog--optional ArtistCatalog; defaults to the shared artist catalog
+    def __init__(self, date, auth=None, features=None, catalog=None, artist_catalog=None):
+        self._authorization = auth
+        self._features = features if features is not None else get_shared_cache()
+        self.catalog = catalog if catalog is not None else get_shared_catalog()
+        self.artist_catalog = artist_catalog if artist_catalog is not None else get_shared_artist_catalog()
 
+        # plays keyed by TrackCatalog integer id
         self.dict = defaultdict(int)
         self.date = date
         self.artists = defaultdict(int)
+        # keyed by (album, artist) since different artists release albums with the same name
+        self.albums = defaultdict(int)
+        # plays of every credited artist, featured ones included, keyed by spotify artist id
+        self.artist_ids = defaultdict(int)
         self.meta_data = ()
         self.total_plays = 0
+        # (played at ms since epoch, track id) of every play already counted
+        self.events = set()
+        # play weighted running sums of every audio feature and the plays they cover
+        self.feature_sums = dict.fromkeys(FEATURE_NAMES, 0.0)
+        self.feature_plays = 0
+        # plays of tracks whose features haven't been looked up yet, by track id
+        self._pending_features = defaultdict(int)
 
     # add a track to the day
     # params: track_info--tuple of (track, artist, album, track id)
-    def add(self, track_info):
+    #         event--optional (played at ms, track id) key identifying the play;
+    #                plays whose event has already been counted are skipped
+    #         count--number of plays to add
+    # return: True if the play was counted, False if it was a duplicate
+    def add(self, track_info, event=None, count=1):
         assert len(track_info) == 4
-        self.dict[track_info] += 1
+        if event is not None:
+            if event in self.events:
+                return False
+            self.events.add(event)
+        self.dict[self.catalog.intern(track_info)] += count
         artist = track_info[1]
-        self.artists[artist] += 1
-        self.total_plays += 1
+        self.artists[artist] += count
+        self.albums[(track_info[2], artist)] += count
+        for artist_id in self.artist_catalog.artist_ids(track_info[3]):
+            self.artist_ids[artist_id] += count
+        self.total_plays += count
+        self._add_features(track_info[3], count)
+        return True
+
+    # adds the features of a track to the running sums if they are known locally,
+    # otherwise waits to fetch them with every other new track of the day
+    def _add_features(self, track_id, count):
+        if track_id not in self._features:
+            self._pending_features[track_id] += count
+            return
+        item = self._features.get(track_id)
+        # spotify has no features for some tracks
+        if item:
+            for name in FEATURE_NAMES:
+                self.feature_sums[name] += (item.get(name) or 0) * count
+            self.feature_plays += count
+
+    # fetches the features of every track that was new to the day in one batch
+    # params: fetch--whether spotify may be called; if not, only locally cached features are
+    #                used and the rest stay pending
+    def resolve_features(self, fetch=True):
+        if not self._pending_features:
+            return
+        # features fetched since the day was written don't need spotify
+        missing = [track_id for track_id in self._pending_features if track_id not in self._features]
+        if fetch and missing and hasattr(self._features, 'fetch'):
+            self._features.fetch(self._auth, missing)
+            # another process may have fetched features since the cache was read
+            with storage.file_lock('features'):
+                self._features.reload()
+                self._features.persist()
+        pending = self._pending_features
+        self._pending_features = defaultdict(int)
+        for track_id, count in pending.items():
+            self._add_features(track_id, count)
+
+    # return: list of the track ids whose features weren't known locally when last resolved
+    def pending_features(self):
+        return list(self._pending_features)
+
+    # counts the features of every track of the day again from the local lookup, picking up
+    # features that were fetched since the day was written
+    def recompute_features(self):
+        self.load_feature_sums({}, 0)
+        for index, plays in self.dict.items():
+            self._add_features(self.catalog.get(index)[3], plays)
+
+    # replaces the running sums with ones that were saved with the day
+    # params: pending--dict of track id to plays left out of the sums, so they're looked up
+    #                  when the features are next resolved
+    def load_feature_sums(self, feature_sums, feature_plays, pending=()):
+        self.feature_sums = dict.fromkeys(FEATURE_NAMES, 0.0)
+        self.feature_sums.update(feature_sums)
+        self.feature_plays = feature_plays
+        self._pending_features = defaultdict(int, pending)
+
+    # groups the event index by track so each track is only written once
+    # return: dict of TrackCatalog integer id to sorted list of played at ms
+    def events_by_track(self):
+        grouped = defaultdict(list)
+        for played_at_ms, track_id in self.events:
+            grouped[self.catalog.index(track_id)].append(played_at_ms)
+        return {index: sorted(times) for index, times in grouped.items()}
 
     # gets the tracks in order of number of times played
+    # return: list of ((track, artist, album, track id), plays) tuples
     def most_common_tracks(self):
-        return sorted(self.dict.items(), key=lambda kv: kv[1], reverse=True)
+        return [(self.catalog.get(index), plays)
+                for index, plays in sorted(self.dict.items(), key=lambda kv: kv[1], reverse=True)]
 
     def most_common_artists(self):
         return sorted(self.artists.items(), key=lambda kv: kv[1], reverse=True)
 
-    # meta data is calculated every time it is got instead of every time a track is added
-    @property
-    def meta_data(self):
-        tracks = [item[0][3] for item in self.dict.items()]
-
-        track_split = [tracks[i * 100:(i+1) * 100] for i in range((len(tracks) + 99)//100)]
-
-        energy_avg, tempo_avg, valence_avg = 0, 0, 0
+    def most_common_albums(self):
+        return sorted(self.albums.items(), key=lambda kv: kv[1], reverse=True)
 
-        for track_list in track_split:
-            results = spotify_api.get_features(self._auth, track_list)
-
-            for sub_list in results:
-                for item in sub_list["audio_features"]:
-                    energy_avg += item["energy"]
-                    tempo_avg += item["tempo"]
-                    valence_avg += item["valence"]
+    # only authenticate once something actually needs to talk to spotify
+    @property
+    def _auth(self):
+        if self._authorization is None:
+            return get_authorization(read_config())
+        return self._authorization
 
-        energy_avg /= len(tracks)
-        tempo_avg /= len(tracks)
-        valence_avg /= len(tracks)
+    # meta data comes from the running sums; only tracks new to the day are fetched
+    @property
+    def meta_data(self):
+        return self.compute_meta_data()
 
-        # print(f'energy average = {energy_avg:.3f}')
-        # print(f'tempo average = {tempo_avg:.1f}')
-        # print(f'valence average = {valence_avg:.3f}')
+    # calculates the play weighted average energy, tempo, and valence of the day
+    # params: features--optional lookup of track id to audio features (e.g. a FeatureCache)
+    #                   to use for tracks new to the day instead of the day's own lookup
+    #         fetch--whether features may be fetched from spotify, see resolve_features
+    # return: tuple of (energy, tempo, valence) averages
+    def compute_meta_data(self, features=None, fetch=True):
+        if features is not None:
+            self._features = features
+        self.resolve_features(fetch)
 
-        return energy_avg, tempo_avg, valence_avg
+        if not self.feature_plays:
+            return 0, 0, 0
+        return (self.feature_sums['energy'] / self.feature_plays,
+                self.feature_sums['tempo'] / self.feature_plays,
+                self.feature_sums['valence'] / self.feature_plays)
 
     # shouldn't ever need to set meta_data
     @meta_data.setter
     def meta_data(self, value):
         self._meta_data = value
 
+    # summarizes the day into the fixed size sketches used for approximate range queries
+    def sketch(self):
+        sketch = sketches.PlaySketch()
+        for index, plays in self.dict.items():
+            track, artist, album, track_id = self.catalog.get(index)
+            sketch.add(track_id, artist, plays)
+        return sketch
+
     # writes the class to disk, overwriting previous (hopefully obsolete) data
-    def persist(self):
+    # params: features--optional lookup of track id to audio features, see compute_meta_data
+    #         fetch--whether features may be fetched from spotify; if not, plays of tracks without
+    #                local features are left out of the averages until the day is refreshed
+    def persist(self, features=None, fetch=True):
         # get the meta data
         artists = self.most_common_artists()
-        analysis = self.meta_data
+        analysis = self.compute_meta_data(features, fetch)
         # not every day will have 5 artists played
         top_artists = artists[:5]
 
@@ -79,27 +248,27 @@ class DayData:
         for i in range(len(top_artists)):
             top_artists_dict.append((top_artists[i][0], top_artists[i][1]))
 
-        parent_list = []
         meta_dict = {'total plays': self.total_plays,
                      'top artists': top_artists_dict,
                      'average energy': f'{analysis[0]:.3f}',
                      'average tempo': f'{analysis[1]:.1f}',
-                     'average valence': f'{analysis[2]:3f}'
+                     'average valence': f'{analysis[2]:3f}',
+                     'artists': dict(self.artists),
+                     'albums': [[album, artist, plays] for (album, artist), plays in self.albums.items()],
+                     'artist ids': dict(self.artist_ids),
+                     'feature sums': self.feature_sums,
+                     'feature plays': self.feature_plays,
+                     'pending features': dict(self._pending_features)
                      }
-        parent_list.append(meta_dict)
-
-        track_list = []
-        for key, value in self.dict.items():
-            track, artist, album, track_id = key
-            json_dict = {'track': track,
-                         'artist': artist,
-                         'album': album,
-                         'track_id': track_id,
-                         'plays': value}
-            track_list.append(json_dict)
-        parent_list.append(track_list)
-
-        with open(f'./play_log/days/{self.date}.json', mode='w') as file:
-            json.dump(parent_list, file, indent=2, separators=(',', ':'))
+
+        # the catalog has to be on disk before anything refers to its ids
+        self.catalog.persist()
+        contents = {'version': DAY_FILE_VERSION,
+                    'meta': meta_dict,
+                    'tracks': [[index, plays] for index, plays in self.dict.items()],
+                    'events': self.events_by_track()}
+        atomic_write(f'./play_log/days/{self.date}.json', contents)
+        sketches.write_sketch(self.date, self.sketch())
+        report_cache.bump_version(self.date)
 
         print('file written')
@@ -0,0 +1,155 @@
+import contextlib
+import os
+import sqlite3
+import threading
+import time
+
+ENRICHMENT_QUEUE_PATH = './play_log/enrichment.db'
+
+# kinds of work looked up from spotify or the web, keyed by track id ('features', 'isrcs',
+# 'lyrics') or artist id ('artists')
+FETCH_KINDS = ('features', 'artists', 'isrcs', 'lyrics')
+# days whose feature sums are missing tracks, keyed by YYYY-MM-DD; refreshed after the fetches
+DAY_KIND = 'days'
+
+# seconds a claimed job is hidden from other workers; the jobs of a worker that dies mid batch
+# are claimed again once this runs out
+LEASE_SECONDS = 10 * 60
+# seconds before the first retry of a failed job, doubling with every attempt after that
+RETRY_DELAY = 60
+MAX_RETRY_DELAY = 6 * 60 * 60
+# jobs that failed this many times are kept but no longer claimed until retry_failed
+MAX_ATTEMPTS = 8
+
+_shared_queue = None
+_shared_lock = threading.Lock()
+
+
+# gets the enrichment queue shared by everything in this process, opening it on first use
+def get_shared_enrichment_queue():
+    global _shared_queue
+    with _shared_lock:
+        if _shared_queue is None:
+            _shared_queue = EnrichmentQueue()
+    return _shared_queue
+
+
+# durable local queue of lookups that ingest leaves for later, so writing plays never waits on
+# spotify; every job is a (kind, key) pair that is queued at most once
+# a claimed job stays in the queue until its worker completes it, so nothing is lost if a
+# lookup fails or the worker is killed
+class EnrichmentQueue:
+
+    def __init__(self, file_path=ENRICHMENT_QUEUE_PATH):
+        self.file_path = file_path
+        # sqlite connections can't be shared between threads
+        self._local = threading.local()
+        with self._transaction() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS jobs ('
+                               'kind TEXT NOT NULL, '
+                               'key TEXT NOT NULL, '
+                               'attempts INTEGER NOT NULL DEFAULT 0, '
+                               # leased or backing off until this time
+                               'ready_at REAL NOT NULL DEFAULT 0, '
+                               'error TEXT, '
+                               'PRIMARY KEY (kind, key)) WITHOUT ROWID')
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            os.makedirs(os.path.dirname(self.file_path) or '.', exist_ok=True)
+            connection = sqlite3.connect(self.file_path, timeout=30, isolation_level=None)
+            # ingest can queue jobs while a worker is reading
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = connection
+        return connection
+
+    # runs the block as one transaction holding the write lock from the start, so two
+    # workers never claim the same job
+    @contextlib.contextmanager
+    def _transaction(self):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    # queues jobs, skipping any that are already queued
+    # params: kind--kind of job e.g. 'features'
+    #         keys--iterable of track ids, artist ids, or dates
+    # return: number of jobs added
+    def push(self, kind, keys):
+        rows = [(kind, str(key)) for key in keys if key]
+        if not rows:
+            return 0
+        with self._transaction() as connection:
+            before = connection.total_changes
+            connection.executemany('INSERT OR IGNORE INTO jobs (kind, key) VALUES (?, ?)', rows)
+            return connection.total_changes - before
+
+    # leases up to limit ready jobs of a kind, oldest first
+    # return: list of keys; they must be passed to complete, fail, or release
+    def claim(self, kind, limit):
+        now = time.time()
+        with self._transaction() as connection:
+            keys = [key for key, in connection.execute(
+                'SELECT key FROM jobs WHERE kind = ? AND attempts < ? AND ready_at <= ? ORDER BY ready_at LIMIT ?',
+                (kind, MAX_ATTEMPTS, now, limit))]
+            connection.executemany('UPDATE jobs SET ready_at = ? WHERE kind = ? AND key = ?',
+                                   [(now + LEASE_SECONDS, kind, key) for key in keys])
+        return keys
+
+    # removes jobs that are done
+    def complete(self, kind, keys):
+        with self._transaction() as connection:
+            connection.executemany('DELETE FROM jobs WHERE kind = ? AND key = ?', [(kind, key) for key in keys])
+
+    # counts a failed attempt at jobs and backs them off before they can be claimed again
+    # params: error--description of what went wrong, kept for status
+    def fail(self, kind, keys, error):
+        now = time.time()
+        with self._transaction() as connection:
+            connection.executemany('UPDATE jobs SET attempts = attempts + 1, error = ?, '
+                                   'ready_at = ? + min(? * (1 << attempts), ?) WHERE kind = ? AND key = ?',
+                                   [(error, now, RETRY_DELAY, MAX_RETRY_DELAY, kind, key) for key in keys])
+
+    # gives jobs back without counting an attempt, e.g. when they are waiting on other jobs
+    # params: delay--seconds before they can be claimed again
+    def release(self, kind, keys, delay=0):
+        with self._transaction() as connection:
+            connection.executemany('UPDATE jobs SET ready_at = ? WHERE kind = ? AND key = ?',
+                                   [(time.time() + delay, kind, key) for key in keys])
+
+    # return: set of the keys that still have a job of a kind that may run again
+    def queued(self, kind, keys):
+        keys = list(keys)
+        connection = self._connection()
+        found = set()
+        # sqlite limits the number of parameters of a statement
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            found.update(key for key, in connection.execute(
+                f'SELECT key FROM jobs WHERE kind = ? AND attempts < ? AND key IN ({",".join("?" * len(chunk))})',
+                [kind, MAX_ATTEMPTS] + chunk))
+        return found
+
+    # makes every job that ran out of attempts claimable again
+    # return: number of jobs
+    def retry_failed(self):
+        with self._transaction() as connection:
+            before = connection.total_changes
+            connection.execute('UPDATE jobs SET attempts = 0, ready_at = 0 WHERE attempts >= ?', (MAX_ATTEMPTS,))
+            return connection.total_changes - before
+
+    # return: dict of kind to dict of 'ready', 'waiting' (leased or backing off), and 'failed' counts
+    def status(self):
+        now = time.time()
+        rows = self._connection().execute(
+            'SELECT kind, '
+            'sum(attempts < ? AND ready_at <= ?), sum(attempts < ? AND ready_at > ?), sum(attempts >= ?) '
+            'FROM jobs GROUP BY kind', (MAX_ATTEMPTS, now, MAX_ATTEMPTS, now, MAX_ATTEMPTS))
+        return {kind: {'ready': ready, 'waiting': waiting, 'failed': failed}
+                for kind, ready, waiting, failed in rows}
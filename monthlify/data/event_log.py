@@ -0,0 +1,157 @@
+import datetime
+import os
+from collections import defaultdict
+
+import numpy as np
+
+EVENTS_DIR = './play_log/events'
+
+# one record per play: epoch seconds it was played at and integer id from the TrackCatalog
+EVENT_DTYPE = np.dtype([('time', '<u4'), ('track', '<u4')])
+
+SECONDS_PER_HOUR = 3600
+SECONDS_PER_DAY = 86400
+
+
+# append only log of every play, stored as one packed binary file per month
+# e.g. play_log/events/2019-08.bin, read back through memory mapping
+class EventLog:
+
+    def __init__(self, directory=EVENTS_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, month):
+        return os.path.join(self.directory, f'{month}.bin')
+
+    # adds plays to the log
+    # params: events--iterable of (month YYYY-MM, epoch seconds, integer track id) tuples
+    def append(self, events):
+        by_month = defaultdict(list)
+        for month, seconds, track in events:
+            by_month[month].append((seconds, track))
+        for month, records in by_month.items():
+            with open(self._path(month), mode='ab') as file:
+                file.write(np.array(records, dtype=EVENT_DTYPE).tobytes())
+
+    # replaces every month of the log, e.g. after a rebuild
+    # each month is swapped in with a rename so readers never see it half written
+    # params: events--iterable of (month YYYY-MM, epoch seconds, integer track id) tuples
+    def rewrite(self, events):
+        by_month = defaultdict(list)
+        for month, seconds, track in events:
+            by_month[month].append((seconds, track))
+        for month, records in by_month.items():
+            temp_path = self._path(month) + '.tmp'
+            with open(temp_path, mode='wb') as file:
+                file.write(np.array(records, dtype=EVENT_DTYPE).tobytes())
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, self._path(month))
+
+        for basename in os.listdir(self.directory):
+            if basename.endswith('.bin') and basename[:-4] not in by_month:
+                os.remove(os.path.join(self.directory, basename))
+
+    # lists the months that have plays
+    # return: sorted list of YYYY-MM strings
+    def months(self):
+        return sorted(basename[:-4] for basename in os.listdir(self.directory) if basename.endswith('.bin'))
+
+    # memory maps every play of a month, in the order they were logged
+    # return: structured array of EVENT_DTYPE
+    def read_month(self, month):
+        path = self._path(month)
+        # a writer may be mid append, so ignore any partial record at the end
+        records = os.path.getsize(path) // EVENT_DTYPE.itemsize if os.path.isfile(path) else 0
+        if not records:
+            return np.zeros(0, dtype=EVENT_DTYPE)
+        return np.memmap(path, dtype=EVENT_DTYPE, mode='r', shape=(records,))
+
+    # reads the plays of every day from start_date to end_date inclusive
+    # params: start_date & end_date--date objects or strings in format YYYY-MM-DD
+    #         shift--int difference from UTC that days are measured in
+    # return: structured array of EVENT_DTYPE sorted by time
+    def read(self, start_date, end_date, shift=0):
+        start = _to_date(start_date)
+        end = _to_date(end_date)
+
+        months = []
+        month = start.replace(day=1)
+        while month <= end:
+            events = self.read_month(month.strftime('%Y-%m'))
+            if len(events):
+                months.append(events)
+            month = (month + datetime.timedelta(days=32)).replace(day=1)
+        if not months:
+            return np.zeros(0, dtype=EVENT_DTYPE)
+
+        events = np.concatenate(months)
+        epoch = datetime.date(1970, 1, 1)
+        first = (start - epoch).days * SECONDS_PER_DAY - shift * SECONDS_PER_HOUR
+        last = ((end - epoch).days + 1) * SECONDS_PER_DAY - shift * SECONDS_PER_HOUR
+        events = events[(events['time'] >= first) & (events['time'] < last)]
+        return events[np.argsort(events['time'], kind='stable')]
+
+
+def _to_date(date):
+    if isinstance(date, str):
+        return datetime.datetime.strptime(date, '%Y-%m-%d').date()
+    return date
+
+
+# local hour (0-23) and weekday (0 is monday) of every event
+def _hours_and_weekdays(events, shift):
+    local = events['time'].astype(np.int64) + shift * SECONDS_PER_HOUR
+    hours = (local // SECONDS_PER_HOUR) % 24
+    # 1970-01-01 was a thursday
+    weekdays = (local // SECONDS_PER_DAY + 3) % 7
+    return hours, weekdays
+
+
+# counts plays by weekday and hour
+# params: events--array returned by EventLog.read
+#         shift--int difference from UTC to measure hours in
+# return: 7 x 24 array of plays; rows are weekdays starting monday, columns are hours
+def hour_weekday_heatmap(events, shift=0):
+    hours, weekdays = _hours_and_weekdays(events, shift)
+    return np.bincount(weekdays * 24 + hours, minlength=7 * 24).reshape(7, 24)
+
+
+# finds the most played artists for each hour of the day
+# params: events--array returned by EventLog.read
+#         catalog--the TrackCatalog the events refer to
+#         number--number of artists per hour
+#         shift--int difference from UTC to measure hours in
+# return: list of 24 lists of (artist, plays) tuples sorted by plays
+def top_artists_by_hour(events, catalog, number=5, shift=0):
+    if not len(events):
+        return [[] for hour in range(24)]
+
+    artist_names, artist_codes = np.unique([track[1] for track in catalog.tracks], return_inverse=True)
+    artists = artist_codes[events['track']]
+    hours, weekdays = _hours_and_weekdays(events, shift)
+
+    counts = np.bincount(hours * len(artist_names) + artists,
+                         minlength=24 * len(artist_names)).reshape(24, len(artist_names))
+    top = np.argsort(-counts, axis=1, kind='stable')[:, :number]
+
+    results = []
+    for hour in range(24):
+        results.append([(str(artist_names[i]), int(counts[hour, i])) for i in top[hour] if counts[hour, i]])
+    return results
+
+
+# splits the events into listening sessions separated by gaps without plays
+# params: events--array returned by EventLog.read (sorted by time)
+#         gap_minutes--minutes without a play that end a session
+# return: list of (start epoch seconds, end epoch seconds, plays) tuples
+def detect_sessions(events, gap_minutes=30):
+    if not len(events):
+        return []
+
+    times = events['time'].astype(np.int64)
+    breaks = np.flatnonzero(np.diff(times) > gap_minutes * 60) + 1
+    starts = np.concatenate(([0], breaks))
+    ends = np.concatenate((breaks, [len(times)]))
+    return [(int(times[s]), int(times[e - 1]), int(e - s)) for s, e in zip(starts, ends)]
@@ -0,0 +1,165 @@
+import itertools
+import math
+import os
+
+import numpy as np
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    # without pyarrow, exports are written as numpy .npz row groups
+    pyarrow = None
+
+from monthlify.data.audio_analysis import ANALYSIS_SCALARS
+from monthlify.data.audio_analysis import get_shared_analysis_store
+from monthlify.data.event_log import EventLog
+from monthlify.data.feature_cache import FEATURE_NAMES
+from monthlify.data.feature_cache import get_shared_cache
+from monthlify.data.lyric_scores import LYRIC_COLUMNS
+from monthlify.data.lyric_scores import get_shared_lyric_scores
+from monthlify.data.track_catalog import get_shared_catalog
+
+# rows per row group; bounds the memory an export needs however much history there is
+ROW_GROUP_SIZE = 65536
+
+TRACK_COLUMNS = [('track_index', np.uint32), ('track_id', str), ('track', str), ('artist', str),
+                 ('album', str)] + [(name, np.float64) for name in FEATURE_NAMES + ANALYSIS_SCALARS + LYRIC_COLUMNS]
+PLAY_COLUMNS = [('time', np.int64), ('track_index', np.uint32), ('track_id', str)]
+PLAYLIST_COLUMNS = [('track_id', str), ('track', str), ('artist', str)] + \
+                   [(name, np.float64) for name in ('energy', 'tempo', 'valence') + LYRIC_COLUMNS]
+
+
+def _resolve_format(fmt):
+    if fmt == 'auto':
+        return 'parquet' if pyarrow is not None else 'npz'
+    if fmt == 'parquet' and pyarrow is None:
+        raise ImportError('parquet export needs pyarrow; use format npz instead')
+    return fmt
+
+
+# writes row groups of typed columns to one parquet file, or to a directory of
+# part-NNNNN.npz files (one per row group) when the format is npz
+# params: path--file (parquet) or directory (npz) to write
+#         columns--list of (name, numpy dtype or str) tuples
+#         row_groups--iterable of dicts of column name to list or array of values
+#         fmt--'parquet', 'npz', or 'auto'
+# return: number of rows written
+def write_columns(path, columns, row_groups, fmt='auto'):
+    fmt = _resolve_format(fmt)
+    rows = 0
+    if fmt == 'parquet':
+        writer = None
+        try:
+            for group in row_groups:
+                table = pyarrow.table({name: group[name] for name, dtype in columns})
+                if writer is None:
+                    writer = pyarrow.parquet.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+                rows += table.num_rows
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        os.makedirs(path, exist_ok=True)
+        for part, group in enumerate(row_groups):
+            arrays = {name: np.asarray(group[name], dtype=dtype) for name, dtype in columns}
+            np.savez(os.path.join(path, f'part-{part:05d}.npz'), **arrays)
+            rows += len(arrays[columns[0][0]])
+    return rows
+
+
+# loads an npz export back into one array per column
+# params: path--directory written by write_columns
+# return: dict of column name to array
+def load_npz(path):
+    parts = sorted(basename for basename in os.listdir(path) if basename.endswith('.npz'))
+    columns = {}
+    for basename in parts:
+        with np.load(os.path.join(path, basename)) as part:
+            for name in part.files:
+                columns.setdefault(name, []).append(part[name])
+    return {name: np.concatenate(arrays) for name, arrays in columns.items()}
+
+
+# one row group of the track table at a time, joined to the audio features, the audio
+# analysis scalars, and the lyric scores by track id
+def _track_row_groups(catalog, features, analyses, lyrics):
+    for first in range(0, len(catalog), ROW_GROUP_SIZE):
+        tracks = catalog.tracks[first:first + ROW_GROUP_SIZE]
+        group = {'track_index': np.arange(first, first + len(tracks), dtype=np.uint32),
+                 'track_id': [track[3] for track in tracks],
+                 'track': [track[0] for track in tracks],
+                 'artist': [track[1] for track in tracks],
+                 'album': [track[2] for track in tracks]}
+        items = [features.get(track[3]) or {} for track in tracks]
+        for name in FEATURE_NAMES:
+            group[name] = np.array([item.get(name, math.nan) for item in items], dtype=np.float64)
+        scalars = [analyses.scalars(track[3]) or {} for track in tracks]
+        for name in ANALYSIS_SCALARS:
+            group[name] = np.array([math.nan if item.get(name) is None else item[name] for item in scalars],
+                                   dtype=np.float64)
+        scores = [lyrics.get(track[3]) or (math.nan,) * len(LYRIC_COLUMNS) for track in tracks]
+        for column, name in enumerate(LYRIC_COLUMNS):
+            group[name] = np.array([score[column] for score in scores], dtype=np.float64)
+        yield group
+
+
+# exports every track ever played with its audio features, audio analysis scalars, and lyric scores
+# params: path--output file (parquet) or directory (npz)
+#         fmt--'parquet', 'npz', or 'auto'
+# return: number of rows written
+def export_tracks(path, fmt='auto'):
+    catalog = get_shared_catalog()
+    row_groups = _track_row_groups(catalog, get_shared_cache(), get_shared_analysis_store(), get_shared_lyric_scores())
+    return write_columns(path, TRACK_COLUMNS, row_groups, fmt)
+
+
+# groups rows of column values into row groups as they come, with None as nan
+def _tuple_row_groups(rows, columns):
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, ROW_GROUP_SIZE))
+        if not chunk:
+            return
+        group = {}
+        for column, (name, dtype) in enumerate(columns):
+            values = [row[column] for row in chunk]
+            if dtype is not str:
+                values = np.array([math.nan if value is None else value for value in values], dtype=dtype)
+            group[name] = values
+        yield group
+
+
+# exports the per track results of Analyzer.get_track_data_for_playlist
+# params: path--output file (parquet) or directory (npz)
+#         rows--iterable of tuples in the order of PLAYLIST_COLUMNS; None for unknown values
+#         fmt--'parquet', 'npz', or 'auto'
+# return: number of rows written
+def export_playlist_analysis(path, rows, fmt='auto'):
+    return write_columns(path, PLAYLIST_COLUMNS, _tuple_row_groups(rows, PLAYLIST_COLUMNS), fmt)
+
+
+# one row group of plays at a time, streamed month by month out of the event log
+def _play_row_groups(event_log, catalog, start_month, end_month):
+    track_ids = np.array([track[3] for track in catalog.tracks], dtype=str)
+    for month in event_log.months():
+        if (start_month and month < start_month) or (end_month and month > end_month):
+            continue
+        events = event_log.read_month(month)
+        for first in range(0, len(events), ROW_GROUP_SIZE):
+            chunk = events[first:first + ROW_GROUP_SIZE]
+            yield {'time': chunk['time'].astype(np.int64),
+                   'track_index': chunk['track'].astype(np.uint32),
+                   'track_id': track_ids[chunk['track']]}
+
+
+# exports every play with the epoch seconds it was played at; join to the track export on
+# track_index or track_id
+# params: path--output file (parquet) or directory (npz)
+#         start_month & end_month--optional YYYY-MM bounds, inclusive
+#         fmt--'parquet', 'npz', or 'auto'
+# return: number of rows written
+def export_plays(path, start_month=None, end_month=None, fmt='auto'):
+    catalog = get_shared_catalog()
+    return write_columns(path, PLAY_COLUMNS, _play_row_groups(EventLog(), catalog, start_month, end_month), fmt)
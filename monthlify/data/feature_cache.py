@@ -0,0 +1,78 @@
+import os
+import threading
+
+from monthlify.data import spotify_api
+from monthlify.data import codec
+from monthlify.data.storage import atomic_write
+
+FEATURE_CACHE_PATH = './play_log/features.json'
+
+# numeric audio features kept for analytics
+FEATURE_NAMES = ('energy', 'tempo', 'valence', 'danceability', 'acousticness',
+                 'instrumentalness', 'liveness', 'speechiness', 'loudness')
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+# gets the feature cache shared by everything in this process, loading it on first use
+def get_shared_cache():
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = FeatureCache()
+    return _shared_cache
+
+
+# local store of spotify audio features keyed by track id
+# features are only fetched from spotify for ids that have never been looked up
+class FeatureCache:
+
+    def __init__(self, file_path=FEATURE_CACHE_PATH):
+        self.file_path = file_path
+        self.features = {}
+        self._dirty = False
+        if os.path.isfile(file_path):
+            self.features = codec.load(file_path)
+
+    # picks up features another process fetched; call while holding the features lock
+    def reload(self):
+        if not os.path.isfile(self.file_path):
+            return
+        features = codec.load(self.file_path)
+        features.update(self.features)
+        self.features = features
+
+    def __contains__(self, track_id):
+        return track_id in self.features
+
+    # gets the cached audio features of a track
+    # return: dict of audio features or None if unknown or spotify has none
+    def get(self, track_id):
+        return self.features.get(track_id)
+
+    # fetches the audio features of any tracks not already in the cache
+    # params: auth--spotify authorization
+    #         track_ids--iterable of track ids
+    # return: number of tracks fetched from spotify
+    def fetch(self, auth, track_ids):
+        missing = sorted({track_id for track_id in track_ids if track_id not in self.features})
+        if not missing:
+            return 0
+
+        print(f'fetching audio features for {len(missing)} tracks')
+        fetched = 0
+        for sub_list in spotify_api.get_features(auth, missing):
+            items = sub_list['audio_features']
+            for track_id, item in zip(missing[fetched:fetched + len(items)], items):
+                # spotify returns null for tracks without features; remember that too
+                self.features[track_id] = item
+            fetched += len(items)
+        self._dirty = True
+        return fetched
+
+    # writes the cache to disk if anything was fetched
+    def persist(self):
+        if self._dirty:
+            atomic_write(self.file_path, self.features)
+            self._dirty = False
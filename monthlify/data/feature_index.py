@@ -0,0 +1,162 @@
+import math
+import os
+
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    # without scipy, queries fall back to a brute force scan of the matrix
+    cKDTree = None
+
+from monthlify.data.feature_cache import FEATURE_NAMES
+
+FEATURE_INDEX_PATH = './play_log/feature_index.npz'
+
+# optional column filled from lyric_analyzer
+SENTIMENT = 'sentiment'
+
+# target moods that can be requested by name
+MOODS = {
+    'happy': {'valence': 0.85, 'energy': 0.7, 'danceability': 0.7},
+    'sad': {'valence': 0.15, 'energy': 0.3, 'acousticness': 0.7},
+    'calm': {'energy': 0.2, 'tempo': 85, 'acousticness': 0.8, 'loudness': -14},
+    'workout': {'energy': 0.9, 'tempo': 130, 'danceability': 0.75},
+    'party': {'danceability': 0.85, 'energy': 0.8, 'valence': 0.75},
+    'focus': {'instrumentalness': 0.8, 'speechiness': 0.04, 'energy': 0.4},
+}
+
+
+# nearest neighbour index over the audio features of every track played
+# rows of the matrix are tracks and columns are features; queries are answered
+# in standardized feature space so tempo doesn't drown out the 0-1 features
+class FeatureIndex:
+
+    # params: track_ids--list of track ids, one per row of the matrix
+    #         matrix--2d array of raw feature values; nan for unknown values
+    #         columns--list of feature names, one per column of the matrix
+    def __init__(self, track_ids, matrix, columns):
+        self.track_ids = list(track_ids)
+        self.matrix = np.asarray(matrix, dtype=np.float64).reshape(len(self.track_ids), len(columns))
+        self.columns = list(columns)
+        self._rows = {track_id: i for i, track_id in enumerate(self.track_ids)}
+        self._trees = {}
+
+        # unknown values sit at the column mean so they neither attract nor repel
+        self.mean = np.zeros(len(self.columns))
+        self.std = np.ones(len(self.columns))
+        if len(self.track_ids):
+            known = ~np.isnan(self.matrix)
+            for i in range(len(self.columns)):
+                if known[:, i].any():
+                    self.mean[i] = self.matrix[known[:, i], i].mean()
+                    self.std[i] = self.matrix[known[:, i], i].std() or 1.0
+        self.scaled = np.nan_to_num((self.matrix - self.mean) / self.std)
+
+    def __len__(self):
+        return len(self.track_ids)
+
+    def __contains__(self, track_id):
+        return track_id in self._rows
+
+    # builds an index from cached audio features
+    # params: track_ids--iterable of track ids to index
+    #         features--lookup of track id to audio features (e.g. a FeatureCache)
+    #         sentiments--optional dict of track id to lyric sentiment score
+    # return: a FeatureIndex; tracks without audio features are left out
+    @classmethod
+    def from_features(cls, track_ids, features, sentiments=None):
+        columns = list(FEATURE_NAMES)
+        if sentiments is not None:
+            columns.append(SENTIMENT)
+
+        indexed_ids, rows = [], []
+        for track_id in track_ids:
+            item = features.get(track_id)
+            if not item:
+                continue
+            row = [item.get(name, math.nan) for name in FEATURE_NAMES]
+            if sentiments is not None:
+                score = sentiments.get(track_id)
+                row.append(math.nan if score is None else score)
+            indexed_ids.append(track_id)
+            rows.append([math.nan if value is None else value for value in row])
+
+        return cls(indexed_ids, rows, columns)
+
+    def save(self, file_path=FEATURE_INDEX_PATH):
+        np.savez(file_path,
+                 track_ids=np.array(self.track_ids, dtype=str),
+                 matrix=self.matrix,
+                 columns=np.array(self.columns, dtype=str))
+
+    @classmethod
+    def load(cls, file_path=FEATURE_INDEX_PATH):
+        if not os.path.isfile(file_path):
+            raise FileNotFoundError(f'no feature index at {file_path}; build one with '
+                                    f'DataManager.build_feature_index')
+        with np.load(file_path) as data:
+            return cls(data['track_ids'].tolist(), data['matrix'], data['columns'].tolist())
+
+    # finds the tracks closest to a target mood
+    # params: target--name of a mood in MOODS or dict of feature name to raw value;
+    #                 only the given features are compared
+    #         number--number of tracks to return
+    #         exclude--optional collection of track ids to leave out
+    # return: list of (track id, distance) tuples from closest to furthest
+    def nearest(self, target, number=50, exclude=()):
+        if isinstance(target, str):
+            target = MOODS[target]
+
+        unknown = [name for name in target if name not in self.columns]
+        if unknown:
+            raise KeyError(f'features not in index: {unknown}')
+
+        dims = tuple(self.columns.index(name) for name in target)
+        point = np.array([(target[self.columns[i]] - self.mean[i]) / self.std[i] for i in dims])
+        return self._query(dims, point, number, exclude)
+
+    # finds the tracks most similar to a set of seed tracks
+    # params: seed_ids--list of track ids; seeds that aren't indexed are ignored
+    #         number--number of tracks to return, not counting the seeds
+    # return: list of (track id, distance) tuples from closest to furthest
+    def similar(self, seed_ids, number=50):
+        rows = [self._rows[track_id] for track_id in seed_ids if track_id in self._rows]
+        if not rows:
+            raise KeyError('none of the seed tracks are in the index')
+
+        dims = tuple(range(len(self.columns)))
+        point = self.scaled[rows].mean(axis=0)
+        return self._query(dims, point, number, set(seed_ids))
+
+    # kd trees are built per set of compared features and reused across queries
+    def _tree(self, dims):
+        if dims not in self._trees:
+            self._trees[dims] = cKDTree(self.scaled[:, dims])
+        return self._trees[dims]
+
+    def _query(self, dims, point, number, exclude):
+        exclude = set(exclude)
+        # ask for extra neighbours so excluded tracks can be dropped
+        k = min(len(self.track_ids), number + len(exclude))
+        if k == 0:
+            return []
+
+        if cKDTree is not None:
+            distances, rows = self._tree(dims).query(point, k=k)
+            distances, rows = np.atleast_1d(distances), np.atleast_1d(rows)
+        else:
+            all_distances = np.sqrt(((self.scaled[:, dims] - point) ** 2).sum(axis=1))
+            rows = np.argpartition(all_distances, k - 1)[:k]
+            rows = rows[np.argsort(all_distances[rows])]
+            distances = all_distances[rows]
+
+        results = []
+        for distance, row in zip(distances, rows):
+            track_id = self.track_ids[row]
+            if track_id in exclude:
+                continue
+            results.append((track_id, float(distance)))
+            if len(results) == number:
+                break
+        return results
@@ -0,0 +1,105 @@
+import os
+import threading
+
+from monthlify.data import spotify_api
+from monthlify.data import codec
+from monthlify.data.storage import atomic_write
+
+ISRC_CACHE_PATH = './play_log/isrcs.json'
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+# gets the isrc cache shared by everything in this process, loading it on first use
+def get_shared_isrc_cache():
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = IsrcCache()
+    return _shared_cache
+
+
+# local store of the isrc of every spotify track id, used to merge the single, album, and
+# regional releases of a song; each id is only ever looked up once
+class IsrcCache:
+
+    def __init__(self, file_path=ISRC_CACHE_PATH):
+        self.file_path = file_path
+        # track id to isrc, or None if spotify has no isrc for the track
+        self.isrcs = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        # canonical integer id of every catalog track, rebuilt when the catalog or isrcs change
+        self._canonical = []
+        self._canonical_key = None
+        if os.path.isfile(file_path):
+            self.isrcs = codec.load(file_path)
+
+    # picks up isrcs another process fetched; call while holding the catalog lock
+    def reload(self):
+        if not os.path.isfile(self.file_path):
+            return
+        isrcs = codec.load(self.file_path)
+        with self._lock:
+            isrcs.update(self.isrcs)
+            self.isrcs = isrcs
+            self._canonical_key = None
+
+    def __contains__(self, track_id):
+        return track_id in self.isrcs
+
+    def get(self, track_id):
+        return self.isrcs.get(track_id)
+
+    # fetches the isrc of any tracks not already in the cache
+    # params: auth--spotify authorization
+    #         track_ids--iterable of track ids
+    # return: number of tracks fetched from spotify
+    def fetch(self, auth, track_ids):
+        missing = sorted({track_id for track_id in track_ids if track_id and track_id not in self.isrcs})
+        if not missing:
+            return 0
+
+        print(f'fetching isrcs for {len(missing)} tracks')
+        fetched = 0
+        for sub_list in spotify_api.get_tracks(auth, missing):
+            items = sub_list['tracks']
+            with self._lock:
+                for track_id, item in zip(missing[fetched:fetched + len(items)], items):
+                    # spotify returns null for ids it no longer has; remember that too
+                    self.isrcs[track_id] = (item or {}).get('external_ids', {}).get('isrc')
+                self._canonical_key = None
+            fetched += len(items)
+        self._dirty = True
+        return fetched
+
+    # maps the integer id of every track in a catalog to the integer id of its canonical track,
+    # the first track played with the same isrc; tracks without a known isrc map to themselves
+    # the map is only rebuilt when the catalog grows or isrcs are fetched, so it costs
+    # nothing per query
+    # params: catalog--TrackCatalog
+    # return: list indexed by integer id
+    def canonical_indexes(self, catalog):
+        with self._lock:
+            key = (id(catalog), len(catalog))
+            if self._canonical_key != key:
+                first_by_isrc = {}
+                canonical = []
+                for index in range(len(catalog)):
+                    isrc = self.isrcs.get(catalog.get(index)[3])
+                    if isrc is None:
+                        canonical.append(index)
+                    else:
+                        canonical.append(first_by_isrc.setdefault(isrc, index))
+                self._canonical = canonical
+                self._canonical_key = key
+            return self._canonical
+
+    # writes the cache to disk if anything was fetched
+    def persist(self):
+        if self._dirty:
+            with self._lock:
+                isrcs = dict(self.isrcs)
+                self._dirty = False
+            atomic_write(self.file_path, isrcs)
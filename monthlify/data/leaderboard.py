@@ -0,0 +1,194 @@
+import heapq
+import os
+import threading
+
+from monthlify.data.feature_cache import FEATURE_NAMES
+from monthlify.data import codec
+from monthlify.data.storage import atomic_write
+
+LEADERBOARD_PATH = './play_log/leaderboard.json'
+
+_shared_leaderboard = None
+_shared_lock = threading.Lock()
+
+
+# gets the leaderboard shared by everything in this process, loading it on first use
+def get_shared_leaderboard():
+    global _shared_leaderboard
+    with _shared_lock:
+        if _shared_leaderboard is None:
+            _shared_leaderboard = Leaderboard()
+    return _shared_leaderboard
+
+
+# binary max heap of counts that knows where every key sits, so a count can be raised in place
+# counts only ever go up, so raising one only has to sift it towards the root
+class IndexedHeap:
+
+    # params: counts--optional dict of key to count to start from
+    def __init__(self, counts=None):
+        self.counts = dict(counts or {})
+        # sorted from most to least is already a valid heap
+        self._heap = sorted(self.counts, key=self.counts.get, reverse=True)
+        self._positions = {key: position for position, key in enumerate(self._heap)}
+
+    def __len__(self):
+        return len(self._heap)
+
+    # adds to the count of a key, adding the key if it's new
+    def increment(self, key, count=1):
+        position = self._positions.get(key)
+        self.counts[key] = self.counts.get(key, 0) + count
+        if position is None:
+            position = len(self._heap)
+            self._heap.append(key)
+            self._positions[key] = position
+        self._sift_up(position)
+
+    def _sift_up(self, position):
+        heap = self._heap
+        key = heap[position]
+        count = self.counts[key]
+        while position:
+            parent = (position - 1) // 2
+            if self.counts[heap[parent]] >= count:
+                break
+            heap[position] = heap[parent]
+            self._positions[heap[position]] = position
+            position = parent
+        heap[position] = key
+        self._positions[key] = position
+
+    # gets the keys with the highest counts without touching the rest of the heap
+    # only the children of keys already taken can be next, so this is O(number log number)
+    # return: list of (key, count) tuples sorted by count
+    def top(self, number):
+        heap = self._heap
+        results = []
+        frontier = [(-self.counts[heap[0]], 0)] if heap else []
+        while frontier and len(results) < number:
+            count, position = heapq.heappop(frontier)
+            results.append((heap[position], -count))
+            for child in (2 * position + 1, 2 * position + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (-self.counts[heap[child]], child))
+        return results
+
+
+# materialized plays of the current month, updated in place by every ingest so the month's
+# top tracks and artists never need the day files re-read
+# tracks are keyed by TrackCatalog integer id and artists by name, like the day files
+class Leaderboard:
+
+    def __init__(self, file_path=LEADERBOARD_PATH):
+        self.file_path = file_path
+        self._version = None
+        self._lock = threading.Lock()
+        # held while checking which month is counted and counting a new one, which takes far
+        # longer than any single update
+        self._month_lock = threading.Lock()
+        self.reset(None)
+        self.refresh()
+
+    # empties the leaderboard and starts counting a new month
+    # params: month--YYYY-MM string
+    def reset(self, month):
+        self.month = month
+        self.tracks = IndexedHeap()
+        self.artists = IndexedHeap()
+        self.total_plays = 0
+        # play weighted feature sums of each day, replaced whenever the day is written since
+        # features of new tracks may only be found when the day is persisted
+        self.day_features = {}
+
+    def _file_version(self):
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    # reloads the leaderboard if another process has written it since it was last read
+    def refresh(self):
+        version = self._file_version()
+        if version is None or version == self._version:
+            return
+        contents = codec.load(self.file_path)
+        with self._lock:
+            self.reset(contents['month'])
+            self.tracks = IndexedHeap({int(index): plays for index, plays in contents['tracks'].items()})
+            self.artists = IndexedHeap(contents['artists'])
+            self.total_plays = contents['total plays']
+            self.day_features = {date: (sums, plays) for date, (sums, plays) in contents['day features'].items()}
+            self._version = version
+
+    # counts plays of a track
+    # params: index--TrackCatalog integer id of the track
+    #         artist--name of the track's artist
+    #         count--number of plays
+    def add(self, index, artist, count=1):
+        with self._lock:
+            self.tracks.increment(index, count)
+            self.artists.increment(artist, count)
+            self.total_plays += count
+
+    # records the feature sums of a day of the month as they were last written
+    def set_day_features(self, date, feature_sums, feature_plays):
+        with self._lock:
+            self.day_features[str(date)] = (dict(feature_sums), feature_plays)
+
+    # adds every play of a day that was written before the leaderboard was counting
+    # params: day--DayData of a day of the month
+    def add_day(self, day):
+        for index, plays in day.dict.items():
+            self.add(index, day.catalog.get(index)[1], plays)
+        self.set_day_features(day.date, day.feature_sums, day.feature_plays)
+
+    # makes sure the leaderboard counts a month, counting the days of it already written the
+    # first time; the month lock is held throughout so only one thread counts them and no
+    # thread sees the month half counted
+    # params: month--YYYY-MM string
+    #         days--function returning an iterable of the DayData of every day of the month
+    # return: True if the month was started
+    def start_month(self, month, days):
+        with self._month_lock:
+            self.refresh()
+            if self.month == month:
+                return False
+            print(f'starting the leaderboard for {month}')
+            self.reset(month)
+            for day in days():
+                if day.total_plays:
+                    self.add_day(day)
+            return True
+
+    # return: list of (TrackCatalog integer id, plays) tuples sorted by plays
+    def top_tracks(self, number=50):
+        with self._lock:
+            return self.tracks.top(number)
+
+    # return: list of (artist, plays) tuples sorted by plays
+    def top_artists(self, number=20):
+        with self._lock:
+            return self.artists.top(number)
+
+    # calculates the play weighted average energy, tempo, and valence of the month so far
+    # return: tuple of (energy, tempo, valence) averages
+    def meta_data(self):
+        with self._lock:
+            feature_plays = sum(plays for sums, plays in self.day_features.values())
+            if not feature_plays:
+                return 0, 0, 0
+            return tuple(sum(sums.get(name, 0) for sums, plays in self.day_features.values()) / feature_plays
+                         for name in FEATURE_NAMES[:3])
+
+    # writes the leaderboard to disk; call while holding the catalog lock
+    def persist(self):
+        with self._lock:
+            contents = {'month': self.month,
+                        'tracks': self.tracks.counts,
+                        'artists': self.artists.counts,
+                        'total plays': self.total_plays,
+                        'day features': self.day_features}
+            atomic_write(self.file_path, contents)
+        self._version = self._file_version()
@@ -1,9 +1,23 @@
+import functools
 import string
-import requests
 import re
-from nltk.corpus import stopwords
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
-from bs4 import BeautifulSoup
+
+# nltk, bs4, and requests are slow to import and only needed once lyrics are analyzed,
+# so they are imported on first use
+
+
+# return: set of english stop words
+@functools.lru_cache(maxsize=None)
+def _stop_words():
+    from nltk.corpus import stopwords
+    return frozenset(stopwords.words('english'))
+
+
+# the vader lexicon is loaded once and shared
+@functools.lru_cache(maxsize=None)
+def _sentiment_analyzer():
+    from nltk.sentiment.vader import SentimentIntensityAnalyzer
+    return SentimentIntensityAnalyzer()
 
 
 # scrapes the track lyrics from genius
@@ -22,6 +36,9 @@ def get_lyrics(track_name, artist_name):
     url = f'{base_url}/{artist_name}-{track_name}-lyrics'
     print(url)
 
+    import requests
+    from bs4 import BeautifulSoup
+
     # parse the html
     try:
         page = requests.get(url)
@@ -45,7 +62,8 @@ def first_pass_sanitize_lyrics(lyrics):
 def tokenize_lyrics_word(lyrics):
     lyrics = lyrics.replace('\n', ' ')
     words = [word.strip(string.punctuation) for word in lyrics.split(" ")]
-    filtered_words = {word for word in words if word not in stopwords.words('english')}
+    stop_words = _stop_words()
+    filtered_words = {word for word in words if word not in stop_words}
     if '' in filtered_words:
         filtered_words.remove('')
     return filtered_words
@@ -102,7 +120,7 @@ def whole_sentiment_analysis(lyrics):
 
 
 def token_sentiment_analysis(tokens, verbose=False):
-    sid = SentimentIntensityAnalyzer()
+    sid = _sentiment_analyzer()
 
     sentiment_sum, positive_lines, neutral_lines, negative_lines = 0, 0, 0, 0
 
@@ -129,6 +147,20 @@ def token_sentiment_analysis(tokens, verbose=False):
     return sentiment_sum
 
 
+# scores a song on a scale that doesn't grow with its length, for averaging across plays
+# return: tuple of (mean compound sentiment of its paragraphs from -1 to 1, lexical richness),
+#         or None if the lyrics weren't found
+def lyric_scores(track_name, artist_name):
+    lyrics = get_lyrics(track_name, artist_name)
+    if not lyrics:
+        return None
+    clean = first_pass_sanitize_lyrics(lyrics)
+    paragraphs = tokenize_lyrics_paragraph(clean)
+    if not paragraphs:
+        return None
+    return token_sentiment_analysis(paragraphs) / len(paragraphs), get_lexical_richness(clean)
+
+
 def sentiment_analysis(track_name, artist_name, verbose=False):
     lyrics = get_lyrics(track_name, artist_name)
     if lyrics:
@@ -0,0 +1,122 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
+
+import numpy as np
+
+from monthlify.data import lyric_analyzer
+from monthlify.data import storage
+from monthlify.data import codec
+from monthlify.data.storage import atomic_write
+
+LYRIC_SCORES_PATH = './play_log/lyric_scores.json'
+
+# lyric pages fetched at once by a scoring job
+LYRIC_WORKERS = 4
+# tracks scored between writes of the table, so an interrupted job keeps most of its work
+LYRIC_PERSIST_EVERY = 25
+
+# columns of the aligned score array
+LYRIC_COLUMNS = ('sentiment', 'lexical_richness')
+
+_shared_table = None
+_shared_lock = threading.Lock()
+
+
+# gets the lyric score table shared by everything in this process, loading it on first use
+def get_shared_lyric_scores():
+    global _shared_table
+    with _shared_lock:
+        if _shared_table is None:
+            _shared_table = LyricScoreTable()
+    return _shared_table
+
+
+# local table of the lyric scores of every track that has been scored, keyed by track id
+# scoring fetches lyrics so it only ever happens in a batch job; reports only read the table
+class LyricScoreTable:
+
+    def __init__(self, file_path=LYRIC_SCORES_PATH):
+        self.file_path = file_path
+        # track id to [sentiment, lexical richness], or None if no lyrics were found
+        self.scores = {}
+        self._lock = threading.Lock()
+        self._aligned = None
+        self._aligned_key = None
+        if os.path.isfile(file_path):
+            self.scores = codec.load(file_path)
+
+    def __contains__(self, track_id):
+        return track_id in self.scores
+
+    # return: (sentiment, lexical richness) tuple, or None if unscored or without lyrics
+    def get(self, track_id):
+        score = self.scores.get(track_id)
+        return tuple(score) if score else None
+
+    # picks up scores another job wrote; call while holding the lyric scores lock
+    def reload(self):
+        if not os.path.isfile(self.file_path):
+            return
+        scores = codec.load(self.file_path)
+        with self._lock:
+            scores.update(self.scores)
+            self.scores = scores
+            self._aligned_key = None
+
+    # scores the lyrics of every track not already in the table, a few pages at a time
+    # params: tracks--dict of track id to (track, artist) tuple
+    #         workers--number of lyric pages fetched at once
+    #         limit--optional max number of tracks to score in this run
+    # return: number of tracks scored
+    def score(self, tracks, workers=LYRIC_WORKERS, limit=None):
+        with storage.file_lock('lyric-scores'):
+            self.reload()
+            missing = sorted(track_id for track_id in tracks if track_id and track_id not in self.scores)
+            missing = missing[:limit] if limit is not None else missing
+            if not missing:
+                return 0
+
+            print(f'scoring lyrics of {len(missing)} tracks')
+            scored = 0
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(lyric_analyzer.lyric_scores, *tracks[track_id]): track_id
+                           for track_id in missing}
+                try:
+                    for future in as_completed(futures):
+                        score = future.result()
+                        with self._lock:
+                            self.scores[futures[future]] = list(score) if score is not None else None
+                            self._aligned_key = None
+                        scored += 1
+                        if scored % LYRIC_PERSIST_EVERY == 0:
+                            self.persist()
+                finally:
+                    for future in futures:
+                        future.cancel()
+                    self.persist()
+        return scored
+
+    # lines the scores up with the integer ids of a TrackCatalog so they can be joined with
+    # play counts in one vectorized step; rebuilt only when the catalog or the table changes
+    # params: catalog--TrackCatalog
+    # return: 2d float array of LYRIC_COLUMNS with a row per catalog id; nan where unknown
+    def aligned(self, catalog):
+        with self._lock:
+            key = (id(catalog), len(catalog))
+            if self._aligned_key != key:
+                aligned = np.full((len(catalog), len(LYRIC_COLUMNS)), np.nan)
+                for index, track in enumerate(catalog.tracks):
+                    score = self.scores.get(track[3])
+                    if score:
+                        aligned[index] = score
+                self._aligned = aligned
+                self._aligned_key = key
+            return self._aligned
+
+    def persist(self):
+        with self._lock:
+            scores = dict(self.scores)
+        atomic_write(self.file_path, scores)
+
@@ -0,0 +1,89 @@
+import os
+
+import monthlify.data.spotify_api as spotify_api
+from monthlify.data import codec
+from monthlify.data.storage import atomic_write
+
+PLAYLIST_CACHE_PATH = './monthlify/data/playlist_cache.json'
+
+
+# local copy of the user's playlists and their tracks
+# tracks are stored along with the snapshot_id spotify gave the playlist when they were
+# fetched, so a playlist is only downloaded again once its snapshot changes
+class PlaylistCache:
+
+    def __init__(self, file_path=PLAYLIST_CACHE_PATH):
+        self.file_path = file_path
+        # playlist id to dict of name, snapshot_id, and tracks (or None if not fetched)
+        self.playlists = {}
+        if os.path.isfile(file_path):
+            self.playlists = codec.load(file_path)
+        self._names = {}
+        self._index_names()
+
+    # lower case name to playlist id; the first playlist wins if names are shared
+    def _index_names(self):
+        self._names = {}
+        for playlist_id, playlist in self.playlists.items():
+            self._names.setdefault(playlist['name'].lower(), playlist_id)
+
+    # fetches the list of every playlist and forgets the tracks of any whose snapshot changed
+    # params: auth--spotify authorization
+    # return: json object with all the playlists under "items"
+    def refresh(self, auth):
+        results = spotify_api.get_all_playlists(auth)
+
+        playlists = {}
+        for item in results['items']:
+            cached = self.playlists.get(item['id'])
+            tracks = None
+            if cached is not None and cached['snapshot_id'] == item['snapshot_id']:
+                tracks = cached['tracks']
+            playlists[item['id']] = {'name': item['name'],
+                                     'snapshot_id': item['snapshot_id'],
+                                     'tracks': tracks}
+        self.playlists = playlists
+        self._index_names()
+        self.persist()
+        return results
+
+    # finds a playlist id by name, ignoring case
+    # return: the id or None if there is no such playlist
+    def find_id(self, playlist_name):
+        return self._names.get(playlist_name.lower())
+
+    # gets the tracks of a playlist, only downloading them if the snapshot changed
+    # a playlist that wasn't in the list when it was last fetched (e.g. one made since) is
+    # looked up on its own
+    # params: auth--spotify authorization
+    #         playlist_id--spotify id of the playlist
+    # return: list of (track, artist, id) tuples
+    # raises: BadRequestError if spotify has no such playlist
+    def get_tracks(self, auth, playlist_id):
+        playlist = self.playlists.get(playlist_id)
+        if playlist is None:
+            item = spotify_api.get_playlist(auth, playlist_id)
+            playlist = {'name': item['name'], 'snapshot_id': item['snapshot_id'], 'tracks': None}
+            self.playlists[playlist_id] = playlist
+            self._names.setdefault(item['name'].lower(), playlist_id)
+        if playlist['tracks'] is None:
+            list_of_tracks = []
+            offset = 0
+            while True:
+                playlist_tracks = spotify_api.get_tracks_from_playlist(auth, playlist_id, offset)
+                for item in playlist_tracks['items']:
+                    # local files and removed tracks have no track data
+                    if not item['track']:
+                        continue
+                    list_of_tracks.append([item['track']['name'],
+                                           item['track']['artists'][0]['name'],
+                                           item['track']['id']])
+                if playlist_tracks['next'] is None:
+                    break
+                offset += len(playlist_tracks['items'])
+            playlist['tracks'] = list_of_tracks
+            self.persist()
+        return [tuple(track) for track in playlist['tracks']]
+
+    def persist(self):
+        atomic_write(self.file_path, self.playlists)
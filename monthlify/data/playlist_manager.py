@@ -1,16 +1,33 @@
 import json
 
-from monthlify.auth import authenticate
+from monthlify.auth import get_authorization
 from monthlify.core import read_config
 from monthlify.core import BadRequestError
 import monthlify.data.spotify_api as spotify_api
+from monthlify.data.playlist_cache import PlaylistCache
 
 
 class PlaylistManager:
 
     def __init__(self):
-        self._conf = read_config()
-        self._auth = authenticate(self._conf)
+        self._feature_index = None
+        self._playlist_cache = PlaylistCache()
+        # the playlist listing is fetched at most once per PlaylistManager
+        self._playlists_refreshed = False
+
+    # only authenticate once something actually needs to talk to spotify
+    @property
+    def _auth(self):
+        return get_authorization(read_config())
+
+    # loads the feature index built by DataManager.build_feature_index once and reuses it
+    @property
+    def feature_index(self):
+        if self._feature_index is None:
+            # numpy is only imported once a mood or similar tracks playlist is made
+            from monthlify.data.feature_index import FeatureIndex
+            self._feature_index = FeatureIndex.load()
+        return self._feature_index
 
     def find_track(self, track, artist):
         result_track, result_artist, result_uri = spotify_api.find_track(self._auth, track, artist)
@@ -43,6 +60,8 @@ class PlaylistManager:
     #         tracks--list of track URIs for the playlist
     def prepare_playlist(self, userid, name, tracks, desc='Top 50 songs from the past month'):
         playlist_id = spotify_api.create_playlist(self._auth, userid, name, desc)
+        # the new playlist isn't in the cached listing yet
+        self._playlists_refreshed = False
         # if playlist population fails, playlist will be deleted
         try:
             spotify_api.populate_playlist(self._auth, playlist_id, tracks)
@@ -50,41 +69,63 @@ class PlaylistManager:
             spotify_api.delete_playlist(self._auth, playlist_id)
             raise BadRequestError
 
+    # finds the played tracks closest to a target mood using only the local feature index
+    # params: target--name of a mood in feature_index.MOODS or dict of feature name to value
+    #                 e.g. {'valence': 0.2, 'energy': 0.3}
+    #         number--number of tracks to find
+    # return: a list of the URIs
+    def find_mood_tracks(self, target, number=50):
+        results = self.feature_index.nearest(target, number)
+        return [f'spotify:track:{track_id}' for track_id, distance in results]
+
+    # finds the played tracks most similar to the seed tracks using only the local feature index
+    # params: seed_ids--list of track IDs
+    #         number--number of tracks to find, not counting the seeds
+    # return: a list of the URIs
+    def find_similar_tracks(self, seed_ids, number=50):
+        results = self.feature_index.similar(seed_ids, number)
+        return [f'spotify:track:{track_id}' for track_id, distance in results]
+
+    # creates a playlist of the tracks closest to a target mood
+    # params: userid--the user's spotify id
+    #         name--the name of the playlist
+    #         target--see find_mood_tracks
+    #         number--number of tracks in the playlist
+    def prepare_mood_playlist(self, userid, name, target, number=50):
+        tracks = self.find_mood_tracks(target, number)
+        mood = target if isinstance(target, str) else ', '.join(f'{k} {v}' for k, v in target.items())
+        self.prepare_playlist(userid, name, tracks, f'{number} songs for: {mood}')
+        return tracks
+
+    # creates a playlist of the tracks most similar to the seed tracks
+    # params: userid--the user's spotify id
+    #         name--the name of the playlist
+    #         seed_ids--list of track IDs
+    #         number--number of tracks in the playlist, not counting the seeds
+    def prepare_similar_playlist(self, userid, name, seed_ids, number=50):
+        tracks = self.find_similar_tracks(seed_ids, number)
+        self.prepare_playlist(userid, name, tracks, f'{number} songs similar to {len(seed_ids)} seed tracks')
+        return tracks
+
     # returns json object containing all playlists and data
     def get_all_playlists(self):
-        return spotify_api.get_all_playlists(self._auth)
+        results = self._playlist_cache.refresh(self._auth)
+        self._playlists_refreshed = True
+        return results
 
     # finds playlist id
     def find_playlist_id(self, playlist_name):
-        all_playlists = self.get_all_playlists()
-        for playlist in all_playlists['items']:
-            # print(playlist['name'])
-            if playlist['name'].lower() == playlist_name.lower():
-                print('found playlist')
-                return playlist['id']
-        print('did not find playlist')
-        return None
+        if not self._playlists_refreshed:
+            self.get_all_playlists()
+        playlist_id = self._playlist_cache.find_id(playlist_name)
+        if playlist_id is None:
+            print('did not find playlist')
+        else:
+            print('found playlist')
+        return playlist_id
 
     # extracts list of tracks+artists from a playlist
+    # tracks are only downloaded again if the playlist changed since they were cached
     def extract_tracks_and_artists_from_playlist(self, playlist_name):
         playlist_id = self.find_playlist_id(playlist_name)
-
-        # do while loop to grab all tracks form playlist
-        list_of_tracks = []
-        more_tracks = True
-        offset = 0
-        while more_tracks:
-            playlist_tracks = spotify_api.get_tracks_from_playlist(self._auth, playlist_id, offset)
-            for item in playlist_tracks['items']:
-                track = item['track']['name']
-                artist = item['track']['artists'][0]['name']
-                id = item['track']['id']
-                # print(f'{track} by {artist}')
-                list_of_tracks.append((track, artist, id))
-
-            if playlist_tracks['next'] is not None:
-                # print('more tracks')
-                offset += 100
-            else:
-                more_tracks = False
-        return list_of_tracks
+        return self._playlist_cache.get_tracks(self._auth, playlist_id)
@@ -0,0 +1,127 @@
+import copy
+import datetime
+import functools
+import os
+import threading
+from collections import OrderedDict
+
+# number of reports kept before the least recently used is evicted
+REPORT_CACHE_SIZE = 256
+
+# files of the lookups that enrichment fills in and reports join in at query time: audio
+# features, isrcs, lyric scores, and artist genres (see feature_cache, isrc_cache, lyric_scores,
+# and artist_catalog); enrichment usually runs in another process, so their versions are part
+# of every key just like the versions of the days
+JOINED_PATHS = ('./play_log/features.json', './play_log/isrcs.json', './play_log/lyric_scores.json',
+                './play_log/artists.json')
+
+# writes to each day made by this process; stat alone can miss two writes within
+# the file system's timestamp resolution that leave the file the same size
+_write_counters = {}
+_write_lock = threading.Lock()
+
+
+# records that a day file was written; called by DayData.persist
+# params: date--date or string in format YYYY-MM-DD
+def bump_version(date):
+    key = str(date)
+    with _write_lock:
+        _write_counters[key] = _write_counters.get(key, 0) + 1
+
+
+# fingerprint of a day file that changes whenever the day is written by any process
+# params: date--date or string in format YYYY-MM-DD
+def day_version(date):
+    key = str(date)
+    try:
+        stat = os.stat(f'./play_log/days/{key}.json')
+    except FileNotFoundError:
+        return _write_counters.get(key, 0), None
+    return _write_counters.get(key, 0), stat.st_mtime_ns, stat.st_size
+
+
+# fingerprint of every file in JOINED_PATHS; changes whenever any process writes one
+def joined_version():
+    versions = []
+    for file_path in JOINED_PATHS:
+        try:
+            stat = os.stat(file_path)
+        except FileNotFoundError:
+            versions.append(None)
+            continue
+        versions.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(versions)
+
+
+# fingerprints of every day from start_date to end_date inclusive
+def range_version(start_date, end_date):
+    start = datetime.datetime.strptime(start_date, '%Y-%m-%d').date()
+    end = datetime.datetime.strptime(end_date, '%Y-%m-%d').date()
+    step = datetime.timedelta(days=1)
+    versions = []
+    while start <= end:
+        versions.append(day_version(start))
+        start += step
+    return tuple(versions)
+
+
+# size bounded least recently used cache of report results
+class ReportCache:
+
+    def __init__(self, maxsize=REPORT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # return: (True, value) on a hit or (False, None) on a miss
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+REPORT_CACHE = ReportCache()
+
+
+# caches a DataManager report method whose first params are start_date and end_date=None
+# the key covers the range, every other argument, the version of every day in the range, and
+# the version of the joined lookups, so a cached report is reused until one of its days is
+# written again or enrichment adds to what it joins in
+# params: skip--optional function of the call's (args, kwargs) after end_date; the call isn't
+#                cached when it returns True
+def cached_report(skip=None):
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, start_date, end_date=None, *args, **kwargs):
+            if skip is not None and skip(args, kwargs):
+                return method(self, start_date, end_date, *args, **kwargs)
+
+            if end_date is None:
+                end_date = start_date
+            key = (method.__name__, start_date, end_date, args, tuple(sorted(kwargs.items())),
+                   range_version(start_date, end_date), joined_version())
+            hit, value = REPORT_CACHE.get(key)
+            if not hit:
+                value = method(self, start_date, end_date, *args, **kwargs)
+                REPORT_CACHE.put(key, value)
+            # callers are free to modify what they get back
+            return copy.copy(value)
+        return wrapper
+    return decorator
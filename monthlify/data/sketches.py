@@ -0,0 +1,248 @@
+import hashlib
+import math
+import os
+
+from monthlify.data.storage import atomic_write
+
+SKETCHES_DIR = './play_log/sketches'
+
+# number of heavy hitters kept per sketch; items outside the top are only estimated
+HEAVY_HITTER_CAPACITY = 200
+COUNT_MIN_WIDTH = 2048
+COUNT_MIN_DEPTH = 4
+HYPER_LOG_LOG_PRECISION = 12
+
+
+# stable 64 bit hash; python's own hash() of a string changes between processes
+def _hash64(item):
+    return int.from_bytes(hashlib.blake2b(item.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+# count-min sketch: estimates never undercount and overcount by at most
+# epsilon * total with probability 1 - delta
+class CountMinSketch:
+
+    def __init__(self, width=COUNT_MIN_WIDTH, depth=COUNT_MIN_DEPTH):
+        self.width = width
+        self.depth = depth
+        self.total = 0
+        # only non zero cells are kept; most are zero for a day of plays
+        self.cells = {}
+
+    @property
+    def epsilon(self):
+        return math.e / self.width
+
+    @property
+    def delta(self):
+        return math.exp(-self.depth)
+
+    # one cell per row, picked by double hashing
+    def _cells(self, item):
+        hashed = _hash64(item)
+        low, high = hashed & 0xffffffff, hashed >> 32
+        return [row * self.width + (low + row * high) % self.width for row in range(self.depth)]
+
+    def add(self, item, count=1):
+        for cell in self._cells(item):
+            self.cells[cell] = self.cells.get(cell, 0) + count
+        self.total += count
+
+    def estimate(self, item):
+        return min(self.cells.get(cell, 0) for cell in self._cells(item))
+
+    # the maximum overcount of any estimate (with probability 1 - delta)
+    def error_bound(self):
+        return self.epsilon * self.total
+
+    def merge(self, other):
+        assert (self.width, self.depth) == (other.width, other.depth)
+        for cell, count in other.cells.items():
+            self.cells[cell] = self.cells.get(cell, 0) + count
+        self.total += other.total
+        return self
+
+    def to_dict(self):
+        return {'width': self.width, 'depth': self.depth, 'total': self.total,
+                'cells': [[cell, count] for cell, count in self.cells.items()]}
+
+    @classmethod
+    def from_dict(cls, contents):
+        sketch = cls(contents['width'], contents['depth'])
+        sketch.total = contents['total']
+        sketch.cells = {cell: count for cell, count in contents['cells']}
+        return sketch
+
+
+# space-saving heavy hitters: keeps at most capacity items, each with a count that
+# overestimates the true count by no more than its error
+class SpaceSaving:
+
+    def __init__(self, capacity=HEAVY_HITTER_CAPACITY):
+        self.capacity = capacity
+        # item to [count, error]
+        self.counters = {}
+
+    # smallest count kept, which bounds the count of any item that isn't kept
+    def min_count(self):
+        if len(self.counters) < self.capacity:
+            return 0
+        return min(count for count, error in self.counters.values())
+
+    def add(self, item, count=1):
+        if item in self.counters:
+            self.counters[item][0] += count
+        elif len(self.counters) < self.capacity:
+            self.counters[item] = [count, 0]
+        else:
+            evicted = min(self.counters, key=lambda key: self.counters[key][0])
+            floor = self.counters.pop(evicted)[0]
+            self.counters[item] = [floor + count, floor]
+
+    # merges another summary into this one; the result keeps the same guarantees
+    # as a single summary over both streams
+    def merge(self, other):
+        floor, other_floor = self.min_count(), other.min_count()
+        merged = {}
+        for item in set(self.counters) | set(other.counters):
+            count, error = self.counters.get(item, (floor, floor))
+            other_count, other_error = other.counters.get(item, (other_floor, other_floor))
+            merged[item] = [count + other_count, error + other_error]
+        kept = sorted(merged.items(), key=lambda kv: kv[1][0], reverse=True)[:self.capacity]
+        self.counters = {item: value for item, value in kept}
+        return self
+
+    # return: list of (item, count, error) tuples sorted by count
+    def top(self, number):
+        items = sorted(self.counters.items(), key=lambda kv: kv[1][0], reverse=True)
+        return [(item, count, error) for item, (count, error) in items[:number]]
+
+    def to_dict(self):
+        return {'capacity': self.capacity,
+                'counters': [[item, count, error] for item, (count, error) in self.counters.items()]}
+
+    @classmethod
+    def from_dict(cls, contents):
+        sketch = cls(contents['capacity'])
+        sketch.counters = {item: [count, error] for item, count, error in contents['counters']}
+        return sketch
+
+
+# hyperloglog distinct counter with a relative standard error of 1.04 / sqrt(2 ** precision)
+class HyperLogLog:
+
+    def __init__(self, precision=HYPER_LOG_LOG_PRECISION):
+        self.precision = precision
+        # register index to rank; registers that are still zero aren't stored
+        self.registers = {}
+
+    @property
+    def relative_error(self):
+        return 1.04 / math.sqrt(1 << self.precision)
+
+    def add(self, item):
+        hashed = _hash64(item)
+        register = hashed >> (64 - self.precision)
+        remaining = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remaining.bit_length() + 1
+        if rank > self.registers.get(register, 0):
+            self.registers[register] = rank
+
+    def estimate(self):
+        m = 1 << self.precision
+        alpha = 0.7213 / (1 + 1.079 / m)
+        zeros = m - len(self.registers)
+        raw = alpha * m * m / (zeros + sum(2.0 ** -rank for rank in self.registers.values()))
+        # small range correction
+        if raw <= 2.5 * m and zeros:
+            return m * math.log(m / zeros)
+        return raw
+
+    def merge(self, other):
+        assert self.precision == other.precision
+        for register, rank in other.registers.items():
+            if rank > self.registers.get(register, 0):
+                self.registers[register] = rank
+        return self
+
+    def to_dict(self):
+        return {'precision': self.precision,
+                'registers': [[register, rank] for register, rank in self.registers.items()]}
+
+    @classmethod
+    def from_dict(cls, contents):
+        sketch = cls(contents['precision'])
+        sketch.registers = {register: rank for register, rank in contents['registers']}
+        return sketch
+
+
+# every sketch of the plays of a day or a rollup of days; merging is associative
+# so any range can be answered by merging its days in any order
+class PlaySketch:
+
+    def __init__(self):
+        self.tracks = SpaceSaving()
+        self.artists = SpaceSaving()
+        self.counts = CountMinSketch()
+        self.distinct_tracks = HyperLogLog()
+        self.distinct_artists = HyperLogLog()
+
+    # params: track_id--spotify id of the track
+    #         artist--name of the artist
+    #         count--number of plays
+    def add(self, track_id, artist, count=1):
+        self.tracks.add(track_id, count)
+        self.artists.add(artist, count)
+        self.counts.add(f't:{track_id}', count)
+        self.counts.add(f'a:{artist}', count)
+        self.distinct_tracks.add(track_id)
+        self.distinct_artists.add(artist)
+
+    def merge(self, other):
+        self.tracks.merge(other.tracks)
+        self.artists.merge(other.artists)
+        self.counts.merge(other.counts)
+        self.distinct_tracks.merge(other.distinct_tracks)
+        self.distinct_artists.merge(other.distinct_artists)
+        return self
+
+    # the top tracks or artists with bounds on their true plays
+    # params: kind--'tracks' or 'artists'
+    #         number--number of items to return
+    # return: list of (item, estimated plays, max error) tuples sorted by plays
+    def top(self, kind, number):
+        prefix = 't' if kind == 'tracks' else 'a'
+        heavy_hitters = self.tracks if kind == 'tracks' else self.artists
+        cms_error = self.counts.error_bound()
+        results = []
+        for item, count, error in heavy_hitters.top(number):
+            # both sketches only ever overcount so the smaller estimate is the better one
+            estimate = min(count, self.counts.estimate(f'{prefix}:{item}'))
+            results.append((item, estimate, min(error, cms_error)))
+        return results
+
+    def to_dict(self):
+        return {'tracks': self.tracks.to_dict(),
+                'artists': self.artists.to_dict(),
+                'counts': self.counts.to_dict(),
+                'distinct tracks': self.distinct_tracks.to_dict(),
+                'distinct artists': self.distinct_artists.to_dict()}
+
+    @classmethod
+    def from_dict(cls, contents):
+        sketch = cls()
+        sketch.tracks = SpaceSaving.from_dict(contents['tracks'])
+        sketch.artists = SpaceSaving.from_dict(contents['artists'])
+        sketch.counts = CountMinSketch.from_dict(contents['counts'])
+        sketch.distinct_tracks = HyperLogLog.from_dict(contents['distinct tracks'])
+        sketch.distinct_artists = HyperLogLog.from_dict(contents['distinct artists'])
+        return sketch
+
+
+def sketch_path(date):
+    return os.path.join(SKETCHES_DIR, f'{date}.json')
+
+
+def write_sketch(date, sketch):
+    os.makedirs(SKETCHES_DIR, exist_ok=True)
+    atomic_write(sketch_path(date), sketch.to_dict())
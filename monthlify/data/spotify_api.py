@@ -1,10 +1,24 @@
-import requests
 import json
 import datetime
+import threading
+import time
 
 from monthlify.core import read_config
 from monthlify.core import BadRequestError
 
+# one connection pool for every call to the spotify api, made on the first call
+_session = None
+_session_lock = threading.Lock()
+
+
+def _get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            _session = requests.Session()
+    return _session
+
 
 # finds a song in spotify by the artist
 def find_track(auth, track, artist):
@@ -13,7 +27,7 @@ def find_track(auth, track, artist):
     url = f'{conf.base_url}/search?q="{artist}"%20{track}&type=track'
     headers = {'Authorization': f'Bearer {auth.access_token}'}
 
-    response = requests.get(url, headers=headers)
+    response = _get_session().get(url, headers=headers)
 
     results = json.loads(response.text)
 
@@ -41,7 +55,7 @@ def find_top_tracks(auth):
     data = {'limit': 50,
             'time_range': 'short_term'}
 
-    response = requests.get(url, headers=headers, params=data)
+    response = _get_session().get(url, headers=headers, params=data)
 
     if response.status_code != 200:
         print(response.status_code)
@@ -69,7 +83,7 @@ def create_playlist(auth, userid, playlist_name, desc):
             'public': False,
             'description': desc}
 
-    response = requests.post(url, headers=headers, json=data)
+    response = _get_session().post(url, headers=headers, json=data)
 
     if response.status_code != 200 and response.status_code != 201:
         raise BadRequestError()
@@ -86,7 +100,7 @@ def delete_playlist(auth, playlist_id):
     url = f'{conf.base_url}/playlists/{playlist_id}/followers'
     headers = {'Authorization': f'Bearer {auth.access_token}'}
 
-    response = requests.delete(url, headers=headers)
+    response = _get_session().delete(url, headers=headers)
 
     if response.status_code != 200:
         raise BadRequestError()
@@ -102,7 +116,7 @@ def populate_playlist(auth, playlistid, tracks):
     headers = {'Authorization': f'Bearer {auth.access_token}'}
     data = {'uris': tracks}
 
-    response = requests.post(url, headers=headers, json=data)
+    response = _get_session().post(url, headers=headers, json=data)
 
     content = json.loads(response.content.decode('utf-8'))
 
@@ -128,7 +142,92 @@ def get_features(auth, tracks):
     for sub_list in tracks_list:
         params = {'ids': ','.join(sub_list)}
 
-        response = requests.get(url, headers=headers, params=params)
+        response = _get_session().get(url, headers=headers, params=params)
+
+        if response.status_code != 200:
+            print(f'status code is: {response.status_code}')
+            print(response.text)
+            raise BadRequestError()
+
+        results.append(json.loads(response.text))
+
+    return results
+
+
+# gets the full audio analysis (beats, bars, sections, ...) of a single track from spotify
+# params: track--track ID
+#         retries--number of times to wait out rate limiting before giving up
+# return: json object of the analysis, or None if spotify has no analysis for the track
+def get_audio_analysis(auth, track, retries=3):
+    conf = read_config()
+
+    url = f'{conf.base_url}/audio-analysis/{track}'
+    headers = {'Authorization': f'Bearer {auth.access_token}'}
+
+    for attempt in range(retries + 1):
+        response = _get_session().get(url, headers=headers)
+
+        # rate limited; spotify says how long to wait
+        if response.status_code == 429 and attempt < retries:
+            time.sleep(int(response.headers.get('Retry-After', 1)))
+            continue
+        if response.status_code == 404:
+            return None
+        if response.status_code != 200:
+            print(f'status code is: {response.status_code}')
+            print(response.text)
+            raise BadRequestError()
+
+        return json.loads(response.text)
+
+
+# gets the full track objects (including external ids like the isrc) of the specified tracks
+# params: tracks--list of track IDs
+def get_tracks(auth, tracks):
+
+    conf = read_config()
+
+    url = f'{conf.base_url}/tracks'
+    headers = {'Authorization': f'Bearer {auth.access_token}'}
+
+    # at most 50 tracks per request
+    tracks_list = [tracks[i * 50:(i + 1) * 50] for i in range((len(tracks) + 49) // 50)]
+
+    results = []
+
+    for sub_list in tracks_list:
+        params = {'ids': ','.join(sub_list)}
+
+        response = _get_session().get(url, headers=headers, params=params)
+
+        if response.status_code != 200:
+            print(f'status code is: {response.status_code}')
+            print(response.text)
+            raise BadRequestError()
+
+        results.append(json.loads(response.text))
+
+    return results
+
+
+# gets the full artist objects (name, genres, popularity) of the specified artists from spotify
+# params: artists--list of artist IDs
+def get_artists(auth, artists):
+
+    conf = read_config()
+
+    url = f'{conf.base_url}/artists'
+    headers = {'Authorization': f'Bearer {auth.access_token}'}
+
+    # at most 50 artists per request
+    artists_list = [artists[i * 50:(i + 1) * 50] for i in range((len(artists) + 49) // 50)]
+
+    results = []
+
+    for sub_list in artists_list:
+        params = {'ids': ','.join(sub_list)}
+
+        response = _get_session().get(url, headers=headers, params=params)
 
         if response.status_code != 200:
             print(f'status code is: {response.status_code}')
@@ -154,7 +253,7 @@ def get_recently_played(auth, last_scraped_ms=0):
     params = {'limit': 50,
               'after': last_scraped_ms}
 
-    response = requests.get(url, headers=headers, params=params)
+    response = _get_session().get(url, headers=headers, params=params)
 
     if response.status_code != 200:
         print(response.status_code)
@@ -170,25 +269,51 @@ def get_recently_played(auth, last_scraped_ms=0):
     return f'{now}.json'
 
 
+# gets every playlist of the user, following spotify's pagination
+# return: json object with all the playlists under "items"
 def get_all_playlists(auth):
     conf = read_config()
 
     url = f'{conf.base_url}/me/playlists'
     headers = {'Authorization': f'Bearer {auth.access_token}'}
 
-    # max 50 playlists
+    # max 50 playlists per page
     params = {'limit': 50}
 
-    response = requests.get(url, headers=headers, params=params)
+    items = []
+    while url:
+        response = _get_session().get(url, headers=headers, params=params)
+
+        if response.status_code != 200:
+            print(response.status_code)
+            print(response.text)
+            raise BadRequestError()
+
+        results = json.loads(response.text)
+        items.extend(results['items'])
+        # the next url already carries the paging params
+        url = results['next']
+        params = None
+
+    results['items'] = items
+    return results
+
+
+# gets the id, name, and snapshot_id of a single playlist, e.g. one made since the list was fetched
+def get_playlist(auth, playlist_id):
+    conf = read_config()
+
+    url = f'{conf.base_url}/playlists/{playlist_id}'
+    headers = {'Authorization': f'Bearer {auth.access_token}'}
+    params = {'fields': 'id,name,snapshot_id'}
+
+    response = _get_session().get(url, headers=headers, params=params)
 
     if response.status_code != 200:
         print(response.status_code)
         print(response.text)
         raise BadRequestError()
 
-    with open(f'./monthlify/data/playlists.json', mode='w', encoding='utf-8') as file:
-        file.write(response.text)
-
     results = json.loads(response.text)
 
     return results
@@ -201,7 +326,7 @@ def get_tracks_from_playlist(auth, playlist_id, offset=0):
     headers = {'Authorization': f'Bearer {auth.access_token}'}
     params = {'offset': offset}
 
-    response = requests.get(url, headers=headers, params=params)
+    response = _get_session().get(url, headers=headers, params=params)
 
     if response.status_code != 200:
         print(response.status_code)
@@ -0,0 +1,150 @@
+import contextlib
+import os
+import tempfile
+import threading
+
+from monthlify.data import codec
+
+try:
+    import fcntl
+except ImportError:
+    # no advisory locks on windows; writers must not run concurrently there
+    fcntl = None
+
+LOCKS_DIR = './play_log/locks'
+# extension of files being written, until they are renamed into place
+TEMP_SUFFIX = '.tmp'
+
+# renames waiting for the group commit active on this thread, if any
+_group = threading.local()
+
+# number of holds of each file lock by any thread of this process, and by this thread
+_held = {}
+_held_lock = threading.Lock()
+_thread_held = threading.local()
+
+
+# encodes an object without ever leaving a partially written file behind
+# the data is written to a temp file in the same dir and then renamed over the target,
+# so readers always see either the old or the new file and never need a lock
+# inside a group_commit the rename waits until the whole group is written
+# params: file_path--path of the file to be written
+#         obj--json serializable object
+#         codec_name--optional codec; defaults to codec.default_codec(); read back with codec.load
+def atomic_write(file_path, obj, codec_name=None):
+    data = codec.encode(obj, codec_name)
+    directory = os.path.dirname(file_path) or '.'
+    # named so no reader scanning the dir for data files e.g. *.json ever picks it up
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix=TEMP_SUFFIX)
+    try:
+        with os.fdopen(fd, mode='wb') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+    pending = getattr(_group, 'pending', None)
+    if pending is not None:
+        pending.append((temp_path, file_path))
+    else:
+        os.replace(temp_path, file_path)
+        _fsync_dir(directory)
+
+
+def _fsync_dir(directory):
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# batches every atomic_write made on this thread inside the block
+# all the files are written first and then renamed into place together, with one
+# directory sync per directory instead of one per file; if the block fails nothing is renamed
+@contextlib.contextmanager
+def group_commit():
+    # an inner group just joins the outer one
+    if getattr(_group, 'pending', None) is not None:
+        yield
+        return
+
+    pending = []
+    _group.pending = pending
+    try:
+        yield
+    except BaseException:
+        for temp_path, file_path in pending:
+            os.remove(temp_path)
+        raise
+    finally:
+        _group.pending = None
+
+    directories = set()
+    for temp_path, file_path in pending:
+        os.replace(temp_path, file_path)
+        directories.add(os.path.dirname(file_path) or '.')
+    for directory in directories:
+        _fsync_dir(directory)
+
+
+# holds an exclusive advisory lock across processes for the duration of the block
+# readers never take these; they are only for writers doing read-modify-write
+# params: name--name of the lock e.g. 'catalog' or 'day-2019-08-04'
+@contextlib.contextmanager
+def file_lock(name):
+    if fcntl is None:
+        with _holding(name):
+            yield
+        return
+
+    os.makedirs(LOCKS_DIR, exist_ok=True)
+    with open(os.path.join(LOCKS_DIR, f'{name}.lock'), mode='a') as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            with _holding(name):
+                yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+@contextlib.contextmanager
+def _holding(name):
+    thread_held = _thread_held.__dict__
+    with _held_lock:
+        _held[name] = _held.get(name, 0) + 1
+    thread_held[name] = thread_held.get(name, 0) + 1
+    try:
+        yield
+    finally:
+        thread_held[name] -= 1
+        with _held_lock:
+            _held[name] -= 1
+
+
+# whether a file lock is held by this process; flock locks aren't reentrant, so code that
+# may run under a lock its own process holds checks this instead of taking it again
+# params: thread--only count holds by the calling thread
+def is_held(name, thread=False):
+    if thread:
+        return _thread_held.__dict__.get(name, 0) > 0
+    with _held_lock:
+        return _held.get(name, 0) > 0
+
+
+# lock for read-modify-write of a single day file
+def day_lock(date):
+    return file_lock(f'day-{date}')
+
+
+# lock held by anything that adds to the track catalog or the event log; taken before any day lock
+def catalog_lock():
+    return file_lock('catalog')
+
+
+def holds_catalog_lock(thread=False):
+    return is_held('catalog', thread)
@@ -0,0 +1,158 @@
+import os
+import threading
+
+from monthlify.data import codec
+from monthlify.data import storage
+from monthlify.data.storage import atomic_write
+
+CATALOG_PATH = './play_log/catalog.json'
+
+_shared_catalog = None
+_shared_lock = threading.Lock()
+
+
+# gets the catalog shared by everything in this process, loading it on first use
+def get_shared_catalog():
+    global _shared_catalog
+    with _shared_lock:
+        if _shared_catalog is None:
+            _shared_catalog = TrackCatalog()
+    return _shared_catalog
+
+
+# maps every spotify track id that has been played to a compact integer
+# the integer is the position of the track in the catalog, so it never changes
+class TrackCatalog:
+
+    def __init__(self, file_path=CATALOG_PATH):
+        self.file_path = file_path
+        # list of (track, artist, album, track id) tuples indexed by integer id
+        self.tracks = []
+        self._ids = {}
+        self._dirty = False
+        # number of tracks known to be in the file
+        self._persisted = 0
+        # days may be loaded on several threads at once
+        self._lock = threading.Lock()
+        # so an older snapshot of the tracks is never written over a newer one
+        self._persist_lock = threading.Lock()
+        # the file as it was last read or written, to tell when another process has written it
+        self._version = self._file_version()
+        if os.path.isfile(file_path):
+            for item in codec.load(file_path):
+                self._ids[item[3]] = len(self.tracks)
+                self.tracks.append(tuple(item))
+        self._persisted = len(self.tracks)
+
+    def _file_version(self):
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    # picks up tracks another process added since the file was last read, e.g. so a long
+    # running reader can resolve the ids of days ingested after it started
+    # params: force--reload even if the file looks unchanged, e.g. when a day has an unknown id
+    def refresh(self, force=False):
+        if not force and self._file_version() == self._version:
+            return
+        # while this process holds the catalog lock nobody else can have added tracks, and the
+        # holder may have interned tracks it hasn't persisted yet
+        if storage.holds_catalog_lock():
+            return
+        with storage.catalog_lock():
+            self.reload()
+
+    # picks up tracks another process added to the file; call while holding the catalog lock
+    # the file is append only so every persisted track keeps its id; tracks that were interned
+    # here but never persisted are given new ids after the ones on disk
+    def reload(self):
+        if not os.path.isfile(self.file_path):
+            return
+        version = self._file_version()
+        items = codec.load(self.file_path)
+        with self._lock:
+            self._version = version
+            if len(items) == self._persisted:
+                return
+            unpersisted = self.tracks[self._persisted:]
+            del self.tracks[self._persisted:]
+            self._ids = {track[3]: index for index, track in enumerate(self.tracks)}
+            for item in items[self._persisted:] + unpersisted:
+                if item[3] not in self._ids:
+                    self._ids[item[3]] = len(self.tracks)
+                    self.tracks.append(tuple(item))
+            self._persisted = len(items)
+            self._dirty = len(self.tracks) > self._persisted
+
+    def __len__(self):
+        return len(self.tracks)
+
+    def __contains__(self, track_id):
+        return track_id in self._ids
+
+    # gets the integer id of a track, adding the track to the catalog if it's new
+    # params: track_info--tuple of (track, artist, album, track id)
+    # return: the integer id
+    def intern(self, track_info):
+        index = self._ids.get(track_info[3])
+        if index is None:
+            index = self.intern_many([track_info])[0]
+        return index
+
+    # gets the integer ids of tracks, adding any that are new to the catalog
+    # ids are shared by every process, so they are only handed out under the catalog lock:
+    # a writer holding it persists the catalog before letting go, and anything else (e.g. a
+    # reader of a day file written before the catalog) persists new tracks at once
+    # params: track_infos--list of (track, artist, album, track id) tuples
+    # return: list of integer ids
+    def intern_many(self, track_infos):
+        if all(track_info[3] in self._ids for track_info in track_infos):
+            return [self._ids[track_info[3]] for track_info in track_infos]
+        if storage.holds_catalog_lock(thread=True):
+            return self._add(track_infos)
+        if storage.holds_catalog_lock():
+            # another thread of this process holds the lock, e.g. while it reads ahead days
+            # on worker threads, so the file is this process's to write
+            indexes = self._add(track_infos)
+            self.persist()
+            return indexes
+        with storage.catalog_lock():
+            self.reload()
+            indexes = self._add(track_infos)
+            self.persist()
+        return indexes
+
+    def _add(self, track_infos):
+        indexes = []
+        with self._lock:
+            for track_info in track_infos:
+                index = self._ids.get(track_info[3])
+                if index is None:
+                    index = len(self.tracks)
+                    self.tracks.append(tuple(track_info))
+                    self._ids[track_info[3]] = index
+                    self._dirty = True
+                indexes.append(index)
+        return indexes
+
+    # gets the integer id of a spotify track id
+    # return: the integer id or None if the track was never played
+    def index(self, track_id):
+        return self._ids.get(track_id)
+
+    # gets the (track, artist, album, track id) tuple of an integer id
+    def get(self, index):
+        return self.tracks[index]
+
+    # writes the catalog to disk if any tracks were added
+    def persist(self):
+        with self._persist_lock:
+            if self._dirty:
+                with self._lock:
+                    tracks = list(self.tracks)
+                    self._dirty = False
+                atomic_write(self.file_path, tracks)
+                self._persisted = len(tracks)
+                self._version = self._file_version()
@@ -0,0 +1,197 @@
+import datetime
+import os
+import tempfile
+
+import numpy as np
+
+from monthlify.data import codec
+from monthlify.data import storage
+from monthlify.data.storage import atomic_write
+
+TRENDS_DIR = './play_log/trends'
+
+# how far a track has to rise above its usual plays to count as a breakout, in standard deviations
+BREAKOUT_THRESHOLD = 2.0
+
+
+# plays of every column (a track or an artist) on every day, in compressed sparse row form
+# row r holds the plays of day start + r; column c is a TrackCatalog integer id for tracks,
+# or a position in labels for artists
+# every score is computed for all columns at once by bincounting slices of the nonzero entries
+class CountMatrix:
+
+    # params: start--date of the first row
+    #         indptr--array of row offsets into indices and data, one more than there are rows
+    #         indices--array of the column of every nonzero entry
+    #         data--array of the plays of every nonzero entry
+    #         columns--number of columns
+    #         labels--optional list naming each column
+    def __init__(self, start, indptr, indices, data, columns, labels=None):
+        self.start = start
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.columns = columns
+        self.labels = labels
+
+    @property
+    def rows(self):
+        return len(self.indptr) - 1
+
+    # builds the matrix from the plays of consecutive days
+    # params: start--date of the first day
+    #         days--iterable of dicts of column to plays, one per day in order
+    #         columns--number of columns
+    #         labels--optional list naming each column
+    @classmethod
+    def from_days(cls, start, days, columns, labels=None):
+        indptr = [0]
+        indices = []
+        data = []
+        for counts in days:
+            for column in sorted(counts):
+                indices.append(column)
+                data.append(counts[column])
+            indptr.append(len(indices))
+        return cls(start, np.array(indptr, dtype=np.int64), np.array(indices, dtype=np.uint32),
+                   np.array(data, dtype=np.uint32), columns, labels)
+
+    # writes the arrays next to each other as .npy files so they can be memory mapped
+    # the meta file is written last, so a reader never pairs it with arrays of another build
+    # params: name--'tracks' or 'artists'
+    #         built--fingerprint of the days the matrix was built from
+    def save(self, name, built, directory=TRENDS_DIR):
+        os.makedirs(directory, exist_ok=True)
+        for array_name in ('indptr', 'indices', 'data'):
+            # a temp file of its own, since two processes may rebuild the matrices at once
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix=storage.TEMP_SUFFIX)
+            with os.fdopen(fd, mode='wb') as file:
+                np.save(file, getattr(self, array_name))
+            os.replace(temp_path, os.path.join(directory, f'{name}.{array_name}.npy'))
+        atomic_write(os.path.join(directory, f'{name}.json'),
+                     {'start': self.start.isoformat(), 'rows': self.rows, 'nonzero': len(self.indices),
+                      'columns': self.columns, 'labels': self.labels, 'built': built})
+
+    # memory maps a saved matrix
+    # return: tuple of (CountMatrix, fingerprint it was built from), or None if there is no
+    #         complete matrix on disk
+    @classmethod
+    def load(cls, name, directory=TRENDS_DIR):
+        meta_path = os.path.join(directory, f'{name}.json')
+        if not os.path.isfile(meta_path):
+            return None
+        meta = codec.load(meta_path)
+        try:
+            arrays = [np.load(os.path.join(directory, f'{name}.{array_name}.npy'), mmap_mode='r')
+                      for array_name in ('indptr', 'indices', 'data')]
+        except FileNotFoundError:
+            return None
+        indptr, indices, data = arrays
+        # another build may have replaced the arrays after this meta file was read
+        if len(indptr) != meta['rows'] + 1 or len(indices) != meta['nonzero'] or len(data) != meta['nonzero']:
+            return None
+        start = datetime.datetime.strptime(meta['start'], '%Y-%m-%d').date()
+        return cls(start, indptr, indices, data, meta['columns'], meta['labels']), meta['built']
+
+    # params: date--date object or string in format YYYY-MM-DD
+    # return: the row of a day, which may be outside the matrix
+    def row_of(self, date):
+        if isinstance(date, str):
+            date = datetime.datetime.strptime(date, '%Y-%m-%d').date()
+        return (date - self.start).days
+
+    # sums the plays of every column over rows first to last inclusive
+    # rows outside the matrix count as days without plays
+    # return: array of plays, one per column
+    def window(self, first, last):
+        first = min(max(first, 0), self.rows)
+        last = min(max(last + 1, 0), self.rows)
+        low, high = self.indptr[first], self.indptr[max(first, last)]
+        return np.bincount(self.indices[low:high], weights=self.data[low:high], minlength=self.columns)
+
+    # sums the plays of every column in consecutive windows ending at a row
+    # return: 2d array of plays; row i is the window ending (periods - 1 - i) windows before end,
+    #         so the most recent window is last
+    def periods(self, end, length, periods):
+        return np.array([self.window(end - (periods - i) * length + 1, end - (periods - 1 - i) * length)
+                         for i in range(periods)]).reshape(periods, self.columns)
+
+    # weights every play by how long ago it was, halving every half_life days
+    # return: array of decayed plays, one per column
+    def decayed(self, end, half_life):
+        end = min(end, self.rows - 1)
+        if end < 0:
+            return np.zeros(self.columns)
+        ages = end - np.arange(end + 1)
+        weights = np.repeat(0.5 ** (ages / half_life), np.diff(self.indptr[:end + 2]))
+        high = self.indptr[end + 1]
+        return np.bincount(self.indices[:high], weights=weights * self.data[:high], minlength=self.columns)
+
+
+# compares the plays of the window ending at a row with the window before it
+# params: matrix--CountMatrix
+#         end--last row of the current window
+#         window--days per window
+# return: tuple of arrays (current plays, previous plays), one entry per column
+def window_over_window(matrix, end, window=7):
+    previous, current = matrix.periods(end, window, 2)
+    return current, previous
+
+
+# scores how far the plays of the window ending at a row rise above the column's usual plays
+# over the windows before it; columns with fewer than min_plays in the window score 0
+# params: matrix--CountMatrix
+#         end--last row of the current window
+#         window--days per window
+#         baseline--number of earlier windows the usual plays are taken from
+# return: tuple of arrays (scores, current plays), one entry per column
+def breakout_scores(matrix, end, window=7, baseline=8, min_plays=3):
+    history = matrix.periods(end, window, baseline + 1)
+    current = history[-1]
+    usual = history[:-1]
+    # the + 1 keeps columns that were never played from scoring infinitely
+    scores = (current - usual.mean(axis=0)) / (usual.std(axis=0) + 1)
+    scores[current < min_plays] = 0
+    return scores, current
+
+
+# gets the columns with the highest scores
+# params: scores--array of scores, one per column
+#         number--number of columns to return
+#         minimum--columns scoring at or below this are left out
+# return: array of columns sorted by score
+def top_columns(scores, number, minimum=0):
+    candidates = np.flatnonzero(scores > minimum)
+    if len(candidates) > number:
+        candidates = candidates[np.argpartition(-scores[candidates], number - 1)[:number]]
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+# averages per track values over the plays of groups of days, e.g. the weeks of a range
+# plays of tracks without a value are left out of their group's average
+# params: matrix--CountMatrix of day x track plays
+#         values--2d array with a row per track column of the matrix; nan where unknown
+#         groups--array of the group of every row of the matrix
+#         number--number of groups
+# return: tuple of (2d array of play weighted averages per group, nan without any plays with values,
+#         array of the plays per group that had values)
+def play_weighted(matrix, values, groups, number):
+    rows = np.repeat(np.arange(matrix.rows), np.diff(matrix.indptr))
+    nonzero_groups = np.asarray(groups)[rows]
+    # tracks added to the catalog after the values were aligned have no values
+    columns = np.asarray(matrix.indices, dtype=np.int64)
+    entry_values = np.full((len(columns), values.shape[1]), np.nan)
+    inside = columns < len(values)
+    entry_values[inside] = values[columns[inside]]
+    averages = np.full((number, values.shape[1]), np.nan)
+    plays = None
+    for column in range(values.shape[1]):
+        known = ~np.isnan(entry_values[:, column])
+        weights = np.asarray(matrix.data, dtype=np.float64) * known
+        column_plays = np.bincount(nonzero_groups, weights=weights, minlength=number)
+        sums = np.bincount(nonzero_groups, weights=np.nan_to_num(entry_values[:, column]) * weights, minlength=number)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            averages[:, column] = np.where(column_plays > 0, sums / column_plays, np.nan)
+        if plays is None:
+            plays = column_plays
+    return averages, plays
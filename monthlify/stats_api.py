@@ -0,0 +1,146 @@
+import datetime
+import hashlib
+import json
+import threading
+
+from flask import Blueprint
+from flask import Response
+from flask import request
+
+from monthlify.data import DataManager
+from monthlify.data.data_manager import local_today
+from monthlify.data.report_cache import REPORT_CACHE
+from monthlify.data.report_cache import joined_version
+from monthlify.data.report_cache import range_version
+
+# read only json stats served from the local play_log; nothing here calls spotify
+# responses are kept in the report cache until a day in their range is written again or any
+# process enriches what reports join in, and carry an ETag so dashboards can revalidate with
+# If-None-Match and get a 304 back
+stats_api = Blueprint('stats_api', __name__, url_prefix='/api')
+
+_data_manager = None
+_data_manager_lock = threading.Lock()
+# version of the joined lookups this process last read
+_joined_read = None
+_joined_lock = threading.Lock()
+
+
+# the DataManager is shared by every request thread; it only ever reads local data here
+def _get_data_manager():
+    global _data_manager
+    with _data_manager_lock:
+        if _data_manager is None:
+            _data_manager = DataManager('')
+    return _data_manager
+
+
+# reads the joined lookups again if another process has written them since they were read
+# params: version--report_cache.joined_version() the response is keyed on
+def _refresh_lookups(dm, version):
+    global _joined_read
+    with _joined_lock:
+        if version != _joined_read:
+            dm.reload_lookups()
+            _joined_read = version
+
+
+class _BadRequest(Exception):
+    pass
+
+
+# reads the date range of a request; end defaults to start and start defaults to today
+def _get_range():
+    start = request.args.get('start', local_today().isoformat())
+    end = request.args.get('end', start)
+    try:
+        if datetime.datetime.strptime(start, '%Y-%m-%d') > datetime.datetime.strptime(end, '%Y-%m-%d'):
+            raise _BadRequest('start must not be after end')
+    except ValueError:
+        raise _BadRequest('dates must be in format YYYY-MM-DD')
+    return start, end
+
+
+def _get_number(default):
+    try:
+        number = int(request.args.get('number', default))
+    except ValueError:
+        raise _BadRequest('number must be an integer')
+    if number < 1:
+        raise _BadRequest('number must be positive')
+    return number
+
+
+def _error(message, status):
+    return Response(json.dumps({'error': message}), status=status, mimetype='application/json')
+
+
+# serves the result of a query from the response cache, computing it on a miss
+# params: query--function of (DataManager, start, end) returning json serializable data
+#         params--every request param the result depends on besides the range
+def _serve(query, *params):
+    try:
+        start, end = _get_range()
+        joined = joined_version()
+        key = ('stats_api', request.path, start, end, params, range_version(start, end), joined)
+    except _BadRequest as e:
+        return _error(str(e), 400)
+
+    hit, cached = REPORT_CACHE.get(key)
+    if hit:
+        body, etag = cached
+    else:
+        dm = _get_data_manager()
+        _refresh_lookups(dm, joined)
+        body = json.dumps(query(dm, start, end), separators=(',', ':'))
+        etag = hashlib.sha1(body.encode('utf-8')).hexdigest()
+        REPORT_CACHE.put(key, (body, etag))
+
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@stats_api.route('/top-tracks')
+def top_tracks():
+    try:
+        number = _get_number(50)
+    except _BadRequest as e:
+        return _error(str(e), 400)
+
+    def query(dm, start, end):
+        return [{'track': track, 'artist': artist, 'album': album, 'track_id': track_id, 'plays': plays}
+                for (track, artist, album, track_id), plays in dm.get_most_played_tracks(start, end, number)]
+    return _serve(query, number)
+
+
+@stats_api.route('/top-artists')
+def top_artists():
+    try:
+        number = _get_number(20)
+    except _BadRequest as e:
+        return _error(str(e), 400)
+
+    def query(dm, start, end):
+        return [{'artist': artist, 'plays': plays}
+                for artist, plays in dm.get_most_played_artists(start, end, number)]
+    return _serve(query, number)
+
+
+@stats_api.route('/days')
+def daily_totals():
+    def query(dm, start, end):
+        return [{'date': date.isoformat(), 'plays': plays} for date, plays in dm.get_daily_totals(start, end)]
+    return _serve(query)
+
+
+@stats_api.route('/features')
+def feature_averages():
+    def query(dm, start, end):
+        energy, tempo, valence = dm.analyze_data_date_range(start, end, fetch=False)
+        return {'energy': energy, 'tempo': tempo, 'valence': valence}
+    return _serve(query)
@@ -1,9 +1,20 @@
 import datetime
+import threading
 from time import sleep
 
 from monthlify.data import DataManager
 
 
+# looks up whatever ingest queued in the background, so scraping never waits on it
+def enrich_forever(dm, interval=300):
+    while True:
+        try:
+            dm.run_enrichment()
+        except Exception as e:
+            print(f'enrichment failed: {e!r}')
+        sleep(interval)
+
+
 def main():
     username = ''
     last_scraped = 0
@@ -19,6 +30,8 @@ def main():
     last_log_time_ms = int((last_log_time - epoch).total_seconds() * 1000)
     print(f'last log time ms: {last_log_time_ms}')
 
+    threading.Thread(target=enrich_forever, args=(dm,), daemon=True).start()
+
     while True:
         # adjust for time zone UTC-6
         now = datetime.datetime.now() - datetime.timedelta(hours=-4)
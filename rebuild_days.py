@@ -0,0 +1,17 @@
+import sys
+
+from monthlify.data import DataManager
+
+
+# rebuilds play_log/days from every raw file in play_log/raw
+# usage: python rebuild_days.py [processes]
+def main():
+    username = ''
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else None
+
+    dm = DataManager(username)
+    dm.rebuild(processes=processes)
+
+
+if __name__ == '__main__':
+    main()
@@ -11,9 +11,11 @@ from monthlify.core import read_config
 from monthlify.core import BadRequestError
 from monthlify.auth import Authorization
 from monthlify.auth import get_auth_key
+from monthlify.stats_api import stats_api
 
 
 app = Flask(__name__)
+app.register_blueprint(stats_api)
 
 
 @app.route("/")
@@ -82,4 +84,4 @@ def _authorization_code_request(auth_code):
 
 
 if __name__ == '__main__':
-    app.run(host='localhost', port=3000)
\ No newline at end of file
+    app.run(host='localhost', port=3000, threaded=True)
\ No newline at end of file
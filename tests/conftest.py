@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+# monthlify.core and monthlify.auth import each other, and only load in this order
+import monthlify.auth  # noqa: F401
+from monthlify.data import artist_catalog
+from monthlify.data import audio_analysis
+from monthlify.data import codec
+from monthlify.data import data_manager
+from monthlify.data import enrichment_queue
+from monthlify.data import feature_cache
+from monthlify.data import isrc_cache
+from monthlify.data import leaderboard
+from monthlify.data import lyric_scores
+from monthlify.data import report_cache
+from monthlify.data import track_catalog
+
+# module globals holding what is shared by everything in a process, e.g. the track catalog
+_SHARED = ((track_catalog, '_shared_catalog'), (feature_cache, '_shared_cache'),
+           (artist_catalog, '_shared_catalog'), (isrc_cache, '_shared_cache'),
+           (leaderboard, '_shared_leaderboard'), (lyric_scores, '_shared_table'),
+           (audio_analysis, '_shared_store'), (enrichment_queue, '_shared_queue'))
+
+
+# every test runs in an empty play_log of its own, with nothing shared left over from other tests
+# and nothing that can reach spotify
+@pytest.fixture(autouse=True)
+def play_log(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for name in ('raw', 'trimmed', 'days', 'summaries'):
+        os.makedirs(os.path.join('play_log', name))
+    for module, name in _SHARED:
+        monkeypatch.setattr(module, name, None)
+    monkeypatch.setattr(report_cache, '_write_counters', {})
+    monkeypatch.setattr(codec, '_default_name', None)
+    report_cache.REPORT_CACHE.clear()
+
+    def no_spotify(*args):
+        raise AssertionError('tests must not talk to spotify')
+    monkeypatch.setattr(data_manager, 'get_authorization', no_spotify)
+    return tmp_path
@@ -0,0 +1,28 @@
+import datetime
+import os
+
+from monthlify.data import codec
+from monthlify.data import data_manager
+
+
+# makes up a play the way the recently played endpoint returns it
+# params: index--number of the track; tracks with the same number are the same track
+#         played_at--utc datetime of the play
+def raw_play(index, played_at):
+    return {'played_at': played_at.strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+            'track': {'name': f'track {index}', 'id': f'id{index}', 'album': {'name': f'album {index}'},
+                      'artists': [{'id': f'artist{index % 2}', 'name': f'artist {index % 2}'}]}}
+
+
+# writes a raw play log like scrape does
+# params: plays--list of raw_play dicts
+def write_raw(filename, plays):
+    with open(os.path.join('play_log', 'raw', filename), mode='wb') as file:
+        file.write(codec.encode({'items': plays}, 'json'))
+
+
+# return: utc datetime of noon local time, a number of days before today
+def local_noon(days_ago=0):
+    date = data_manager.local_today() - datetime.timedelta(days=days_ago)
+    return (datetime.datetime.combine(date, datetime.time(12))
+            - datetime.timedelta(hours=data_manager.TIME_ZONE_SHIFT))
@@ -0,0 +1,62 @@
+import datetime
+import os
+
+from monthlify.data import DataManager
+from monthlify.data import archive
+from monthlify.data import codec
+from tests.helpers import raw_play
+from tests.helpers import write_raw
+
+NAMES = ['2019-08-04 08:40:30.880000.json', '2019-08-20 10:00:00.000000.json', '2019-09-01 09:00:00.000000.json']
+
+
+def write_logs():
+    logs = {}
+    for day, name in enumerate(NAMES):
+        plays = [raw_play(day, datetime.datetime(2019, 8, 4 + day, 12))]
+        write_raw(name, plays)
+        logs[name] = {'items': plays}
+    return logs
+
+
+def test_compact_round_trip():
+    logs = write_logs()
+    assert archive.compact('raw', '2019-09') == 2
+
+    # the month that is still being written stays loose
+    assert os.listdir('play_log/raw') == [NAMES[2]]
+    assert archive.list_months('raw') == ['2019-08']
+    assert list(archive.iter_archive('raw')) == [(name, logs[name]) for name in NAMES[:2]]
+    assert archive.read_log('raw', NAMES[1]) == logs[NAMES[1]]
+    assert archive.read_log('raw', '2019-08-30 10:00:00.000000.json') is None
+    assert archive.latest_name('raw') == NAMES[1]
+
+
+def test_compact_again_adds_only_new_logs():
+    logs = write_logs()
+    archive.compact('raw', '2019-09')
+    write_raw('2019-08-31 23:00:00.000000.json', [])
+    assert archive.compact('raw', '2019-09') == 1
+    assert [name for name, data in archive.iter_archive('raw')] == NAMES[:2] + ['2019-08-31 23:00:00.000000.json']
+    assert archive.read_log('raw', NAMES[0]) == logs[NAMES[0]]
+
+
+def test_compact_leaves_files_that_are_not_logs():
+    write_logs()
+    # e.g. a trimmed log being written, and a log named by hand
+    for name in ('.tmp-inflight.tmp', '.tmp-inflight.json', 'a.json'):
+        with open(os.path.join('play_log', 'raw', name), mode='wb') as file:
+            file.write(codec.encode({'items': []}))
+    archive.compact('raw', '2019-09')
+    assert sorted(os.listdir('play_log/raw')) == sorted([NAMES[2], '.tmp-inflight.tmp', '.tmp-inflight.json', 'a.json'])
+    assert archive.list_months('raw') == ['2019-08']
+
+
+def test_most_recent_log_time():
+    dm = DataManager('')
+    # a fresh install scrapes everything
+    assert dm.get_most_recent_log_time() == datetime.datetime.utcfromtimestamp(0)
+    write_logs()
+    archive.compact('raw', '2019-10')
+    # every log is archived
+    assert dm.get_most_recent_log_time() == datetime.datetime(2019, 9, 1, 9)
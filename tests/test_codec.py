@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from monthlify.data import codec
+
+DAY = {'version': 2, 'meta': {'date': '2019-08-04'}, 'tracks': [[0, 2], [3, 1]],
+       'events': {'0': [1564934400000, 1564938000000], '3': [1564941600000]}}
+
+
+@pytest.mark.parametrize('name', codec.available_codecs())
+def test_every_codec_round_trips(name):
+    contents = {'name': 'café', 'plays': [1, 2.5, None], 'nested': {'ok': True}}
+    data = codec.encode(contents, name)
+    assert data.startswith(codec.MAGIC) == codec.get_codec(name).framed
+    assert codec.decode(data) == contents
+
+
+@pytest.mark.parametrize('name', codec.available_codecs())
+def test_day_files_decode_the_same_with_their_schema(name):
+    day = codec.decode(codec.encode(DAY, name), 'day')
+    # typed decoders give tuples and integer keys; the fields carry the same values
+    assert day['version'] == 2
+    assert day['meta'] == DAY['meta']
+    assert [list(track) for track in day['tracks']] == DAY['tracks']
+    assert {str(index): list(events) for index, events in day['events'].items()} == DAY['events']
+
+
+def test_old_indented_json_still_loads(tmp_path):
+    # how every file was written before codecs
+    old = [['track', 'artist', 'album', 'id', 2]]
+    path = tmp_path / 'old.json'
+    path.write_text(json.dumps(old, indent=2))
+    assert codec.load(str(path)) == old
+    assert codec.load(str(path), 'day') == old
+
+
+def test_frames_of_newer_versions_are_refused():
+    data = codec.MAGIC + bytes([codec.FORMAT_VERSION + 1]) + b'json\n{}'
+    with pytest.raises(ValueError):
+        codec.decode(data)
+
+
+def test_default_codec_is_what_files_are_written_with():
+    assert codec.default_codec() == codec.fastest_json()
+    if 'msgpack' in codec.available_codecs():
+        codec.set_default_codec('msgpack')
+        assert codec.encode({}).startswith(codec.MAGIC)
+    with pytest.raises(ValueError):
+        codec.set_default_codec('pickle')
@@ -0,0 +1,66 @@
+import types
+
+import pytest
+
+from monthlify.data import enrichment_queue
+from monthlify.data.enrichment_queue import EnrichmentQueue
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(enrichment_queue, 'time', types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def test_jobs_are_queued_once_and_leased_to_one_worker(clock):
+    queue = EnrichmentQueue()
+    assert queue.push('features', ['id1', 'id2', None]) == 2
+    assert queue.push('features', ['id2', 'id3']) == 1
+
+    # another worker, e.g. in another process, sees the same queue
+    other = EnrichmentQueue()
+    assert queue.claim('features', 2) == ['id1', 'id2']
+    assert other.claim('features', 10) == ['id3']
+    assert other.claim('features', 10) == []
+
+    # a worker that dies mid batch loses its lease
+    clock[0] += enrichment_queue.LEASE_SECONDS
+    assert other.claim('features', 10) == ['id1', 'id2', 'id3']
+    other.complete('features', ['id1', 'id2', 'id3'])
+    assert queue.status() == {}
+
+
+def test_failed_jobs_back_off_until_they_run_out_of_attempts(clock):
+    queue = EnrichmentQueue()
+    queue.push('lyrics', ['id1'])
+    delays = []
+    for attempt in range(enrichment_queue.MAX_ATTEMPTS):
+        assert queue.claim('lyrics', 1) == ['id1']
+        queue.fail('lyrics', ['id1'], 'timed out')
+        started = clock[0]
+        while not queue.claim('lyrics', 1) and clock[0] - started < enrichment_queue.MAX_RETRY_DELAY * 2:
+            clock[0] += enrichment_queue.RETRY_DELAY
+        delays.append(clock[0] - started)
+        queue.release('lyrics', ['id1'])
+
+    assert delays[:3] == [enrichment_queue.RETRY_DELAY, 2 * enrichment_queue.RETRY_DELAY,
+                          4 * enrichment_queue.RETRY_DELAY]
+    assert max(delays[:-1]) <= enrichment_queue.MAX_RETRY_DELAY
+    # the last attempt is never claimed again
+    assert queue.status() == {'lyrics': {'ready': 0, 'waiting': 0, 'failed': 1}}
+    assert queue.queued('lyrics', ['id1']) == set()
+
+    assert queue.retry_failed() == 1
+    assert queue.claim('lyrics', 1) == ['id1']
+
+
+def test_released_jobs_wait_without_counting_an_attempt(clock):
+    queue = EnrichmentQueue()
+    queue.push('days', ['2019-08-04'])
+    queue.claim('days', 1)
+    queue.release('days', ['2019-08-04'], delay=30)
+    assert queue.status() == {'days': {'ready': 0, 'waiting': 1, 'failed': 0}}
+    clock[0] += 30
+    assert queue.claim('days', 1) == ['2019-08-04']
+    assert queue.queued('days', ['2019-08-04', '2019-08-05']) == {'2019-08-04'}
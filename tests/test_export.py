@@ -0,0 +1,50 @@
+import datetime
+import math
+import os
+
+import numpy as np
+
+from monthlify.data import DataManager
+from monthlify.data import export
+from monthlify.data import lyric_analyzer
+from monthlify.data import storage
+from monthlify.data.analyzer import Analyzer
+from monthlify.data.feature_cache import FEATURE_CACHE_PATH
+from monthlify.data.lyric_scores import LYRIC_SCORES_PATH
+from tests.helpers import raw_play
+from tests.helpers import write_raw
+
+
+class FakePlaylists:
+
+    def extract_tracks_and_artists_from_playlist(self, playlist_name):
+        return [('a', 'artist 1', 'id1'), ('b', 'artist 0', 'id2'), ('c', 'artist 1', 'id3')]
+
+
+def test_playlist_analysis_is_exported_by_track_id(monkeypatch):
+    # spotify has no features for id2, so the rows after it must not shift
+    storage.atomic_write(FEATURE_CACHE_PATH, {'id1': {'energy': 0.5, 'tempo': 120.0, 'valence': 0.25}, 'id2': None,
+                                              'id3': {'energy': 0.75, 'tempo': 90.0, 'valence': 1.0}})
+    monkeypatch.setattr(lyric_analyzer, 'sentiment_analysis',
+                        lambda track, artist: None if track == 'c' else (0.5, 0.125))
+    # every feature is cached, so nothing is fetched with it
+    monkeypatch.setattr(DataManager, '_auth', None)
+    os.makedirs('monthlify/data/playlists')
+    summary = Analyzer(DataManager(''), FakePlaylists()).get_track_data_for_playlist('Mix', 'mix', 'npz')
+
+    assert summary[1] == ('b', 'artist 0', None, None, None, 0.5, 0.125)
+    columns = export.load_npz('mix')
+    assert list(columns['track_id']) == ['id1', 'id2', 'id3']
+    assert np.array_equal(columns['tempo'], [120.0, math.nan, 90.0], equal_nan=True)
+    assert np.array_equal(columns['sentiment'], [0.5, 0.5, math.nan], equal_nan=True)
+
+
+def test_track_export_joins_lyric_scores():
+    write_raw('a.json', [raw_play(1, datetime.datetime(2019, 8, 4, 18)), raw_play(2, datetime.datetime(2019, 8, 4, 19))])
+    DataManager('').process_all_play_logs()
+    storage.atomic_write(LYRIC_SCORES_PATH, {'id2': [0.25, 0.5], 'id1': None})
+
+    assert export.export_tracks('tracks', 'npz') == 2
+    columns = export.load_npz('tracks')
+    assert list(columns['track_id']) == ['id1', 'id2']
+    assert np.array_equal(columns['lexical_richness'], [math.nan, 0.5], equal_nan=True)
@@ -0,0 +1,52 @@
+import datetime
+import json
+
+from monthlify.data import DataManager
+from monthlify.data import codec
+from monthlify.data import day_data
+from monthlify.data import event_log
+from monthlify.data.data_manager import extract_day_data
+from tests.helpers import raw_play
+from tests.helpers import write_raw
+
+AUGUST_4 = datetime.datetime(2019, 8, 4, 18)
+
+
+def plays_by_track(date):
+    day = extract_day_data(date)
+    return {day.catalog.get(index)[3]: plays for index, plays in day.dict.items()}
+
+
+def test_processing_again_counts_nothing_twice():
+    first = [raw_play(1, AUGUST_4), raw_play(2, AUGUST_4 + datetime.timedelta(minutes=4))]
+    write_raw('a.json', first)
+    dm = DataManager('')
+    dm.process_all_play_logs()
+    dm.process_all_play_logs()
+    assert plays_by_track('2019-08-04') == {'id1': 1, 'id2': 1}
+
+    # the next scrape's window overlaps the last one, and track 1 is played again
+    write_raw('b.json', first + [raw_play(1, AUGUST_4 + datetime.timedelta(minutes=8))])
+    dm.process_all_play_logs()
+    assert plays_by_track('2019-08-04') == {'id1': 2, 'id2': 1}
+    assert extract_day_data('2019-08-04').total_plays == 3
+    assert len(event_log.EventLog().read_month('2019-08')) == 3
+    assert dm.get_most_played_tracks('2019-08-01', '2019-08-31')[0][1] == 2
+
+
+def test_version_1_day_files_are_read_into_the_catalog():
+    # a day written before the track catalog, with an event index
+    played_at_ms = int(AUGUST_4.replace(tzinfo=datetime.timezone.utc).timestamp() * 1000)
+    old = [{'total plays': 2, 'top artists': [['artist 1', 2]]},
+           [{'track': 'track 1', 'artist': 'artist 1', 'album': 'album 1', 'track_id': 'id1', 'plays': 2}],
+           {'id1': [played_at_ms - 60000, played_at_ms]}]
+    with open('play_log/days/2019-08-04.json', mode='w') as file:
+        json.dump(old, file, indent=2)
+    assert plays_by_track('2019-08-04') == {'id1': 2}
+
+    # one of the plays the old file counts, and a new one
+    write_raw('a.json', [raw_play(1, AUGUST_4), raw_play(3, AUGUST_4 + datetime.timedelta(minutes=4))])
+    DataManager('').process_all_play_logs()
+    contents = codec.load('play_log/days/2019-08-04.json', 'day')
+    assert contents['version'] == day_data.DAY_FILE_VERSION
+    assert plays_by_track('2019-08-04') == {'id1': 2, 'id3': 1}
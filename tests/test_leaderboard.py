@@ -0,0 +1,57 @@
+import datetime
+import os
+import threading
+import time
+
+from monthlify.data import DataManager
+from monthlify.data import data_manager
+from monthlify.data import leaderboard
+from monthlify.data.leaderboard import IndexedHeap
+from tests.helpers import local_noon
+from tests.helpers import raw_play
+from tests.helpers import write_raw
+
+
+def test_indexed_heap_top():
+    heap = IndexedHeap({'a': 3, 'b': 1})
+    heap.increment('b', 5)
+    heap.increment('c', 2)
+    heap.increment('a')
+    assert heap.top(2) == [('b', 6), ('a', 4)]
+    assert heap.top(10) == [('b', 6), ('a', 4), ('c', 2)]
+
+
+def test_concurrent_first_use_counts_the_month_once(monkeypatch):
+    noon = local_noon()
+    write_raw('a.json', [raw_play(1, noon), raw_play(2, noon), raw_play(2, noon + datetime.timedelta(minutes=5))])
+    dm = DataManager('')
+    dm.process_all_play_logs()
+
+    # as if the month rolled over since the leaderboard was last counted
+    os.remove(leaderboard.LEADERBOARD_PATH)
+    monkeypatch.setattr(leaderboard, '_shared_leaderboard', None)
+    data_manager.REPORT_CACHE.clear()
+    # read the days slowly so every thread gets to the leaderboard before it's counted
+    iter_days = DataManager.iter_days
+
+    def slow_iter_days(self, start_date, end_date=None):
+        time.sleep(0.1)
+        return iter_days(self, start_date, end_date)
+    monkeypatch.setattr(DataManager, 'iter_days', slow_iter_days)
+
+    today = data_manager.local_today()
+    results = []
+    start = threading.Barrier(4)
+
+    def top_tracks():
+        start.wait()
+        results.append(dm.get_most_played_tracks(today.strftime('%Y-%m-01'), today.isoformat(), 10))
+    threads = [threading.Thread(target=top_tracks) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    expected = [(('track 2', 'artist 0', 'album 2', 'id2'), 2), (('track 1', 'artist 1', 'album 1', 'id1'), 1)]
+    assert results == [expected] * 4
+    assert leaderboard.get_shared_leaderboard().total_plays == 3
@@ -0,0 +1,44 @@
+from monthlify.data import spotify_api
+from monthlify.data.playlist_cache import PlaylistCache
+
+
+def fake_spotify(monkeypatch, playlists, tracks):
+    fetched = []
+
+    def get_tracks_from_playlist(auth, playlist_id, offset=0):
+        fetched.append(playlist_id)
+        items = [{'track': {'name': name, 'artists': [{'name': 'artist'}], 'id': f'id {name}'}}
+                 for name in tracks[playlist_id]]
+        return {'items': items, 'next': None}
+    monkeypatch.setattr(spotify_api, 'get_all_playlists', lambda auth: {'items': list(playlists.values())})
+    monkeypatch.setattr(spotify_api, 'get_playlist', lambda auth, playlist_id: playlists[playlist_id])
+    monkeypatch.setattr(spotify_api, 'get_tracks_from_playlist', get_tracks_from_playlist)
+    return fetched
+
+
+def test_tracks_are_only_fetched_again_when_the_snapshot_changes(monkeypatch):
+    playlists = {'p1': {'id': 'p1', 'name': 'Mix', 'snapshot_id': 's1'}}
+    fetched = fake_spotify(monkeypatch, playlists, {'p1': ['a', 'b']})
+    cache = PlaylistCache('playlist_cache.json')
+    cache.refresh(None)
+    assert cache.find_id('mix') == 'p1'
+    assert cache.get_tracks(None, 'p1') == [('a', 'artist', 'id a'), ('b', 'artist', 'id b')]
+    cache.refresh(None)
+    cache.get_tracks(None, 'p1')
+    assert fetched == ['p1']
+
+    playlists['p1']['snapshot_id'] = 's2'
+    cache = PlaylistCache('playlist_cache.json')
+    cache.refresh(None)
+    cache.get_tracks(None, 'p1')
+    assert fetched == ['p1', 'p1']
+
+
+def test_playlist_made_since_the_list_was_fetched(monkeypatch):
+    playlists = {'p1': {'id': 'p1', 'name': 'Mix', 'snapshot_id': 's1'}}
+    fake_spotify(monkeypatch, playlists, {'p1': ['a'], 'p2': ['c']})
+    cache = PlaylistCache('playlist_cache.json')
+    cache.refresh(None)
+    playlists['p2'] = {'id': 'p2', 'name': 'New', 'snapshot_id': 's1'}
+    assert cache.get_tracks(None, 'p2') == [('c', 'artist', 'id c')]
+    assert PlaylistCache('playlist_cache.json').find_id('new') == 'p2'
@@ -0,0 +1,67 @@
+import random
+
+from monthlify.data import codec
+from monthlify.data import sketches
+
+
+def random_days(seed, days=7, plays=400):
+    generator = random.Random(seed)
+    # a few favourites and a long tail
+    return [[f'id{int(generator.paretovariate(1.2))}' for play in range(plays)] for day in range(days)]
+
+
+def sketch_of(plays):
+    sketch = sketches.PlaySketch()
+    for track_id in plays:
+        sketch.add(track_id, f'artist {track_id[-1]}')
+    return sketch
+
+
+def test_merged_days_answer_like_one_sketch_of_every_play():
+    days = random_days(1)
+    merged = sketches.PlaySketch()
+    for day in days:
+        merged.merge(sketch_of(day))
+    backwards = sketches.PlaySketch()
+    for day in reversed(days):
+        backwards.merge(sketch_of(day))
+    whole = sketch_of([track_id for day in days for track_id in day])
+
+    assert merged.top('tracks', 5) == whole.top('tracks', 5)
+    assert backwards.top('tracks', 5) == merged.top('tracks', 5)
+    assert merged.distinct_tracks.estimate() == whole.distinct_tracks.estimate()
+    assert merged.counts.total == whole.counts.total
+
+
+def test_heavy_hitter_bounds_hold_after_merges():
+    days = random_days(2)
+    true_counts = {}
+    merged = sketches.SpaceSaving(capacity=10)
+    for day in days:
+        summary = sketches.SpaceSaving(capacity=10)
+        for track_id in day:
+            summary.add(track_id)
+            true_counts[track_id] = true_counts.get(track_id, 0) + 1
+        merged.merge(summary)
+
+    for track_id, count, error in merged.top(10):
+        assert count - error <= true_counts[track_id] <= count
+    # anything that wasn't kept played no more than the smallest count kept
+    kept = {track_id for track_id, count, error in merged.top(10)}
+    assert all(plays <= merged.min_count() for track_id, plays in true_counts.items() if track_id not in kept)
+    assert max(true_counts, key=true_counts.get) in kept
+
+
+def test_sketches_round_trip_through_the_codec():
+    sketch = sketch_of(random_days(3, days=1)[0])
+    loaded = sketches.PlaySketch.from_dict(codec.decode(codec.encode(sketch.to_dict())))
+    assert loaded.top('tracks', 10) == sketch.top('tracks', 10)
+    assert loaded.top('artists', 2) == sketch.top('artists', 2)
+    assert loaded.distinct_artists.estimate() == sketch.distinct_artists.estimate()
+
+
+def test_distinct_counts_are_within_the_error():
+    counter = sketches.HyperLogLog()
+    for index in range(20000):
+        counter.add(f'id{index}')
+    assert abs(counter.estimate() - 20000) <= 20000 * 3 * counter.relative_error
@@ -0,0 +1,47 @@
+import datetime
+
+import pytest
+
+from monthlify.data import DataManager
+from monthlify.data import storage
+from monthlify.data.feature_cache import FEATURE_CACHE_PATH
+from tests.helpers import raw_play
+from tests.helpers import write_raw
+
+flask = pytest.importorskip('flask')
+
+
+@pytest.fixture
+def client(monkeypatch):
+    from monthlify import stats_api
+    monkeypatch.setattr(stats_api, '_data_manager', None)
+    monkeypatch.setattr(stats_api, '_joined_read', None)
+    app = flask.Flask(__name__)
+    app.register_blueprint(stats_api.stats_api)
+    return app.test_client()
+
+
+def test_responses_revalidate_and_reject_bad_ranges(client):
+    write_raw('a.json', [raw_play(1, datetime.datetime(2019, 8, 4, 18))])
+    DataManager('').process_all_play_logs()
+
+    response = client.get('/api/top-artists?start=2019-08-04')
+    assert response.status_code == 200
+    assert response.json == [{'artist': 'artist 1', 'plays': 1}]
+    etag = response.headers['ETag']
+    assert client.get('/api/top-artists?start=2019-08-04', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get('/api/days?start=2019-08-05&end=2019-08-04').status_code == 400
+    assert client.get('/api/days?start=August').status_code == 400
+
+
+def test_enrichment_by_another_process_is_served(client):
+    write_raw('a.json', [raw_play(1, datetime.datetime(2019, 8, 4, 18))])
+    DataManager('').process_all_play_logs()
+    before = client.get('/api/features?start=2019-08-04')
+    assert before.json == {'energy': 0, 'tempo': 0, 'valence': 0}
+
+    # what an enrich run in another process leaves behind
+    storage.atomic_write(FEATURE_CACHE_PATH, {'id1': {'energy': 0.5, 'tempo': 120.0, 'valence': 0.25}})
+    after = client.get('/api/features?start=2019-08-04', headers={'If-None-Match': before.headers['ETag']})
+    assert after.status_code == 200
+    assert after.json == {'energy': 0.5, 'tempo': 120.0, 'valence': 0.25}
@@ -0,0 +1,61 @@
+import datetime
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from monthlify.data import codec
+from monthlify.data import storage
+from monthlify.data import trends
+
+
+def test_atomic_write_round_trip():
+    contents = {'version': 2, 'tracks': [[0, 3]], 'name': 'café'}
+    storage.atomic_write('play_log/days/2019-08-01.json', contents)
+    assert codec.load('play_log/days/2019-08-01.json') == contents
+    assert os.listdir('play_log/days') == ['2019-08-01.json']
+
+
+def test_group_commit_renames_together_and_hides_temp_files():
+    with storage.group_commit():
+        storage.atomic_write('play_log/days/2019-08-01.json', {'day': 1})
+        storage.atomic_write('play_log/days/2019-08-02.json', {'day': 2})
+        # nothing is in place yet, and nothing being written looks like a day file
+        names = os.listdir('play_log/days')
+        assert len(names) == 2
+        assert not any(name.endswith('.json') for name in names)
+    assert sorted(os.listdir('play_log/days')) == ['2019-08-01.json', '2019-08-02.json']
+
+
+def test_failed_group_commit_leaves_nothing_behind():
+    storage.atomic_write('play_log/days/2019-08-01.json', {'day': 'old'})
+    with pytest.raises(RuntimeError):
+        with storage.group_commit():
+            storage.atomic_write('play_log/days/2019-08-01.json', {'day': 'new'})
+            storage.atomic_write('play_log/days/2019-08-02.json', {'day': 2})
+            raise RuntimeError
+    assert os.listdir('play_log/days') == ['2019-08-01.json']
+    assert codec.load('play_log/days/2019-08-01.json') == {'day': 'old'}
+
+
+def test_file_lock_is_held_by_process_and_thread():
+    seen = []
+    with storage.catalog_lock():
+        assert storage.holds_catalog_lock(thread=True)
+        thread = threading.Thread(target=lambda: seen.append((storage.holds_catalog_lock(),
+                                                              storage.holds_catalog_lock(thread=True))))
+        thread.start()
+        thread.join()
+    assert seen == [(True, False)]
+    assert not storage.holds_catalog_lock()
+
+
+def test_count_matrix_save_leaves_no_temp_files(tmp_path):
+    matrix = trends.CountMatrix.from_days(datetime.date(2019, 8, 1), [{0: 2}, {}, {1: 1, 0: 1}], 2)
+    matrix.save('tracks', 'built', directory=str(tmp_path / 'trends'))
+    assert sorted(os.listdir(tmp_path / 'trends')) == ['tracks.data.npy', 'tracks.indices.npy',
+                                                       'tracks.indptr.npy', 'tracks.json']
+    loaded, built = trends.CountMatrix.load('tracks', directory=str(tmp_path / 'trends'))
+    assert built == 'built'
+    assert np.array_equal(loaded.data, matrix.data)
@@ -0,0 +1,50 @@
+import datetime
+
+import numpy as np
+
+from monthlify.data import DataManager
+from monthlify.data import data_manager
+from monthlify.data import trends
+from tests.helpers import local_noon
+from tests.helpers import raw_play
+from tests.helpers import write_raw
+
+
+def test_count_matrix_windows():
+    # three days: track 0 played 2, 0, 1 times and track 1 played 0, 0, 3 times
+    matrix = trends.CountMatrix.from_days(datetime.date(2019, 8, 1), [{0: 2}, {}, {0: 1, 1: 3}], 2)
+    assert matrix.row_of('2019-08-03') == 2
+    current, previous = trends.window_over_window(matrix, 2, 1)
+    assert np.array_equal(current, [1, 3])
+    assert np.array_equal(previous, [0, 0])
+    current, previous = trends.window_over_window(matrix, 2, 2)
+    assert np.array_equal(current, [1, 3])
+    assert np.array_equal(previous, [2, 0])
+
+
+def test_trending_ignores_files_that_are_not_days():
+    write_raw('a.json', [raw_play(1, local_noon(8)), raw_play(1, local_noon(1)), raw_play(2, local_noon(1)),
+                         raw_play(2, local_noon(1) + datetime.timedelta(minutes=5))])
+    dm = DataManager('')
+    dm.process_all_play_logs()
+    # e.g. left behind by a crash mid write
+    with open('play_log/days/.tmp-leftover.json', mode='w') as file:
+        file.write('{')
+    fingerprint = data_manager.days_fingerprint()
+    assert fingerprint[0] == 2
+
+    trending = dm.get_trending(window=7)
+    # track 1 was played as much the week before, so it isn't trending
+    assert [(track_info[3], current, previous) for track_info, current, previous in trending] == [('id2', 2, 0)]
+
+
+def test_rising_playlist_window_is_at_least_a_week(monkeypatch):
+    windows = []
+    monkeypatch.setattr(data_manager, 'local_today', lambda: datetime.date(2019, 9, 1))
+    monkeypatch.setattr(DataManager, 'get_breakouts',
+                        lambda self, end_date, window, baseline, number: windows.append(window) or [])
+    dm = DataManager('')
+    dm.make_rising_playlist()
+    monkeypatch.setattr(data_manager, 'local_today', lambda: datetime.date(2019, 9, 20))
+    dm.make_rising_playlist()
+    assert windows == [data_manager.RISING_MIN_WINDOW, 20]